@@ -18,6 +18,7 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, and_, or_, desc, case
 from database import Question, Attempt, Mastery, Topic, User, AsyncSession
+from taxonomy_registry import taxonomy_registry
 
 logger = logging.getLogger(__name__)
 
@@ -77,79 +78,9 @@ class AdaptiveSessionLogic:
         self.min_subcategories_per_session = 3  # Target minimum 3 subcategories per session
         self.max_questions_per_type_in_subcategory = 3  # Max 3 per type within subcategory
         
-        # Updated canonical taxonomy based on provided CSV document
-        self.canonical_subcategories = {
-            "Arithmetic": [
-                "Time-Speed-Distance", "Time-Work", "Ratios and Proportions", 
-                "Percentages", "Averages and Alligation", "Profit-Loss-Discount",
-                "Simple and Compound Interest", "Mixtures and Solutions", "Partnerships"
-            ],
-            "Algebra": [
-                "Linear Equations", "Quadratic Equations", "Inequalities", "Progressions",
-                "Functions and Graphs", "Logarithms and Exponents", "Special Algebraic Identities",
-                "Maxima and Minima", "Special Polynomials"
-            ],
-            "Geometry and Mensuration": [
-                "Triangles", "Circles", "Polygons", "Coordinate Geometry",
-                "Mensuration 2D", "Mensuration 3D", "Trigonometry"
-            ],
-            "Number System": [
-                "Divisibility", "HCF-LCM", "Remainders", "Base Systems",
-                "Digit Properties", "Number Properties", "Number Series", "Factorials"
-            ],
-            "Modern Math": [
-                "Permutation-Combination", "Probability", "Set Theory and Venn Diagram"
-            ]
-        }
-
-        # Detailed question types mapping based on canonical taxonomy CSV
-        self.question_types_mapping = {
-            # Arithmetic
-            "Time-Speed-Distance": ["Basics", "Relative Speed", "Circular Track Motion", "Boats and Streams", "Trains", "Races"],
-            "Time-Work": ["Work Time Effeciency", "Pipes and Cisterns", "Work Equivalence"],
-            "Ratios and Proportions": ["Simple Rations", "Compound Ratios", "Direct and Inverse Variation", "Partnerships"],
-            "Percentages": ["Basics", "Percentage Change", "Successive Percentage Change"],
-            "Averages and Alligation": ["Basic Averages", "Weighted Averages", "Alligations & Mixtures", "Three Mixture Alligations"],
-            "Profit-Loss-Discount": ["Basics", "Successive Profit/Loss/Discounts", "Marked Price and Cost Price Relations", "Discount Chains"],
-            "Simple and Compound Interest": ["Basics", "Difference between Simple Interest and Compound Interests", "Fractional Time Period Compound Interest"],
-            "Mixtures and Solutions": ["Replacements", "Concentration Change", "Solid-Liquid-Gas Mixtures"],
-            "Partnerships": ["Profit share"],
-            
-            # Algebra
-            "Linear Equations": ["Two variable systems", "Three variable systems", "Dependent and Inconsistent Systems"],
-            "Quadratic Equations": ["Roots & Nature of Roots", "Sum and Product of Roots", "Maximum and Minimum Values"],
-            "Inequalities": ["Linear Inequalities", "Quadratic Inequalities", "Modulus and Absolute Value", "Arithmetic Mean", "Geometric Mean", "Cauchy Schwarz"],
-            "Progressions": ["Arithmetic Progression", "Geometric Progression", "Harmonic Progression", "Mixed Progressions"],
-            "Functions and Graphs": ["Linear Functions", "Quadratic Functions", "Polynomial Functions", "Modulus Functions", "Step Functions", "Transformations", "Domain Range", "Composition and Inverse Functions"],
-            "Logarithms and Exponents": ["Basics", "Change of Base Formula", "Soliving Log Equations", "Surds and Indices"],
-            "Special Algebraic Identities": ["Expansion and Factorisation", "Cubes and Squares", "Binomial Theorem"],
-            "Maxima and Minima": ["Optimsation with Algebraic Expressions"],
-            "Special Polynomials": ["Remainder Theorem", "Factor Theorem"],
-            
-            # Geometry and Mensuration
-            "Triangles": ["Properties (Angles, Sides, Medians, Bisectors)", "Congruence & Similarity", "Pythagoras & Converse", "Inradius, Circumradius, Orthocentre"],
-            "Circles": ["Tangents & Chords", "Angles in a Circle", "Cyclic Quadrilaterals"],
-            "Polygons": ["Regular Polygons", "Interior / Exterior Angles"],
-            "Coordinate Geometry": ["Distance", "Section Formula", "Midpoint", "Equation of a line", "Slope & Intercepts", "Circles in Coordinate Plane", "Parabola", "Ellipse", "Hyperbola"],
-            "Mensuration 2D": ["Area Triangle", "Area Rectangle", "Area Trapezium", "Area Circle", "Sector"],
-            "Mensuration 3D": ["Volume Cubes", "Volume Cuboid", "Volume Cylinder", "Volume Cone", "Volume Sphere", "Volume Hemisphere", "Surface Areas"],
-            "Trigonometry": ["Heights and Distances", "Basic Trigonometric Ratios"],
-            
-            # Number System
-            "Divisibility": ["Basic Divisibility Rules", "Factorisation of Integers"],
-            "HCF-LCM": ["Euclidean Algorithm", "Product of HCF and LCM"],
-            "Remainders": ["Basic Remainder Theorem", "Chinese Remainder Theorem", "Cyclicity of Remainders (Last Digits)", "Cyclicity of Remainders (Last Two Digits)"],
-            "Base Systems": ["Conversion between bases", "Arithmetic in different bases"],
-            "Digit Properties": ["Sum of Digits", "Last Digit Patterns", "Palindromes", "Repetitive Digits"],
-            "Number Properties": ["Perfect Squares", "Perfect Cubes"],
-            "Number Series": ["Sum of Squares", "Sum of Cubes", "Telescopic Series"],
-            "Factorials": ["Properties of Factorials"],
-            
-            # Modern Math
-            "Permutation-Combination": ["Basics", "Circular Permutations", "Permutations with Repetitions", "Permutations with Restrictions", "Combinations with Repetitions", "Combinations with Restrictions"],
-            "Probability": ["Classical Probability", "Conditional Probability", "Bayes' Theorem"],
-            "Set Theory and Venn Diagram": ["Union and Intersection", "Complement and Difference of Sets", "Multi Set Problems"]
-        }
+        # Canonical taxonomy views (category → subcategories, subcategory → types), shared with the registry
+        self.canonical_subcategories = taxonomy_registry.subcategories_by_category
+        self.question_types_mapping = taxonomy_registry.types_by_subcategory
 
     def create_personalized_session(self, user_id: str, db: Session) -> Dict[str, Any]:
         """
@@ -2040,64 +1971,6 @@ class AdaptiveSessionLogic:
             logger.error(f"Error getting fallback question pool: {e}")
             return []
 
-    def get_category_from_subcategory(self, subcategory: str) -> str:
-        """Map subcategory to canonical category"""
-        try:
-            # Canonical mapping based on the taxonomy  
-            canonical_mapping = {
-                # Arithmetic
-                "Time-Speed-Distance": "Arithmetic",
-                "Time-Work": "Arithmetic", 
-                "Ratios and Proportions": "Arithmetic",
-                "Percentages": "Arithmetic",
-                "Averages and Alligation": "Arithmetic",
-                "Profit-Loss-Discount": "Arithmetic",
-                "Simple and Compound Interest": "Arithmetic",
-                "Mixtures and Solutions": "Arithmetic",
-                "Partnerships": "Arithmetic",
-                
-                # Algebra
-                "Linear Equations": "Algebra",
-                "Quadratic Equations": "Algebra", 
-                "Inequalities": "Algebra",
-                "Progressions": "Algebra",
-                "Functions and Graphs": "Algebra",
-                "Logarithms and Exponents": "Algebra",
-                "Special Algebraic Identities": "Algebra",
-                "Maxima and Minima": "Algebra",
-                "Special Polynomials": "Algebra",
-                
-                # Geometry and Mensuration
-                "Triangles": "Geometry and Mensuration",
-                "Circles": "Geometry and Mensuration",
-                "Polygons": "Geometry and Mensuration",
-                "Lines and Angles": "Geometry and Mensuration",
-                "Coordinate Geometry": "Geometry and Mensuration",
-                "Mensuration 2D": "Geometry and Mensuration", 
-                "Mensuration 3D": "Geometry and Mensuration",
-                
-                # Number System
-                "Divisibility": "Number System",
-                "HCF-LCM": "Number System",
-                "Remainders": "Number System",
-                "Base Systems": "Number System",
-                "Digit Properties": "Number System",
-                "Number Properties": "Number System",
-                "Number Series": "Number System", 
-                "Factorials": "Number System",
-                
-                # Modern Math
-                "Permutation-Combination": "Modern Math",
-                "Probability": "Modern Math",
-                "Set Theory and Venn Diagram": "Modern Math"
-            }
-            
-            return canonical_mapping.get(subcategory, "Arithmetic")  # Default to Arithmetic
-            
-        except Exception as e:
-            logger.error(f"Error mapping subcategory to category: {e}")
-            return "Arithmetic"
-
     def generate_enhanced_session_metadata(
         self, 
         questions: List[Question], 
@@ -2230,34 +2103,8 @@ class AdaptiveSessionLogic:
             }
 
     def get_category_from_subcategory(self, subcategory: str) -> str:
-        """Map subcategory to canonical category"""
-        if not subcategory:
-            return "Arithmetic"  # Default fallback
-        
-        # Direct mapping based on canonical taxonomy
-        for category, subcategories in self.canonical_subcategories.items():
-            if subcategory in subcategories:
-                return category
-        
-        # Legacy compatibility mapping for old subcategory names
-        legacy_mapping = {
-            "Time–Speed–Distance (TSD)": "Arithmetic",
-            "Time & Work": "Arithmetic", 
-            "Speed-Time-Distance": "Arithmetic",
-            "Basic Arithmetic": "Arithmetic",
-            "Powers and Roots": "Algebra",
-            "Perimeter and Area": "Geometry and Mensuration",
-            "Basic Operations": "Number System",
-            "HCF–LCM": "Number System",
-            "Remainders & Modular Arithmetic": "Number System",
-            "Permutation–Combination (P&C)": "Modern Math",
-            "Set Theory & Venn Diagrams": "Modern Math"
-        }
-        
-        if subcategory in legacy_mapping:
-            return legacy_mapping[subcategory]
-            
-        return "Arithmetic"  # Default fallback
+        """Map subcategory to canonical category (legacy names included; O(1) registry lookup)"""
+        return taxonomy_registry.resolve_category(subcategory)
 
     def create_simple_fallback_session(self, user_id: str, db: Session) -> Dict[str, Any]:
         """Fallback to simple random selection if sophisticated logic fails"""
@@ -5,23 +5,34 @@ Enhanced with LLM-powered conceptual frequency analysis
 """
 
 import asyncio
+import json
 import logging
+import time
 from datetime import datetime, timedelta, date
 from typing import List, Dict, Any
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.triggers.date import DateTrigger
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, desc, func
 
 # Import database and services
 from database import (
-    get_database, User, Mastery, Plan, Question, Attempt, 
-    Topic, Session, PlanUnit
+    get_async_compatible_db, Mastery, Plan, Question, Attempt,
+    Topic, Session, PlanUnit, JobRun
 )
 from mastery_tracker import MasteryTracker
 from study_planner import StudyPlanner
 from llm_enrichment import LLMEnrichmentPipeline
 from enhanced_nightly_engine import EnhancedNightlyEngine
+from learning_impact_engine import LearningImpactBatchEngine
+from importance_recompute import recompute_importance_indices
+from mastery_decay_engine import MasteryDecayEngine
+from data_retention import DataRetentionManager
+from spaced_repetition_engine import SpacedRepetitionEngine
+from scheduler_lock import SchedulerLeaderLock, LEADER_POLL_SECONDS, get_worker_id, describe_lock
+from metrics import observe_job_run
 
 logger = logging.getLogger(__name__)
 
@@ -36,43 +47,86 @@ class BackgroundJobProcessor:
         self.enhanced_nightly_engine = EnhancedNightlyEngine(self.llm_pipeline)
         logger.info("✅ Enhanced Nightly Engine initialized for comprehensive processing tasks")
         
+        # Batch engine for the dynamic learning impact recompute
+        self.learning_impact_engine = LearningImpactBatchEngine()
+        
+        # Bulk decay engine shares the tracker's daily decay factor
+        self.mastery_decay_engine = MasteryDecayEngine(self.mastery_tracker.time_decay_factor)
+        self.retention_manager = DataRetentionManager()
+        self.spaced_repetition_engine = SpacedRepetitionEngine()
+        
+        # Every worker schedules the jobs, only the lock holder runs them
+        self.leader_lock = SchedulerLeaderLock()
+        
     def start_scheduler(self):
         """Start the background job scheduler"""
         try:
             # Schedule enhanced nightly jobs at 2 AM
             self.scheduler.add_job(
-                self.enhanced_nightly_processing_job,
+                self.run_exclusive,
                 CronTrigger(hour=2, minute=0),
                 id='enhanced_nightly_processing',
+                args=['enhanced_nightly_processing', self.enhanced_nightly_processing_job],
                 name='Enhanced Nightly Processing Job with LLM'
             )
             
             # Schedule mastery decay calculation every 6 hours
             self.scheduler.add_job(
-                self.mastery_decay_job,
+                self.run_exclusive,
                 CronTrigger(hour='*/6'),
                 id='mastery_decay',
+                args=['mastery_decay', self.mastery_decay_job],
                 name='Mastery Decay Job'
             )
             
             # Schedule plan extension every day at 1 AM
             self.scheduler.add_job(
-                self.plan_extension_job,
+                self.run_exclusive,
                 CronTrigger(hour=1, minute=0),
                 id='plan_extension',
+                args=['plan_extension', self.plan_extension_job],
                 name='Plan Extension Job'
             )
             
             # Schedule learning impact recomputation weekly
             self.scheduler.add_job(
-                self.learning_impact_job,
+                self.run_exclusive,
                 CronTrigger(day_of_week='sun', hour=3, minute=0),
                 id='learning_impact_update',
+                args=['learning_impact_update', self.learning_impact_job],
                 name='Learning Impact Update Job'
             )
             
+            # Schedule data retention (attempt archival, session pruning) every day at 4 AM
+            self.scheduler.add_job(
+                self.run_exclusive,
+                CronTrigger(hour=4, minute=0),
+                id='data_retention',
+                args=['data_retention', self.data_retention_job],
+                name='Data Retention Job'
+            )
+            
+            # Once at startup: rebuild the review schedule if it is missing attempt history (e.g. first deploy)
+            self.scheduler.add_job(
+                self.run_exclusive,
+                DateTrigger(),
+                id='review_schedule_backfill',
+                args=['review_schedule_backfill', self.review_schedule_backfill_job],
+                name='Review Schedule Backfill Job'
+            )
+            
+            # Leader election: standbys keep polling so one takes over if the leader dies
+            self.scheduler.add_job(
+                self.leader_heartbeat,
+                IntervalTrigger(seconds=LEADER_POLL_SECONDS),
+                id='scheduler_leader_heartbeat',
+                name='Scheduler Leader Heartbeat'
+            )
+            self.leader_lock.try_acquire()
+            
             self.scheduler.start()
-            logger.info("Background job scheduler started")
+            role = "leader" if self.leader_lock.is_leader else "standby"
+            logger.info(f"Background job scheduler started as {role} ({get_worker_id()}, {self.leader_lock.backend})")
             
         except Exception as e:
             logger.error(f"Error starting scheduler: {e}")
@@ -81,10 +135,70 @@ class BackgroundJobProcessor:
         """Stop the background job scheduler"""
         try:
             self.scheduler.shutdown()
+            self.leader_lock.release()
             logger.info("Background job scheduler stopped")
         except Exception as e:
             logger.error(f"Error stopping scheduler: {e}")
     
+    async def leader_heartbeat(self):
+        """Keep (or take over) scheduler leadership"""
+        was_leader = self.leader_lock.is_leader
+        is_leader = self.leader_lock.try_acquire()
+        if is_leader and not was_leader:
+            logger.info(f"👑 {get_worker_id()} took over as scheduler leader")
+    
+    async def run_exclusive(self, job_name: str, job_func):
+        """Run a scheduled job only on the leader worker, recording it in job_runs"""
+        if not self.leader_lock.try_acquire():
+            logger.debug(f"Skipping {job_name} on standby worker {get_worker_id()}")
+            return None
+        
+        job_run_id = await self._record_job_start(job_name)
+        started = time.perf_counter()
+        try:
+            result = await job_func()
+        except Exception as e:
+            observe_job_run(job_name, 'failed', time.perf_counter() - started)
+            await self._record_job_end(job_run_id, 'failed', started, error=str(e))
+            raise
+        
+        status = 'failed' if isinstance(result, dict) and (result.get('status') == 'error' or result.get('success') is False) else 'completed'
+        observe_job_run(job_name, status, time.perf_counter() - started)
+        await self._record_job_end(
+            job_run_id, status, started,
+            result=result if isinstance(result, dict) else None,
+            error=result.get('error') if status == 'failed' else None
+        )
+        return result
+    
+    async def _record_job_start(self, job_name: str):
+        try:
+            async for db in get_async_compatible_db():
+                job_run = JobRun(job_name=job_name, status='running', worker_id=get_worker_id(), started_at=datetime.utcnow())
+                db.add(job_run)
+                await db.commit()
+                return job_run.id
+        except Exception as e:
+            logger.error(f"Error recording start of {job_name}: {e}")
+            return None
+    
+    async def _record_job_end(self, job_run_id, status: str, started: float, result: Dict[str, Any] = None, error: str = None):
+        if job_run_id is None:
+            return
+        try:
+            async for db in get_async_compatible_db():
+                job_run = (await db.execute(select(JobRun).where(JobRun.id == job_run_id))).scalar_one_or_none()
+                if job_run:
+                    job_run.status = status
+                    job_run.completed_at = datetime.utcnow()
+                    job_run.duration_seconds = round(time.perf_counter() - started, 3)
+                    job_run.result = jsonable_result(result)
+                    job_run.error = error
+                    await db.commit()
+                break
+        except Exception as e:
+            logger.error(f"Error recording end of job run {job_run_id}: {e}")
+    
     async def enhanced_nightly_processing_job(self):
         """
         Enhanced nightly processing job with LLM-powered conceptual frequency analysis
@@ -92,18 +206,18 @@ class BackgroundJobProcessor:
         logger.info("🌙 Starting enhanced nightly processing job with conceptual frequency analysis")
         
         try:
-            # Run comprehensive nightly processing using the enhanced engine
-            result = await self.enhanced_nightly_engine.run_nightly_processing()
+            # Run checkpointed nightly processing; an interrupted run is resumed from its ledger
+            async for db in get_async_compatible_db():
+                result = await self.enhanced_nightly_engine.run_nightly_processing(db)
+                break
             
-            if result.get("success", True):  # Default to success if no explicit status
-                logger.info(f"✅ Enhanced nightly processing completed successfully")
+            if result.get("status") == "completed":
+                stats = result.get('stats', {})
+                logger.info(f"✅ Enhanced nightly processing completed successfully (run {result.get('run_id')})")
                 logger.info(f"📊 Processing Statistics:")
-                logger.info(f"   • Attempts processed: {result.get('attempts_processed', 0)}")
-                logger.info(f"   • Mastery updates: {result.get('mastery_updates', 0)}")
-                logger.info(f"   • Frequency updates (conceptual): {result.get('frequency_updates', 0)}")
-                logger.info(f"   • Difficulty updates: {result.get('difficulty_updates', 0)}")
-                logger.info(f"   • Importance updates: {result.get('importance_updates', 0)}")
-                logger.info(f"   • Plan updates: {result.get('plan_updates', 0)}")
+                logger.info(f"   • Mastery updates: {stats.get('mastery_updates', 0)}")
+                logger.info(f"   • Frequency updates (conceptual): {stats.get('frequency_updates', 0)}")
+                logger.info(f"   • Inactive questions handled: {stats.get('inactive_questions', 0)}")
             else:
                 logger.error(f"❌ Enhanced nightly processing failed: {result.get('error', 'Unknown error')}")
                 
@@ -119,78 +233,64 @@ class BackgroundJobProcessor:
         """Main nightly processing job - runs all maintenance tasks"""
         logger.info("Starting nightly processing job")
         
+        steps = [
+            # 1. Update mastery scores with time decay
+            ('mastery_scores', self.update_all_mastery_scores),
+            # 2. Recompute dynamic learning impact
+            ('learning_impact', self.recompute_dynamic_learning_impact),
+            # 3. Update importance indices based on new LI
+            ('importance_indices', self.update_importance_indices),
+            # 4. Clean up old data
+            ('cleanup', self.cleanup_old_data),
+            # 5. Generate usage statistics
+            ('usage_stats', self.generate_usage_stats)
+        ]
+        errors = {}
+        
         try:
-            async for db in get_database():
-                # 1. Update mastery scores with time decay
-                await self.update_all_mastery_scores(db)
-                
-                # 2. Recompute dynamic learning impact
-                await self.recompute_dynamic_learning_impact(db)
-                
-                # 3. Update importance indices based on new LI
-                await self.update_importance_indices(db)
-                
-                # 4. Clean up old data
-                await self.cleanup_old_data(db)
-                
-                # 5. Generate usage statistics
-                await self.generate_usage_stats(db)
-                
-                logger.info("Nightly processing job completed successfully")
+            async for db in get_async_compatible_db():
+                # A failed step is recorded and the remaining steps still run
+                for step_name, step in steps:
+                    try:
+                        await step(db)
+                    except Exception as e:
+                        errors[step_name] = str(e)
                 break
                 
         except Exception as e:
             logger.error(f"Error in nightly processing job: {e}")
+            return {"status": "error", "error": str(e)}
+        
+        if errors:
+            logger.error(f"Nightly processing job finished with failed steps: {', '.join(errors)}")
+            return {"status": "error", "error": "; ".join(f"{name}: {error}" for name, error in errors.items()), "failed_steps": list(errors)}
+        
+        logger.info("Nightly processing job completed successfully")
+        return {"status": "completed"}
     
     async def mastery_decay_job(self):
-        """Job to apply time decay to mastery scores"""
+        """Job to apply time decay to mastery scores (idempotent per day)"""
         logger.info("Starting mastery decay job")
         
         try:
-            async for db in get_database():
-                # Get all users who haven't been active recently
-                cutoff_time = datetime.utcnow() - timedelta(hours=6)
-                
-                inactive_users_result = await db.execute(
-                    select(User.id).where(
-                        ~User.id.in_(
-                            select(Session.user_id).where(
-                                Session.started_at > cutoff_time
-                            )
-                        )
-                    )
+            async for db in get_async_compatible_db():
+                result = await self.mastery_decay_engine.run(db)
+                logger.info(
+                    f"Applied mastery decay to {result['users_decayed']} inactive users "
+                    f"({result['rows_affected']} mastery rows)"
                 )
-                
-                inactive_user_ids = [str(uid) for uid in inactive_users_result.scalars().all()]
-                
-                # Apply decay to inactive users
-                for user_id in inactive_user_ids:
-                    # Calculate days since last activity
-                    last_activity_result = await db.execute(
-                        select(Session.started_at)
-                        .where(Session.user_id == user_id)
-                        .order_by(desc(Session.started_at))
-                        .limit(1)
-                    )
-                    last_activity = last_activity_result.scalar_one_or_none()
-                    
-                    if last_activity:
-                        days_inactive = (datetime.utcnow() - last_activity).days
-                        if days_inactive > 0:
-                            await self.mastery_tracker.apply_time_decay(db, user_id, days_inactive)
-                
-                logger.info(f"Applied mastery decay to {len(inactive_user_ids)} inactive users")
-                break
+                return result
                 
         except Exception as e:
             logger.error(f"Error in mastery decay job: {e}")
+            return {"status": "error", "error": str(e)}
     
     async def plan_extension_job(self):
         """Job to extend study plans with new plan units"""
         logger.info("Starting plan extension job")
         
         try:
-            async for db in get_database():
+            async for db in get_async_compatible_db():
                 # Get all active plans
                 active_plans_result = await db.execute(
                     select(Plan).where(Plan.status == "active")
@@ -202,25 +302,60 @@ class BackgroundJobProcessor:
                     await self.study_planner.extend_plan_units(db, str(plan.id), 5)
                 
                 logger.info(f"Extended {len(active_plans)} active study plans")
-                break
+                return {"status": "completed", "plans_extended": len(active_plans)}
                 
         except Exception as e:
             logger.error(f"Error in plan extension job: {e}")
+            return {"status": "error", "error": str(e)}
     
     async def learning_impact_job(self):
         """Weekly job to recompute learning impact with dynamic factors"""
         logger.info("Starting learning impact update job")
         
         try:
-            async for db in get_database():
-                await self.recompute_dynamic_learning_impact(db)
-                await self.update_importance_indices(db)
+            async for db in get_async_compatible_db():
+                learning_impact = await self.recompute_dynamic_learning_impact(db)
+                importance = await self.update_importance_indices(db)
                 
                 logger.info("Learning impact update job completed")
-                break
+                return {"status": "completed", "learning_impact": learning_impact, "importance_indices": importance}
                 
         except Exception as e:
             logger.error(f"Error in learning impact job: {e}")
+            return {"status": "error", "error": str(e)}
+    
+    async def data_retention_job(self):
+        """Daily job to archive cold attempts and prune old sessions in bounded chunks"""
+        logger.info("Starting data retention job")
+        
+        try:
+            async for db in get_async_compatible_db():
+                result = await self.cleanup_old_data(db)
+                logger.info("Data retention job completed")
+                return result
+                
+        except Exception as e:
+            logger.error(f"Error in data retention job: {e}")
+            return {"status": "error", "error": str(e)}
+    
+    async def review_schedule_backfill_job(self):
+        """Bring the review schedule up to date for users whose schedule is missing attempt history"""
+        logger.info("Starting review schedule backfill check")
+        
+        try:
+            async for db in get_async_compatible_db():
+                user_ids = await self.spaced_repetition_engine.users_missing_review_history(db)
+                if not user_ids:
+                    logger.info("Review schedule is up to date with attempt history")
+                    return {"status": "completed", "backfill_needed": False}
+                
+                result = await self.spaced_repetition_engine.backfill_review_schedule(db, user_ids)
+                logger.info(f"📅 Review schedule backfilled: {result['rows_written']} rows for {result['users_processed']} users")
+                return {"status": "completed", "backfill_needed": True, **result}
+                
+        except Exception as e:
+            logger.error(f"Error in review schedule backfill job: {e}")
+            return {"status": "error", "error": str(e)}
     
     async def update_all_mastery_scores(self, db: AsyncSession):
         """Update mastery scores for all users"""
@@ -268,53 +403,29 @@ class BackgroundJobProcessor:
         except Exception as e:
             logger.error(f"Error updating mastery scores: {e}")
             await db.rollback()
+            raise
     
     async def recompute_dynamic_learning_impact(self, db: AsyncSession):
-        """Recompute dynamic learning impact for all questions"""
+        """
+        Recompute dynamic learning impact for all questions.
+        Delegates to the batch engine, which streams the 90-day attempt window once
+        instead of issuing per-question queries.
+        """
         try:
-            # Get all active questions
-            questions_result = await db.execute(
-                select(Question).where(Question.is_active == True)
-            )
-            questions = questions_result.scalars().all()
-            
-            updated_count = 0
-            
-            for question in questions:
-                try:
-                    # Calculate dynamic components
-                    dynamic_li = await self.calculate_dynamic_learning_impact(db, question)
-                    
-                    # Blend with static LI: 0.60 * Static + 0.40 * Dynamic
-                    static_li = float(question.learning_impact) if question.learning_impact else 50.0
-                    blended_li = 0.60 * static_li + 0.40 * dynamic_li
-                    
-                    # Update question
-                    question.learning_impact = round(blended_li, 2)
-                    
-                    # Update learning impact band
-                    if blended_li >= 70:
-                        question.learning_impact_band = "High"
-                    elif blended_li >= 45:
-                        question.learning_impact_band = "Medium"
-                    else:
-                        question.learning_impact_band = "Low"
-                    
-                    updated_count += 1
-                    
-                except Exception as e:
-                    logger.warning(f"Error updating LI for question {question.id}: {e}")
-                    continue
-            
-            await db.commit()
-            logger.info(f"Updated dynamic learning impact for {updated_count} questions")
+            result = await self.learning_impact_engine.recompute(db)
+            logger.info(f"Updated dynamic learning impact for {result['updated_count']} questions")
+            logger.info(f"Learning impact timings: {result['timings']}")
+            return result
             
         except Exception as e:
             logger.error(f"Error recomputing dynamic learning impact: {e}")
             await db.rollback()
+            raise
     
     async def calculate_dynamic_learning_impact(self, db: AsyncSession, question: Question) -> float:
         """
+        Per-question reference implementation of the dynamic LI (the batch engine in
+        learning_impact_engine.py computes the same components for the whole bank).
         Calculate dynamic learning impact components:
         - CTU (Cross-Topic Uplift)
         - Misconception richness 
@@ -502,70 +613,31 @@ class BackgroundJobProcessor:
             return 60.0
     
     async def update_importance_indices(self, db: AsyncSession):
-        """Update importance indices based on new learning impact scores"""
+        """Update importance indices based on new learning impact scores (single server-side UPDATE)"""
         try:
-            questions_result = await db.execute(
-                select(Question).where(Question.is_active == True)
-            )
-            questions = questions_result.scalars().all()
-            
-            updated_count = 0
-            
-            for question in questions:
-                # Recalculate importance using the formula:
-                # 0.50×Frequency + 0.25×DifficultyNorm + 0.25×LearningImpact
-                
-                frequency_scores = {"High": 100, "Medium": 60, "Low": 30}
-                frequency_score = frequency_scores.get(question.frequency_band, 60)
-                
-                difficulty_norm = 20 + ((float(question.difficulty_score or 3) - 1) / 4) * 80
-                learning_impact = float(question.learning_impact) if question.learning_impact else 50
-                
-                importance = (
-                    0.50 * frequency_score +
-                    0.25 * difficulty_norm +
-                    0.25 * learning_impact
-                )
-                
-                question.importance_index = round(importance, 2)
-                
-                # Update importance band
-                if importance >= 70:
-                    question.importance_band = "High"
-                elif importance >= 45:
-                    question.importance_band = "Medium"
-                else:
-                    question.importance_band = "Low"
-                
-                updated_count += 1
-            
-            await db.commit()
-            logger.info(f"Updated importance indices for {updated_count} questions")
+            result = await recompute_importance_indices(db)
+            logger.info(f"Updated importance indices for {result['updated_count']} questions")
+            return result
             
         except Exception as e:
             logger.error(f"Error updating importance indices: {e}")
             await db.rollback()
+            raise
     
     async def cleanup_old_data(self, db: AsyncSession):
-        """Clean up old data to maintain performance"""
+        """Clean up old data to maintain performance (chunked archival of attempts, pruning of sessions)"""
         try:
-            # Remove old sessions (older than 90 days)
-            cutoff_date = datetime.utcnow() - timedelta(days=90)
-            
-            old_sessions_result = await db.execute(
-                select(Session).where(Session.started_at < cutoff_date)
+            result = await self.retention_manager.run(db)
+            logger.info(
+                f"Archived {result['attempts']['archived']} attempts and "
+                f"cleaned up {result['sessions']['deleted']} old sessions"
             )
-            old_sessions = old_sessions_result.scalars().all()
-            
-            for session in old_sessions:
-                await db.delete(session)
-            
-            await db.commit()
-            logger.info(f"Cleaned up {len(old_sessions)} old sessions")
+            return result
             
         except Exception as e:
             logger.error(f"Error cleaning up old data: {e}")
             await db.rollback()
+            raise
     
     async def generate_usage_stats(self, db: AsyncSession):
         """Generate daily usage statistics"""
@@ -609,12 +681,17 @@ class BackgroundJobProcessor:
             
         except Exception as e:
             logger.error(f"Error generating usage stats: {e}")
+            raise
+
+def jsonable_result(result: Dict[str, Any] = None):
+    """Job results contain datetimes (e.g. nightly processing stats); store them as ISO strings"""
+    if result is None:
+        return None
+    return json.loads(json.dumps(result, default=str))
 
 # Global instance
 job_processor = None
 
-from enhanced_nightly_engine import EnhancedNightlyEngine
-
 # Note: Enhanced nightly engine initialized in main function with LLM pipeline
 
 async def enhanced_nightly_processing_job():
@@ -661,6 +738,10 @@ def start_background_processing(llm_api_key: str):
     except Exception as e:
         logger.error(f"Error starting background processing: {e}")
 
+def get_scheduler_status() -> Dict[str, Any]:
+    """Leader/standby status of this worker's scheduler"""
+    return describe_lock(job_processor.leader_lock if job_processor else None)
+
 def stop_background_processing():
     """Stop background job processing"""
     global job_processor
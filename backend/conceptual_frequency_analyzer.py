@@ -8,8 +8,9 @@ import asyncio
 from typing import Dict, List, Optional, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, desc
-from datetime import datetime, timedelta
-from database import Question, PYQQuestion, PYQPaper, AsyncSession
+from datetime import datetime
+from database import Question, PYQQuestion, AsyncSession
+from pyq_concept_index import pyq_concept_index, keyword_similarity
 
 logger = logging.getLogger(__name__)
 
@@ -21,15 +22,19 @@ class ConceptualFrequencyAnalyzer:
     def __init__(self, llm_pipeline):
         self.llm_pipeline = llm_pipeline
         self.concept_cache = {}  # Cache for analyzed patterns
+        self.concept_index = pyq_concept_index
+        self.similarity_cache = {}  # pattern signature -> {pyq_question_id: similarity}
         
     async def calculate_conceptual_frequency(
         self, 
         db: AsyncSession, 
         question: Question, 
-        years_window: int = 10
+        years_window: int = 10,
+        refresh_index: bool = True
     ) -> Dict[str, Any]:
         """
         Calculate conceptual frequency using LLM pattern recognition
+        (batch callers refresh the PYQ concept index once and pass refresh_index=False)
         """
         try:
             logger.info(f"Starting conceptual frequency analysis for question {question.id}")
@@ -39,7 +44,7 @@ class ConceptualFrequencyAnalyzer:
             
             # Step 2: Find conceptually similar PYQ questions
             similar_pyq_questions = await self.find_conceptual_matches(
-                db, question_pattern, years_window
+                db, question_pattern, years_window, refresh_index=refresh_index
             )
             
             # Step 3: Calculate conceptual similarity scores
@@ -163,40 +168,34 @@ class ConceptualFrequencyAnalyzer:
         self, 
         db: AsyncSession, 
         question_pattern: Dict[str, Any], 
-        years_window: int
+        years_window: int,
+        refresh_index: bool = True
     ) -> List[PYQQuestion]:
         """
         Find PYQ questions with similar mathematical concepts
+        (scored from the PYQ concept index; only matching PYQs are loaded)
         """
         try:
-            cutoff_date = datetime.now() - timedelta(days=years_window * 365)
+            min_year = datetime.now().year - years_window
             
-            # Get PYQ questions from the relevance window
-            result = await db.execute(
-                select(PYQQuestion)
-                .join(PYQPaper, PYQQuestion.paper_id == PYQPaper.id)
-                .where(
-                    and_(
-                        PYQPaper.exam_date >= cutoff_date,
-                        PYQQuestion.is_active == True
-                    )
-                )
-                .limit(500)  # Reasonable limit for analysis
-            )
+            if refresh_index:
+                await self.concept_index.ensure_fresh(db)
+            similarities = self.concept_index.score(question_pattern, min_year=min_year)
             
-            pyq_questions = result.scalars().all()
+            similar_ids = [
+                pyq_question_id for pyq_question_id, similarity_score in similarities.items()
+                if similarity_score > 0.3  # Similarity threshold
+            ]
+            if len(self.similarity_cache) >= 256:
+                self.similarity_cache.clear()
+            self.similarity_cache[self.pattern_signature(question_pattern)] = similarities
             
-            # Find conceptually similar questions
             similar_questions = []
-            pattern_keywords = set(question_pattern.get('keywords', []))
-            
-            for pyq_q in pyq_questions:
-                similarity_score = await self.calculate_similarity_score(
-                    question_pattern, pyq_q
+            if similar_ids:
+                result = await db.execute(
+                    select(PYQQuestion).where(PYQQuestion.id.in_(similar_ids))
                 )
-                
-                if similarity_score > 0.3:  # Similarity threshold
-                    similar_questions.append(pyq_q)
+                similar_questions = result.scalars().all()
             
             logger.info(f"Found {len(similar_questions)} conceptually similar PYQ questions")
             return similar_questions
@@ -205,6 +204,12 @@ class ConceptualFrequencyAnalyzer:
             logger.error(f"Error finding conceptual matches: {e}")
             return []
     
+    def pattern_signature(self, question_pattern: Dict[str, Any]) -> Tuple:
+        return (
+            tuple(sorted(set(question_pattern.get('keywords', [])))),
+            question_pattern.get('solution_approach', '')
+        )
+    
     async def calculate_similarity_score(
         self, 
         question_pattern: Dict[str, Any], 
@@ -214,32 +219,12 @@ class ConceptualFrequencyAnalyzer:
         Calculate semantic similarity between question pattern and PYQ question
         """
         try:
-            # Simple similarity based on subcategory and keywords
-            score = 0.0
-            
-            # Subcategory match (40% weight)
-            if (question_pattern.get('solution_approach', '').lower() == 
-                pyq_question.subcategory.lower() if pyq_question.subcategory else False):
-                score += 0.4
-            
-            # Keyword overlap (40% weight)
-            pattern_keywords = set(question_pattern.get('keywords', []))
-            pyq_text = pyq_question.question_text.lower() if pyq_question.question_text else ""
-            
-            keyword_matches = sum(1 for keyword in pattern_keywords 
-                                 if keyword.lower() in pyq_text)
+            cached = self.similarity_cache.get(self.pattern_signature(question_pattern))
+            if cached is not None and pyq_question.id in cached:
+                return cached[pyq_question.id]
             
-            if pattern_keywords:
-                keyword_score = keyword_matches / len(pattern_keywords)
-                score += 0.4 * keyword_score
-            
-            # Difficulty similarity (20% weight)
-            if (pyq_question.difficulty_level and 
-                pyq_question.difficulty_level.lower() in 
-                question_pattern.get('difficulty_indicators', [])):
-                score += 0.2
-            
-            return min(1.0, score)
+            # Subcategory match (40%) + keyword overlap with the stem (40%)
+            return keyword_similarity(question_pattern, pyq_question.stem, pyq_question.subcategory)
             
         except Exception as e:
             logger.warning(f"Error calculating similarity score: {e}")
@@ -353,10 +338,13 @@ class ConceptualFrequencyAnalyzer:
             analyzed_count = 0
             error_count = 0
             
+            # One index freshness check for the whole batch
+            await self.concept_index.ensure_fresh(db)
+            
             for question in questions:
                 try:
                     analysis_result = await self.calculate_conceptual_frequency(
-                        db, question, years_window=10
+                        db, question, years_window=10, refresh_index=False
                     )
                     
                     if analysis_result.get('status') == 'completed':
@@ -0,0 +1,262 @@
+"""
+Data Retention and Archival for CAT Preparation Platform
+Moves cold attempts out of the hot table and prunes old sessions in bounded chunks
+"""
+
+import os
+import json
+import importlib.util
+import logging
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Optional
+from sqlalchemy import select, insert, update, delete, func, and_, case, literal, DateTime
+from database import (
+    Attempt, AttemptArchive, AttemptDailySummary, Question, ReviewSchedule, Session, SessionQuestion, Topic, AsyncSession
+)
+
+logger = logging.getLogger(__name__)
+
+SESSION_RETENTION_DAYS = int(os.getenv("SESSION_RETENTION_DAYS", "90"))
+ATTEMPT_RETENTION_DAYS = int(os.getenv("ATTEMPT_RETENTION_DAYS", "365"))
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "5000"))
+ATTEMPT_ARCHIVE_FORMAT = os.getenv("ATTEMPT_ARCHIVE_FORMAT", "table")  # table|parquet
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(Path(__file__).parent / "archive")))
+
+_ARCHIVED_ATTEMPT_COLUMNS = [
+    'id', 'user_id', 'question_id', 'attempt_no', 'context', 'options', 'user_answer',
+    'correct', 'time_sec', 'hint_used', 'model_feedback', 'misconception_tag', 'created_at'
+]
+
+
+class DataRetentionManager:
+    """
+    Bounded-chunk retention for the fastest-growing tables.
+
+    Each chunk is a primary-key range [lo, hi] of rows older than the cutoff: the
+    range is found with an index-ordered OFFSET probe, then copied/summarised and
+    deleted with range predicates, and committed on its own. Transactions stay
+    short and a failure loses at most one chunk of work.
+    """
+
+    def __init__(
+        self,
+        session_retention_days: int = SESSION_RETENTION_DAYS,
+        attempt_retention_days: int = ATTEMPT_RETENTION_DAYS,
+        chunk_size: int = RETENTION_CHUNK_SIZE,
+        archive_format: str = ATTEMPT_ARCHIVE_FORMAT,
+        archive_dir: Path = ARCHIVE_DIR
+    ):
+        self.session_retention_days = session_retention_days
+        self.attempt_retention_days = attempt_retention_days
+        self.chunk_size = chunk_size
+        self.archive_format = archive_format
+        self.archive_dir = Path(archive_dir)
+
+    async def run(self, db: AsyncSession, max_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """Archive cold attempts, then prune old sessions"""
+        attempts_result = await self.archive_old_attempts(db, max_chunks=max_chunks)
+        sessions_result = await self.prune_old_sessions(db, max_chunks=max_chunks)
+        return {'attempts': attempts_result, 'sessions': sessions_result}
+
+    async def prune_old_sessions(self, db: AsyncSession, max_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """Delete sessions older than the retention window, one primary-key range per transaction"""
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(days=self.session_retention_days)
+        is_old = Session.started_at < cutoff
+
+        deleted = 0
+        chunks = 0
+        lower_id = None
+        while max_chunks is None or chunks < max_chunks:
+            upper_id = await self._next_chunk_upper_id(db, Session.id, is_old, lower_id)
+            if upper_id is None:
+                break
+
+            in_chunk = self._chunk_filter(Session.id, is_old, lower_id, upper_id)
+            await db.execute(
+                delete(SessionQuestion)
+                .where(SessionQuestion.session_id.in_(select(Session.id).where(in_chunk)))
+                .execution_options(synchronize_session=False)
+            )
+            result = await db.execute(delete(Session).where(in_chunk).execution_options(synchronize_session=False))
+            await db.commit()
+
+            deleted += result.rowcount
+            chunks += 1
+            lower_id = upper_id
+
+        duration = round(time.perf_counter() - started, 3)
+        logger.info(f"Pruned {deleted} sessions older than {self.session_retention_days} days in {chunks} chunks ({duration}s)")
+        return {'deleted': deleted, 'chunks': chunks, 'cutoff': cutoff.isoformat(), 'duration_seconds': duration}
+
+    async def archive_old_attempts(self, db: AsyncSession, max_chunks: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Move attempts older than the retention window to attempts_archive (or Parquet files),
+        writing per user/day/subcategory summaries for dashboards (and the review schedule's archived
+        totals) before deleting them
+        """
+        started = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(days=self.attempt_retention_days)
+        is_old = Attempt.created_at < cutoff
+        archive_format = self._resolve_archive_format()
+
+        archived = 0
+        chunks = 0
+        lower_id = None
+        while max_chunks is None or chunks < max_chunks:
+            upper_id = await self._next_chunk_upper_id(db, Attempt.id, is_old, lower_id)
+            if upper_id is None:
+                break
+
+            in_chunk = self._chunk_filter(Attempt.id, is_old, lower_id, upper_id)
+            try:
+                if archive_format == 'parquet':
+                    await self._write_parquet_chunk(db, in_chunk, cutoff, chunks)
+                else:
+                    await db.execute(
+                        insert(AttemptArchive).from_select(
+                            _ARCHIVED_ATTEMPT_COLUMNS,
+                            select(*[getattr(Attempt, column) for column in _ARCHIVED_ATTEMPT_COLUMNS]).where(in_chunk)
+                        )
+                    )
+                await self._summarise_chunk(db, in_chunk)
+                await self._carry_review_schedule_totals(db, in_chunk)
+                result = await db.execute(delete(Attempt).where(in_chunk).execution_options(synchronize_session=False))
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            archived += result.rowcount
+            chunks += 1
+            lower_id = upper_id
+
+        duration = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Archived {archived} attempts older than {self.attempt_retention_days} days "
+            f"to {archive_format} in {chunks} chunks ({duration}s)"
+        )
+        return {
+            'archived': archived,
+            'chunks': chunks,
+            'archive_format': archive_format,
+            'cutoff': cutoff.isoformat(),
+            'duration_seconds': duration
+        }
+
+    async def _next_chunk_upper_id(self, db: AsyncSession, id_column, is_old, lower_id: Optional[str]) -> Optional[str]:
+        """Primary key closing the next chunk: the chunk_size-th old row after lower_id, or the last one"""
+        after_lower = is_old if lower_id is None else and_(is_old, id_column > lower_id)
+
+        upper_id = (await db.execute(
+            select(id_column).where(after_lower).order_by(id_column).offset(self.chunk_size - 1).limit(1)
+        )).scalar()
+        if upper_id is None:
+            upper_id = (await db.execute(select(func.max(id_column)).where(after_lower))).scalar()
+        return upper_id
+
+    def _chunk_filter(self, id_column, is_old, lower_id: Optional[str], upper_id: str):
+        """Range predicate for one chunk; the age filter stays so newer rows inside the range are kept"""
+        if lower_id is None:
+            return and_(is_old, id_column <= upper_id)
+        return and_(is_old, id_column > lower_id, id_column <= upper_id)
+
+    async def _summarise_chunk(self, db: AsyncSession, in_chunk):
+        """Aggregate the chunk into attempt_daily_summaries, by the question dimensions the dashboards group on"""
+        summary_date = func.date(Attempt.created_at)
+        dimensions = (Question.topic_id, Question.subcategory, Question.type_of_question, Question.difficulty_band)
+        await db.execute(
+            insert(AttemptDailySummary).from_select(
+                ['id', 'user_id', 'summary_date', 'topic_id', 'subcategory', 'type_of_question', 'difficulty_band',
+                 'attempts', 'correct_attempts', 'total_time_sec', 'created_at'],
+                select(
+                    func.min(Attempt.id),
+                    Attempt.user_id,
+                    summary_date,
+                    *dimensions,
+                    func.count(Attempt.id),
+                    func.sum(case((Attempt.correct == True, 1), else_=0)),
+                    func.coalesce(func.sum(Attempt.time_sec), 0),
+                    literal(datetime.utcnow(), DateTime)
+                )
+                .outerjoin(Question, Attempt.question_id == Question.id)
+                .where(in_chunk)
+                .group_by(Attempt.user_id, summary_date, *dimensions)
+            )
+        )
+
+    async def _carry_review_schedule_totals(self, db: AsyncSession, in_chunk):
+        """
+        Count the chunk in review_schedule.archived_attempts, so rebuilding a schedule row from the
+        remaining attempts keeps the totals of archived ones
+        """
+        chunk_totals = (
+            select(
+                Attempt.user_id,
+                Attempt.question_id,
+                func.count(Attempt.id).label('attempts'),
+                func.sum(case((Attempt.correct == True, 1), else_=0)).label('correct_attempts')
+            )
+            .where(in_chunk)
+            .group_by(Attempt.user_id, Attempt.question_id)
+            .subquery('chunk_totals')
+        )
+        await db.execute(
+            update(ReviewSchedule)
+            .where(
+                ReviewSchedule.user_id == chunk_totals.c.user_id,
+                ReviewSchedule.question_id == chunk_totals.c.question_id
+            )
+            .values(
+                archived_attempts=func.coalesce(ReviewSchedule.archived_attempts, 0) + chunk_totals.c.attempts,
+                archived_correct_attempts=func.coalesce(ReviewSchedule.archived_correct_attempts, 0) + chunk_totals.c.correct_attempts
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    def _resolve_archive_format(self) -> str:
+        """Parquet needs pandas + pyarrow; fall back to the archive table when they are missing"""
+        if self.archive_format != 'parquet':
+            return 'table'
+        if importlib.util.find_spec('pandas') and importlib.util.find_spec('pyarrow'):
+            return 'parquet'
+        logger.warning("pyarrow not installed - archiving attempts to the attempts_archive table instead of Parquet")
+        return 'table'
+
+    async def _write_parquet_chunk(self, db: AsyncSession, in_chunk, cutoff: datetime, chunk_number: int):
+        """Write one chunk as a zstd-compressed Parquet file under ARCHIVE_DIR/attempts"""
+        import pandas as pd
+
+        rows = (await db.execute(
+            select(*[getattr(Attempt, column) for column in _ARCHIVED_ATTEMPT_COLUMNS]).where(in_chunk)
+        )).all()
+        frame = pd.DataFrame(rows, columns=_ARCHIVED_ATTEMPT_COLUMNS)
+        frame['options'] = frame['options'].map(json.dumps)
+        frame['archived_at'] = datetime.utcnow()
+
+        target_dir = self.archive_dir / "attempts"
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / f"attempts_before_{cutoff:%Y%m%d}_{datetime.utcnow():%H%M%S}_{chunk_number:05d}.parquet"
+        frame.to_parquet(target, compression='zstd', index=False)
+        logger.info(f"Wrote {len(frame)} archived attempts to {target}")
+
+
+async def get_archived_attempt_totals(db: AsyncSession, user_id: str, *columns) -> list:
+    """
+    The user's archived attempts from attempt_daily_summaries, summed per the given AttemptDailySummary
+    (or Topic) columns: rows of (*columns, attempts, correct_attempts). Dashboards add these to their live
+    attempt aggregates so totals survive archival.
+    """
+    return (await db.execute(
+        select(
+            *columns,
+            func.sum(AttemptDailySummary.attempts).label('attempts'),
+            func.sum(AttemptDailySummary.correct_attempts).label('correct_attempts')
+        )
+        .select_from(AttemptDailySummary)
+        .outerjoin(Topic, Topic.id == AttemptDailySummary.topic_id)
+        .where(AttemptDailySummary.user_id == user_id)
+        .group_by(*columns)
+    )).fetchall()
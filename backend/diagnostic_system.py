@@ -5,13 +5,20 @@ Implements fixed blueprint diagnostic with capability scoring as per specificati
 
 import json
 import uuid
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional
 from datetime import datetime
 import logging
 from formulas import get_diagnostic_blueprint
-from database import DiagnosticSet, DiagnosticSetQuestion, Diagnostic, User, Question, Topic
+from database import DiagnosticSet, DiagnosticSetQuestion, Diagnostic, User, Question, Topic, get_catalog_version
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, or_, insert
+
+# Fallback difficulties in the order they are tried for each requested difficulty
+FALLBACK_DIFFICULTIES = {
+    "Hard": ["Medium", "Easy"],
+    "Medium": ["Easy", "Hard"],
+    "Easy": ["Medium", "Hard"]
+}
 
 logger = logging.getLogger(__name__)
 
@@ -82,25 +89,50 @@ class DiagnosticSystem:
         }
     
     async def create_diagnostic_set(self, db: AsyncSession) -> DiagnosticSet:
-        """Create the fixed 25-question diagnostic set"""
+        """
+        The fixed 25-question diagnostic set for the current question catalog. The active set is reused
+        while its meta["catalog_version"] matches; after a catalog change its slots are re-assigned and,
+        if any question differs, a new set version replaces it (diagnostics keep their own set).
+        """
         try:
-            # Check if diagnostic set already exists
             result = await db.execute(
-                select(DiagnosticSet).where(DiagnosticSet.name == self.diagnostic_blueprint["name"])
+                select(DiagnosticSet).where(
+                    DiagnosticSet.name == self.diagnostic_blueprint["name"],
+                    DiagnosticSet.is_active == True
+                )
             )
             existing_set = result.scalar_one_or_none()
+            catalog_version = await self.get_catalog_version(db)
             
-            if existing_set:
+            if existing_set and (existing_set.meta or {}).get("catalog_version") == catalog_version:
                 logger.info("Diagnostic set already exists")
                 return existing_set
             
+            assignment = await self.build_diagnostic_assignment(db)
+            
+            if existing_set:
+                current = (await db.execute(
+                    select(DiagnosticSetQuestion.seq, DiagnosticSetQuestion.question_id)
+                    .where(DiagnosticSetQuestion.set_id == existing_set.id)
+                    .order_by(DiagnosticSetQuestion.seq)
+                )).all()
+                if [(seq, question_id) for seq, question_id in current] == [(slot["seq"], slot["question_id"]) for slot in assignment]:
+                    existing_set.meta = {**(existing_set.meta or {}), "catalog_version": catalog_version}
+                    await db.commit()
+                    logger.info("Diagnostic set unchanged by catalog update")
+                    return existing_set
+                
+                existing_set.is_active = False
+                logger.info(f"Catalog changed since diagnostic set {existing_set.id} was built, creating a new version")
+            
             # Create new diagnostic set
             diagnostic_set = DiagnosticSet(
                 name=self.diagnostic_blueprint["name"],
                 meta={
                     "blueprint": self.diagnostic_blueprint,
                     "created_by": "system",
-                    "version": "1.0"
+                    "version": "1.0",
+                    "catalog_version": catalog_version
                 },
                 is_active=True
             )
@@ -108,28 +140,16 @@ class DiagnosticSystem:
             db.add(diagnostic_set)
             await db.flush()  # Get the ID
             
-            # Create diagnostic set questions
-            question_count = 0
-            used_question_ids = set()  # Track used questions to avoid duplicates
-            
-            for category, category_data in self.diagnostic_blueprint["distribution"].items():
-                for question_spec in category_data["questions"]:
-                    # Find a suitable question for this specification
-                    question = await self._find_diagnostic_question(
-                        db, category, question_spec["subcategory"], question_spec["difficulty"], used_question_ids
-                    )
-                    
-                    if question:
-                        diagnostic_set_question = DiagnosticSetQuestion(
-                            set_id=diagnostic_set.id,
-                            question_id=question.id,
-                            seq=question_spec["seq"]
-                        )
-                        db.add(diagnostic_set_question)
-                        used_question_ids.add(question.id)  # Mark question as used
-                        question_count += 1
-                    else:
-                        logger.warning(f"No question found for {category} -> {question_spec['subcategory']} ({question_spec['difficulty']})")
+            if assignment:
+                await db.execute(insert(DiagnosticSetQuestion), [
+                    {
+                        "set_id": diagnostic_set.id,
+                        "question_id": slot["question_id"],
+                        "seq": slot["seq"]
+                    }
+                    for slot in assignment
+                ])
+            question_count = len(assignment)
             
             await db.commit()
             logger.info(f"Created diagnostic set with {question_count} questions")
@@ -140,6 +160,93 @@ class DiagnosticSystem:
             await db.rollback()
             raise
     
+    async def get_catalog_version(self, db: AsyncSession) -> str:
+        """The shared question catalog version (as used for ETags), as a string for the set's meta"""
+        return "|".join(str(part) for part in await get_catalog_version(db))
+    
+    async def build_diagnostic_assignment(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        """
+        Assign a question to every blueprint slot.
+        Candidates for all blueprint subcategories and categories are loaded in one query
+        and slots are filled in memory with the _find_diagnostic_question fallback order.
+        """
+        slots = [
+            (category, question_spec)
+            for category, category_data in self.diagnostic_blueprint["distribution"].items()
+            for question_spec in category_data["questions"]
+        ]
+        subcategories = sorted({question_spec["subcategory"] for _, question_spec in slots})
+        categories = sorted({category for category, _ in slots})
+        
+        result = await db.execute(
+            select(Question.id, Question.subcategory, Question.difficulty_band, Topic.name)
+            .join(Question.topic)
+            .where(
+                Question.is_active == True,
+                or_(Question.subcategory.in_(subcategories), Topic.name.in_(categories))
+            )
+            .order_by(Question.importance_index.desc())
+        )
+        
+        # Candidate lists in importance order, with cursors that skip used questions
+        by_subcategory_difficulty: Dict[Tuple[str, str], List[str]] = {}
+        by_category: Dict[str, List[str]] = {}
+        for question_id, subcategory, difficulty_band, topic_name in result.all():
+            by_subcategory_difficulty.setdefault((subcategory, difficulty_band), []).append(question_id)
+            by_category.setdefault(topic_name, []).append(question_id)
+        cursors: Dict[Any, int] = {}
+        used_question_ids = set()
+        any_active: Optional[List[str]] = None
+        
+        def take(key, candidates: List[str]) -> Optional[str]:
+            position = cursors.get(key, 0)
+            while position < len(candidates) and candidates[position] in used_question_ids:
+                position += 1
+            cursors[key] = position
+            return candidates[position] if position < len(candidates) else None
+        
+        assignment = []
+        for category, question_spec in slots:
+            subcategory, difficulty = question_spec["subcategory"], question_spec["difficulty"]
+            
+            # Exact match, then fallback difficulties
+            question_id = None
+            for attempt_difficulty in [difficulty] + FALLBACK_DIFFICULTIES.get(difficulty, ["Medium", "Hard"]):
+                key = (subcategory, attempt_difficulty)
+                question_id = take(key, by_subcategory_difficulty.get(key, []))
+                if question_id:
+                    if attempt_difficulty != difficulty:
+                        logger.warning(f"Using fallback difficulty {attempt_difficulty} for {subcategory} (wanted {difficulty})")
+                    break
+            
+            # Any question from the same category
+            if not question_id:
+                question_id = take(("category", category), by_category.get(category, []))
+                if question_id:
+                    logger.warning(f"Using fallback question from category {category} for {subcategory} ({difficulty})")
+            
+            # Any active question (loaded only if a slot gets this far)
+            if not question_id:
+                if any_active is None:
+                    any_result = await db.execute(
+                        select(Question.id)
+                        .where(Question.is_active == True)
+                        .order_by(Question.importance_index.desc())
+                        .limit(len(slots) * 2)
+                    )
+                    any_active = list(any_result.scalars().all())
+                question_id = take("any", any_active)
+                if question_id:
+                    logger.warning(f"Using fallback question (any active) for {subcategory} ({difficulty})")
+            
+            if question_id:
+                used_question_ids.add(question_id)
+                assignment.append({"seq": question_spec["seq"], "question_id": question_id})
+            else:
+                logger.warning(f"No question found for {category} -> {subcategory} ({difficulty})")
+        
+        return assignment
+    
     async def _find_diagnostic_question(self, db: AsyncSession, category: str, subcategory: str, difficulty: str, used_question_ids: set = None) -> Question:
         """Find a question matching the diagnostic criteria with fallback options"""
         try:
@@ -244,13 +351,17 @@ class DiagnosticSystem:
             if not diagnostic_set:
                 raise ValueError("No active diagnostic set found")
             
-            # Check if user already has a completed diagnostic
+            # Check if user already has a completed diagnostic (on any version of the set)
             existing_result = await db.execute(
                 select(Diagnostic).where(
                     Diagnostic.user_id == user_id,
-                    Diagnostic.set_id == diagnostic_set.id,
+                    Diagnostic.set_id.in_(
+                        select(DiagnosticSet.id).where(DiagnosticSet.name == diagnostic_set.name)
+                    ),
                     Diagnostic.completed_at.isnot(None)
                 )
+                .order_by(Diagnostic.completed_at.desc())
+                .limit(1)
             )
             existing_diagnostic = existing_result.scalar_one_or_none()
             
@@ -4,29 +4,50 @@ Enhanced Nightly Processing Engine for CAT Preparation Platform
 Comprehensive processing with LLM-powered conceptual frequency analysis
 """
 
+import os
 import logging
 import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, text, desc
+from sqlalchemy import select, func, and_, or_, text, desc, update, bindparam, case
 from database import (
-    Question, User, Attempt, Mastery, Topic, Session,
-    PYQQuestion, PYQPaper, PYQIngestion
+    Question, User, Attempt, Mastery, Session,
+    PYQQuestion, PYQPaper, PYQIngestion, NightlyRun, NightlyRunStage
 )
 from conceptual_frequency_analyzer import ConceptualFrequencyAnalyzer
 from time_weighted_frequency_analyzer import TimeWeightedFrequencyAnalyzer, CAT_ANALYSIS_CONFIG
 
 logger = logging.getLogger(__name__)
 
+# Stages run in this order; each has a run_<name>_stage handler
+NIGHTLY_STAGES = ['mastery', 'frequency', 'cleanup', 'statistics']
+
+NIGHTLY_STAGE_LABELS = {
+    'mastery': "📊 Updating mastery calculations...",
+    'frequency': "📈 Refreshing enhanced PYQ frequencies...",
+    'cleanup': "🧹 Cleaning up inactive questions...",
+    'statistics': "📋 Updating question statistics..."
+}
+
+# A run still failing after this many resumes is abandoned so later data gets a new window
+NIGHTLY_MAX_RESUMES = int(os.getenv("NIGHTLY_MAX_RESUMES", "3"))
+
+# Window for a stage's very first run (no completed watermark yet); absent means full reprocess
+NIGHTLY_STAGE_INITIAL_LOOKBACK = {
+    'mastery': timedelta(hours=24)
+}
+
 class EnhancedNightlyEngine:
     """
     Enhanced nightly processing engine with comprehensive frequency analysis
     Uses time-weighted frequency calculation for better accuracy
     """
     
-    def __init__(self, llm_pipeline=None):
+    def __init__(self, llm_pipeline=None, mastery_chunk_size: int = 500):
         self.time_analyzer = TimeWeightedFrequencyAnalyzer(CAT_ANALYSIS_CONFIG)
+        self.mastery_chunk_size = mastery_chunk_size
         self.conceptual_analyzer = ConceptualFrequencyAnalyzer(llm_pipeline) if llm_pipeline else None
         self.processing_stats = {
             'start_time': None,
@@ -39,30 +60,36 @@ class EnhancedNightlyEngine:
     
     async def run_nightly_processing(self, db: AsyncSession) -> Dict[str, Any]:
         """
-        Run enhanced nightly processing tasks
+        Run enhanced nightly processing tasks as a checkpointed run.
+        An unfinished run (crash, deploy, failed stage) is resumed from its last
+        committed stage/cursor; otherwise a new run processes only data changed
+        since each stage's last completed watermark.
         """
-        self.processing_stats['start_time'] = datetime.utcnow()
+        self.processing_stats = {
+            'start_time': datetime.utcnow(),
+            'end_time': None,
+            'mastery_updates': 0,
+            'frequency_updates': 0,
+            'inactive_questions': 0,
+            'errors': []
+        }
         logger.info("🌙 Starting enhanced nightly processing...")
+        run = None
         
         try:
-            # Task 1: Update mastery calculations
-            logger.info("📊 Updating mastery calculations...")
-            mastery_result = await self.update_mastery_calculations(db)
-            self.processing_stats['mastery_updates'] = mastery_result.get('updated_count', 0)
+            run = await self.get_or_create_run(db)
             
-            # Task 2: Enhanced PYQ frequency refresh
-            logger.info("📈 Refreshing enhanced PYQ frequencies...")
-            frequency_result = await self.refresh_enhanced_frequencies(db)
-            self.processing_stats['frequency_updates'] = frequency_result.get('updated_questions', 0)
-            
-            # Task 3: Cleanup inactive questions
-            logger.info("🧹 Cleaning up inactive questions...")
-            cleanup_result = await self.cleanup_inactive_questions(db)
-            self.processing_stats['inactive_questions'] = cleanup_result.get('cleaned_count', 0)
+            for stage_order, stage_name in enumerate(NIGHTLY_STAGES):
+                stage = await self.get_or_create_stage(db, run, stage_name, stage_order)
+                if stage.status == 'completed':
+                    logger.info(f"⏭️ Stage '{stage_name}' already completed in run {run.id}, skipping")
+                    continue
+                await self.run_stage(db, run, stage)
             
-            # Task 4: Update question statistics
-            logger.info("📋 Updating question statistics...")
-            await self.update_question_statistics(db)
+            run.status = 'completed'
+            run.completed_at = datetime.utcnow()
+            run.error = None
+            await db.commit()
             
             self.processing_stats['end_time'] = datetime.utcnow()
             duration = self.processing_stats['end_time'] - self.processing_stats['start_time']
@@ -74,6 +101,7 @@ class EnhancedNightlyEngine:
             
             return {
                 'status': 'completed',
+                'run_id': run.id,
                 'duration_seconds': duration.total_seconds(),
                 'stats': self.processing_stats
             }
@@ -85,166 +113,365 @@ class EnhancedNightlyEngine:
             
             return {
                 'status': 'error',
+                'run_id': run.id if run else None,
                 'error': str(e),
                 'stats': self.processing_stats
             }
     
-    async def update_mastery_calculations(self, db: AsyncSession) -> Dict[str, Any]:
+    async def get_or_create_run(self, db: AsyncSession) -> NightlyRun:
         """
-        Update mastery calculations based on recent attempts
+        Resume the latest unfinished run, or open a new one bounded at the current time.
+        A run that has already been resumed NIGHTLY_MAX_RESUMES times is marked abandoned
+        instead; the new run's stages start from their last completed watermarks.
         """
-        try:
-            # Get users with recent attempts (last 24 hours)
-            cutoff_time = datetime.utcnow() - timedelta(hours=24)
-            
-            recent_attempts = await db.execute(
-                select(Attempt.user_id)
-                .where(Attempt.created_at >= cutoff_time)
-                .distinct()
+        unfinished = await db.execute(
+            select(NightlyRun)
+            .where(NightlyRun.status.in_(['running', 'failed']))
+            .order_by(desc(NightlyRun.started_at))
+            .limit(1)
+        )
+        run = unfinished.scalar_one_or_none()
+        
+        if run and (run.resume_count or 0) >= NIGHTLY_MAX_RESUMES:
+            run.status = 'abandoned'
+            run.completed_at = datetime.utcnow()
+            logger.warning(f"⚠️ Abandoning nightly run {run.id} after {run.resume_count} resumes: {run.error}")
+            run = None
+        
+        if run:
+            run.status = 'running'
+            run.resume_count = (run.resume_count or 0) + 1
+            logger.info(f"🔁 Resuming nightly run {run.id} (attempt {run.resume_count + 1})")
+        else:
+            now = datetime.utcnow()
+            run = NightlyRun(status='running', started_at=now, data_upper_bound=now)
+            db.add(run)
+            logger.info("🆕 Starting new nightly run")
+        
+        await db.commit()
+        return run
+    
+    async def get_or_create_stage(self, db: AsyncSession, run: NightlyRun, stage_name: str, stage_order: int) -> NightlyRunStage:
+        """Stage row for this run; a new stage starts from the stage's last completed watermark"""
+        existing = await db.execute(
+            select(NightlyRunStage).where(
+                and_(NightlyRunStage.run_id == run.id, NightlyRunStage.stage_name == stage_name)
             )
-            
-            active_users = [row.user_id for row in recent_attempts]
-            
-            if not active_users:
-                logger.info("No users with recent attempts found")
-                return {'updated_count': 0}
-            
-            updated_count = 0
-            
-            for user_id in active_users:
-                try:
-                    # Get user's attempt history by topic
-                    user_attempts = await db.execute(
-                        select(
-                            Topic.id.label('topic_id'),
-                            Topic.subcategory,
-                            func.count(Attempt.id).label('total_attempts'),
-                            func.sum(func.cast(Attempt.correct, func.Integer)).label('correct_attempts'),
-                            func.avg(func.cast(Attempt.correct, func.Float)).label('accuracy')
-                        )
-                        .join(Question, Attempt.question_id == Question.id)
-                        .join(Topic, Question.topic_id == Topic.id)
-                        .where(Attempt.user_id == user_id)
-                        .group_by(Topic.id, Topic.subcategory)
-                    )
-                    
-                    for row in user_attempts:
-                        accuracy = row.accuracy or 0.0
-                        
-                        # Update or create mastery record
-                        existing_mastery = await db.execute(
-                            select(Mastery)
-                            .where(
-                                and_(
-                                    Mastery.user_id == user_id,
-                                    Mastery.topic_id == row.topic_id
-                                )
-                            )
-                        )
-                        
-                        mastery_record = existing_mastery.scalar_one_or_none()
-                        
-                        if mastery_record:
-                            # Update existing record
-                            mastery_record.mastery_pct = accuracy
-                            mastery_record.total_attempts = row.total_attempts
-                            mastery_record.correct_attempts = row.correct_attempts
-                            mastery_record.last_updated = datetime.utcnow()
-                        else:
-                            # Create new record
-                            mastery_record = Mastery(
-                                user_id=user_id,
-                                topic_id=row.topic_id,
-                                mastery_pct=accuracy,
-                                total_attempts=row.total_attempts,
-                                correct_attempts=row.correct_attempts,
-                                last_updated=datetime.utcnow()
-                            )
-                            db.add(mastery_record)
-                        
-                        updated_count += 1
-                
-                except Exception as user_error:
-                    logger.error(f"Error updating mastery for user {user_id}: {user_error}")
-                    continue
-            
+        )
+        stage = existing.scalar_one_or_none()
+        if stage:
+            return stage
+        
+        last_completed = await db.execute(
+            select(NightlyRunStage.watermark_to)
+            .where(
+                and_(NightlyRunStage.stage_name == stage_name, NightlyRunStage.status == 'completed')
+            )
+            .order_by(desc(NightlyRunStage.watermark_to))
+            .limit(1)
+        )
+        watermark_from = last_completed.scalar()
+        if watermark_from is None and NIGHTLY_STAGE_INITIAL_LOOKBACK.get(stage_name):
+            watermark_from = run.data_upper_bound - NIGHTLY_STAGE_INITIAL_LOOKBACK[stage_name]
+        
+        stage = NightlyRunStage(
+            run_id=run.id,
+            stage_name=stage_name,
+            stage_order=stage_order,
+            status='pending',
+            watermark_from=watermark_from,
+            watermark_to=run.data_upper_bound,
+            rows_processed=0,
+            chunks_committed=0,
+            duration_seconds=0
+        )
+        db.add(stage)
+        await db.commit()
+        return stage
+    
+    async def run_stage(self, db: AsyncSession, run: NightlyRun, stage: NightlyRunStage):
+        """Execute one stage, recording status, duration and errors in the ledger"""
+        stage_name = stage.stage_name
+        logger.info(f"{NIGHTLY_STAGE_LABELS[stage_name]} (window {stage.watermark_from} → {stage.watermark_to})")
+        
+        stage.status = 'running'
+        stage.started_at = stage.started_at or datetime.utcnow()
+        stage.error = None
+        await db.commit()
+        
+        stage_start = time.perf_counter()
+        handler = getattr(self, f"run_{stage_name}_stage")
+        try:
+            result = await handler(db, stage)
+            stage.status = 'completed'
+            stage.completed_at = datetime.utcnow()
+            stage.duration_seconds = float(stage.duration_seconds or 0) + (time.perf_counter() - stage_start)
+            stage.result = result
             await db.commit()
-            logger.info(f"Updated mastery for {updated_count} topic-user combinations")
-            
-            return {'updated_count': updated_count}
             
         except Exception as e:
-            logger.error(f"Error in mastery calculations: {e}")
-            return {'updated_count': 0, 'error': str(e)}
+            await db.rollback()
+            stage.status = 'failed'
+            stage.error = str(e)
+            stage.duration_seconds = float(stage.duration_seconds or 0) + (time.perf_counter() - stage_start)
+            run.status = 'failed'
+            run.error = f"{stage_name}: {e}"
+            await db.commit()
+            raise
+    
+    async def run_mastery_stage(self, db: AsyncSession, stage: NightlyRunStage) -> Dict[str, Any]:
+        """Recompute mastery for users with attempts in the stage window, committing per user chunk"""
+        window = [Attempt.created_at <= stage.watermark_to]
+        if stage.watermark_from:
+            window.append(Attempt.created_at > stage.watermark_from)
+        
+        while True:
+            users_query = select(Attempt.user_id).where(and_(*window))
+            if stage.row_cursor:
+                users_query = users_query.where(Attempt.user_id > stage.row_cursor)
+            user_ids = (await db.execute(
+                users_query.distinct().order_by(Attempt.user_id).limit(self.mastery_chunk_size)
+            )).scalars().all()
+            
+            if not user_ids:
+                break
+            
+            updated = await self.update_mastery_for_users(db, user_ids)
+            stage.row_cursor = user_ids[-1]
+            stage.rows_processed = (stage.rows_processed or 0) + updated
+            stage.chunks_committed = (stage.chunks_committed or 0) + 1
+            await db.commit()
+        
+        self.processing_stats['mastery_updates'] = stage.rows_processed
+        logger.info(f"Updated mastery for {stage.rows_processed} topic-user combinations")
+        return {'updated_count': stage.rows_processed}
+    
+    async def run_frequency_stage(self, db: AsyncSession, stage: NightlyRunStage) -> Dict[str, Any]:
+        """
+        Refresh frequencies when PYQs or questions changed in the window. New PYQs shift the
+        per-year normalisation for every subcategory, so they trigger a full refresh; new
+        questions alone only need their own subcategories.
+        """
+        subcategories = None
+        if stage.watermark_from:
+            window = and_(PYQQuestion.created_at > stage.watermark_from, PYQQuestion.created_at <= stage.watermark_to)
+            new_pyqs = (await db.execute(select(func.count(PYQQuestion.id)).where(window))).scalar() or 0
+            
+            if not new_pyqs:
+                new_question_subcategories = await db.execute(
+                    select(Question.subcategory)
+                    .where(
+                        and_(
+                            Question.created_at > stage.watermark_from,
+                            Question.created_at <= stage.watermark_to
+                        )
+                    )
+                    .distinct()
+                )
+                subcategories = list(new_question_subcategories.scalars().all())
+                if not subcategories:
+                    logger.info("No PYQ or question changes since last run, skipping frequency refresh")
+                    return {'status': 'completed', 'updated_questions': 0, 'skipped': True}
+        
+        result = await self.refresh_enhanced_frequencies(db, subcategories=subcategories)
+        if result.get('status') == 'error':
+            raise RuntimeError(result.get('error', 'frequency refresh failed'))
+        
+        stage.rows_processed = result.get('updated_questions', 0)
+        self.processing_stats['frequency_updates'] = stage.rows_processed
+        return result
+    
+    async def run_cleanup_stage(self, db: AsyncSession, stage: NightlyRunStage) -> Dict[str, Any]:
+        """Clean up questions created in the stage window (all questions on the first run)"""
+        result = await self.cleanup_inactive_questions(db, since=stage.watermark_from, until=stage.watermark_to)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        
+        stage.rows_processed = result.get('cleaned_count', 0)
+        self.processing_stats['inactive_questions'] = stage.rows_processed
+        return result
     
-    async def refresh_enhanced_frequencies(self, db: AsyncSession) -> Dict[str, Any]:
+    async def run_statistics_stage(self, db: AsyncSession, stage: NightlyRunStage) -> Dict[str, Any]:
+        """Aggregate statistics are cheap and always computed over the whole bank"""
+        result = await self.update_question_statistics(db)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        return result
+    
+    async def update_mastery_for_users(self, db: AsyncSession, user_ids: List[str]) -> int:
         """
-        Refresh PYQ frequencies using enhanced time-weighted analysis
+        Update mastery for a chunk of users from one grouped attempts query
+        """
+        attempt_totals = await db.execute(
+            select(
+                Attempt.user_id,
+                Question.topic_id,
+                func.count(Attempt.id).label('total_attempts'),
+                func.sum(case((Attempt.correct == True, 1), else_=0)).label('correct_attempts')
+            )
+            .join(Question, Attempt.question_id == Question.id)
+            .where(Attempt.user_id.in_(user_ids))
+            .group_by(Attempt.user_id, Question.topic_id)
+        )
+        
+        existing_mastery = await db.execute(
+            select(Mastery).where(Mastery.user_id.in_(user_ids))
+        )
+        mastery_by_key = {(m.user_id, m.topic_id): m for m in existing_mastery.scalars().all()}
+        
+        updated_count = 0
+        now = datetime.utcnow()
+        for row in attempt_totals:
+            accuracy = (row.correct_attempts or 0) / row.total_attempts if row.total_attempts else 0.0
+            mastery_record = mastery_by_key.get((row.user_id, row.topic_id))
+            
+            if mastery_record:
+                mastery_record.mastery_pct = accuracy
+                mastery_record.last_updated = now
+            else:
+                db.add(Mastery(
+                    user_id=row.user_id,
+                    topic_id=row.topic_id,
+                    mastery_pct=accuracy,
+                    last_updated=now
+                ))
+            updated_count += 1
+        
+        return updated_count
+    
+    async def refresh_enhanced_frequencies(self, db: AsyncSession, subcategories: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Refresh PYQ frequencies using enhanced time-weighted analysis.
+        Temporal data and weighted frequency are computed once per subcategory from a
+        single grouped PYQ query, then fanned out to questions with one bulk UPDATE.
+        Pass subcategories to limit the fan-out to those subcategories.
         """
         try:
             logger.info("Starting enhanced PYQ frequency refresh...")
-            
-            # Get all active questions that need frequency analysis
-            questions_query = await db.execute(
-                select(Question)
+            timings = {}
+            
+            # Stage 1: one grouped PYQ query for every subcategory and year
+            stage_start = time.perf_counter()
+            temporal_data = await self.get_pyq_temporal_data_by_subcategory(db)
+            timings['pyq_temporal_query'] = round(time.perf_counter() - stage_start, 3)
+            
+            # Stage 2: time-weighted frequency for all subcategories in one batch
+            stage_start = time.perf_counter()
+            subcategory_frequencies = {}
+            if temporal_data['yearly_occurrences']:
+                subcategory_keys, years, occurrences = self.time_analyzer.build_occurrence_matrix(
+                    temporal_data['yearly_occurrences']
+                )
+                frequency_results = self.time_analyzer.calculate_time_weighted_frequency_batch(
+                    occurrences, years, temporal_data['total_pyq_per_year']
+                )
+                for row, subcategory in enumerate(subcategory_keys):
+                    frequency_score = float(frequency_results['final_frequency_score'][row])
+                    subcategory_frequencies[subcategory] = {
+                        'frequency_score': round(frequency_score, 4),
+                        'frequency_band': self.determine_frequency_band(frequency_score),
+                        'frequency_notes': f"Time-weighted analysis: {frequency_results['trend_direction'][row]}"
+                    }
+            timings['frequency_calculation'] = round(time.perf_counter() - stage_start, 3)
+            
+            # Stage 3: fan out to active questions, one executemany keyed by subcategory
+            stage_start = time.perf_counter()
+            question_counts_result = await db.execute(
+                select(Question.subcategory, func.count(Question.id).label('question_count'))
                 .where(Question.is_active == True)
-                .order_by(Question.id)
+                .group_by(Question.subcategory)
             )
-            
-            questions = questions_query.scalars().all()
-            updated_count = 0
-            frequency_distribution = {}
-            
-            for question in questions:
-                try:
-                    # Get PYQ data for this subcategory
-                    pyq_data = await self.get_pyq_temporal_data(db, question.subcategory)
-                    
-                    if pyq_data['yearly_occurrences']:
-                        # Calculate time-weighted frequency
-                        frequency_result = self.time_analyzer.calculate_time_weighted_frequency(
-                            pyq_data['yearly_occurrences'],
-                            pyq_data['total_pyq_per_year']
-                        )
-                        
-                        # Update question with frequency data
-                        question.frequency_score = frequency_result.get('weighted_frequency', 0.0)
-                        question.frequency_band = self.determine_frequency_band(
-                            frequency_result.get('weighted_frequency', 0.0)
+            question_counts = {row.subcategory: row.question_count for row in question_counts_result}
+            
+            updated_at = datetime.utcnow()
+            update_rows = [
+                {
+                    'target_subcategory': subcategory,
+                    'new_frequency_score': frequency['frequency_score'],
+                    'new_frequency_band': frequency['frequency_band'],
+                    'new_frequency_notes': frequency['frequency_notes'],
+                    'new_frequency_last_updated': updated_at
+                }
+                for subcategory, frequency in subcategory_frequencies.items()
+                if question_counts.get(subcategory) and (subcategories is None or subcategory in subcategories)
+            ]
+            
+            if update_rows:
+                questions_table = Question.__table__
+                await db.execute(
+                    update(questions_table)
+                    .where(
+                        and_(
+                            questions_table.c.subcategory == bindparam('target_subcategory'),
+                            questions_table.c.is_active == True
                         )
-                        question.frequency_notes = f"Time-weighted analysis: {frequency_result.get('trend', 'stable')}"
-                        question.last_frequency_update = datetime.utcnow()
-                        
-                        # Track distribution
-                        band = question.frequency_band
-                        frequency_distribution[band] = frequency_distribution.get(band, 0) + 1
-                        updated_count += 1
-                    
-                except Exception as q_error:
-                    logger.error(f"Error processing question {question.id}: {q_error}")
-                    continue
-            
+                    )
+                    .values(
+                        frequency_score=bindparam('new_frequency_score'),
+                        frequency_band=bindparam('new_frequency_band'),
+                        frequency_notes=bindparam('new_frequency_notes'),
+                        frequency_last_updated=bindparam('new_frequency_last_updated')
+                    ),
+                    update_rows
+                )
             await db.commit()
+            timings['bulk_update'] = round(time.perf_counter() - stage_start, 3)
+            
+            updated_count = sum(question_counts[row['target_subcategory']] for row in update_rows)
+            frequency_distribution = {}
+            for row in update_rows:
+                band = row['new_frequency_band']
+                frequency_distribution[band] = frequency_distribution.get(band, 0) + question_counts[row['target_subcategory']]
             
             logger.info(f"Enhanced frequency refresh completed successfully")
-            logger.info(f"Updated {updated_count} questions")
+            logger.info(f"Updated {updated_count} questions across {len(update_rows)} subcategories")
             logger.info(f"Frequency distribution: {frequency_distribution}")
+            logger.info(f"Stage timings: {timings}")
             
             return {
                 'status': 'completed',
                 'updated_questions': updated_count,
+                'subcategories_processed': len(update_rows),
                 'distribution': frequency_distribution,
-                'method': 'time_weighted_analysis'
+                'method': 'time_weighted_analysis',
+                'timings': timings
             }
                 
         except Exception as e:
             logger.error(f"Error in enhanced frequency refresh: {e}")
+            await db.rollback()
             return {
                 'status': 'error',
                 'updated_questions': 0,
                 'error': str(e)
             }
     
+    async def get_pyq_temporal_data_by_subcategory(self, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Get temporal PYQ data for every subcategory in one grouped query.
+        Per-year totals for normalization are the sums across subcategories.
+        """
+        pyq_query = await db.execute(
+            select(
+                PYQQuestion.subcategory,
+                PYQPaper.year,
+                func.count(PYQQuestion.id).label('question_count')
+            )
+            .join(PYQQuestion, PYQPaper.id == PYQQuestion.paper_id)
+            .group_by(PYQQuestion.subcategory, PYQPaper.year)
+        )
+        
+        yearly_occurrences = {}
+        total_pyq_per_year = {}
+        for row in pyq_query:
+            yearly_occurrences.setdefault(row.subcategory, {})[row.year] = row.question_count
+            total_pyq_per_year[row.year] = total_pyq_per_year.get(row.year, 0) + row.question_count
+        
+        return {
+            'yearly_occurrences': yearly_occurrences,
+            'total_pyq_per_year': total_pyq_per_year
+        }
+    
     async def get_pyq_temporal_data(self, db: AsyncSession, subcategory: str) -> Dict[str, Any]:
         """
         Get temporal PYQ data for a subcategory
@@ -308,16 +535,28 @@ class EnhancedNightlyEngine:
         else:
             return 'Very Low'
     
-    async def cleanup_inactive_questions(self, db: AsyncSession) -> Dict[str, Any]:
+    async def cleanup_inactive_questions(
+        self,
+        db: AsyncSession,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
         """
         Clean up questions that should be inactive or have issues
+        (optionally only questions created in the (since, until] window)
         """
         try:
             cleaned_count = 0
+            created_window = []
+            if since:
+                created_window.append(Question.created_at > since)
+            if until:
+                created_window.append(Question.created_at <= until)
             
             # Find questions with missing required data
             problematic_questions = await db.execute(
                 select(Question)
+                .where(*created_window)
                 .where(
                     or_(
                         Question.stem.is_(None),
@@ -339,6 +578,7 @@ class EnhancedNightlyEngine:
             # Find questions with broken images
             broken_image_questions = await db.execute(
                 select(Question)
+                .where(*created_window)
                 .where(
                     and_(
                         Question.has_image == True,
@@ -375,7 +615,7 @@ class EnhancedNightlyEngine:
             stats_query = await db.execute(
                 select(
                     func.count(Question.id).label('total_questions'),
-                    func.sum(func.cast(Question.is_active, func.Integer)).label('active_questions'),
+                    func.sum(case((Question.is_active == True, 1), else_=0)).label('active_questions'),
                     func.count(func.distinct(Question.subcategory)).label('unique_subcategories'),
                     func.count(func.distinct(Question.difficulty_band)).label('difficulty_levels')
                 )
@@ -467,7 +707,7 @@ class EnhancedNightlyEngine:
                 .where(
                     and_(
                         Question.is_active == True,
-                        Question.last_frequency_update >= datetime.utcnow() - timedelta(days=1)
+                        Question.frequency_last_updated >= datetime.utcnow() - timedelta(days=1)
                     )
                 )
             )
@@ -27,7 +27,8 @@ class EnhancedQuestionProcessor:
     async def process_question_with_frequency_analysis(
         self, 
         question: Question, 
-        db: AsyncSession
+        db: AsyncSession,
+        refresh_index: bool = True
     ) -> Dict[str, Any]:
         """
         Enhanced question processing with integrated PYQ frequency analysis
@@ -37,7 +38,7 @@ class EnhancedQuestionProcessor:
             
             # Step 1: Conceptual Frequency Analysis
             conceptual_result = await self.conceptual_analyzer.calculate_conceptual_frequency(
-                db, question, years_window=10
+                db, question, years_window=10, refresh_index=refresh_index
             )
             
             # Step 2: Time-Weighted Frequency Analysis
@@ -285,6 +286,9 @@ class EnhancedQuestionProcessor:
             processed_count = 0
             error_count = 0
             
+            # One PYQ concept index freshness check for the whole batch
+            await self.conceptual_analyzer.concept_index.ensure_fresh(db)
+            
             for question_id in question_ids:
                 try:
                     # Get question
@@ -300,7 +304,7 @@ class EnhancedQuestionProcessor:
                     
                     # Process question
                     processing_result = await self.process_question_with_frequency_analysis(
-                        question, db
+                        question, db, refresh_index=False
                     )
                     
                     results.append(processing_result)
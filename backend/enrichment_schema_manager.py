@@ -8,6 +8,7 @@ import json
 import logging
 from typing import Tuple, Dict, Any
 import re
+from metrics import track_llm_call
 
 logger = logging.getLogger(__name__)
 
@@ -294,7 +295,8 @@ EXPLANATION:
 Validate this enrichment against the schema requirements."""
             
             user_message = UserMessage(text=validation_request)
-            response = await chat.send_message(user_message)
+            with track_llm_call("anthropic", "claude-3-5-sonnet-20241022", "validate_solution"):
+                response = await chat.send_message(user_message)
             
             # Parse response
             quality_score = 0
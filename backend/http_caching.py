@@ -0,0 +1,222 @@
+"""
+HTTP Response Caching for CAT Preparation Platform
+Negotiated brotli/gzip compression of large responses, and strong ETags derived from data versions
+(the user's attempt / mastery counters, the question catalog version) so conditional GETs are answered
+with 304 Not Modified before the endpoint recomputes anything
+"""
+
+import os
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers, MutableHeaders
+from database import get_async_compatible_db, get_catalog_version, Attempt, Mastery, User
+from auth_service import require_auth
+from metrics import HTTP_RESPONSE_BYTES_SAVED, HTTP_NOT_MODIFIED
+from taxonomy_registry import taxonomy_registry
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # bytes; smaller bodies are sent as-is
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4-5 is the usual speed / size balance for dynamic responses
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+# Bytes last sent per ETag, so 304s can be credited with the body they avoided (bounded, per process)
+_SENT_SIZES_LIMIT = 10000
+_sent_sizes: "OrderedDict[str, int]" = OrderedDict()
+_sent_sizes_lock = threading.Lock()
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Best content coding the client accepts: br (if brotli is installed), then gzip; None for identity"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    for coding in (("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _remember_sent_size(etag: Optional[str], size: int):
+    if not etag:
+        return
+    with _sent_sizes_lock:
+        _sent_sizes[etag] = size
+        _sent_sizes.move_to_end(etag)
+        while len(_sent_sizes) > _SENT_SIZES_LIMIT:
+            _sent_sizes.popitem(last=False)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: compresses complete (non-streaming) responses of compressible types over
+    COMPRESSION_MIN_SIZE with the negotiated coding, adds Vary: Accept-Encoding and marks strong
+    ETags per coding ("<tag>-br" / "<tag>-gzip"). Streaming responses (exports, files) pass through.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        state = {"start": None, "passthrough": False}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            start, body = state["start"], message.get("body", b"")
+            state["passthrough"] = True
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if message.get("more_body", False) or not self._eligible(start, headers, body):
+                _remember_sent_size(headers.get("etag"), len(body))
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            compressed = compress(body, coding) if coding else None
+            if compressed is not None and len(compressed) < len(body):
+                headers["content-encoding"] = coding
+                headers["content-length"] = str(len(compressed))
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["etag"] = f'{etag[:-1]}-{coding}"'
+                HTTP_RESPONSE_BYTES_SAVED.labels(coding).inc(len(body) - len(compressed))
+                body = compressed
+            _remember_sent_size(headers.get("etag"), len(body))
+
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _eligible(self, start, headers: MutableHeaders, body: bytes) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304) or len(body) < self.min_size:
+            return False
+        if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+            return False
+        content_type = headers.get("content-type", "")
+        return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+# Data versions: cheap aggregates that change whenever the data behind a cached response changes
+
+async def get_user_data_version(db: AsyncSession, user_id: str) -> Tuple:
+    """User data version: attempt counter / latest attempt and mastery updates (including decay)"""
+    return tuple((await db.execute(
+        select(
+            select(func.count(Attempt.id)).where(Attempt.user_id == user_id).scalar_subquery(),
+            select(func.max(Attempt.created_at)).where(Attempt.user_id == user_id).scalar_subquery(),
+            select(func.count(Mastery.topic_id)).where(Mastery.user_id == user_id).scalar_subquery(),
+            select(func.max(Mastery.last_updated)).where(Mastery.user_id == user_id).scalar_subquery()
+        )
+    )).one())
+
+
+def make_etag(request: Request, *versions) -> str:
+    """Strong ETag for this route + query string under the given data versions"""
+    key = "|".join([request.url.path, str(request.url.query)] + [repr(version) for version in versions])
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _matching_tag(if_none_match: Optional[str], etag: str, coding: Optional[str] = None) -> Optional[str]:
+    """
+    The If-None-Match entry matching etag: the bare tag (identity representation) or, when this
+    request negotiated a coding, the tag CompressionMiddleware marks for that coding ("<tag>-<coding>")
+    """
+    if not if_none_match:
+        return None
+    base = etag[1:-1]
+    accepted = {base, f"{base}-{coding}"} if coding else {base}
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') in accepted:
+            return candidate
+    return None
+
+
+def check_not_modified(request: Request, response: Response, etag: str, cache_control: str):
+    """Set ETag / Cache-Control on the response, or raise 304 if the client already has this version"""
+    coding = negotiate_encoding(request.headers.get("accept-encoding", "")) if COMPRESSION_ENABLED else None
+    matched = _matching_tag(request.headers.get("if-none-match"), etag, coding)
+    if matched:
+        HTTP_NOT_MODIFIED.labels(getattr(request.scope.get("route"), "path", "<unmatched>")).inc()
+        saved = _sent_sizes.get(matched)
+        if saved:
+            HTTP_RESPONSE_BYTES_SAVED.labels("not_modified").inc(saved)
+        raise HTTPException(status_code=304, headers={
+            "ETag": matched, "Cache-Control": cache_control, "Vary": "Accept-Encoding"
+        })
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+async def catalog_conditional_get(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_compatible_db)
+):
+    """Dependency for catalog reads (question listings): ETag from the catalog and taxonomy versions"""
+    etag = make_etag(request, taxonomy_registry.fingerprint, await get_catalog_version(db))
+    check_not_modified(request, response, etag, "no-cache")
+
+
+async def user_conditional_get(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(require_auth),
+    db: AsyncSession = Depends(get_async_compatible_db)
+):
+    """Dependency for per-user dashboards: ETag from the user's data version and the catalog / taxonomy versions"""
+    etag = make_etag(request, str(current_user.id), await get_user_data_version(db, current_user.id),
+                     taxonomy_registry.fingerprint, await get_catalog_version(db))
+    check_not_modified(request, response, etag, "private, no-cache")
@@ -0,0 +1,149 @@
+"""
+Bulk Importance Index Recomputation
+Server-side recompute of importance_index / importance_band in a single UPDATE
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional
+from sqlalchemy import update, select, case, cast, func, Float, Numeric
+from database import Question, AsyncSession, SessionLocal, get_dialect_name
+
+logger = logging.getLogger(__name__)
+
+# Importance formula: 0.50×Frequency + 0.25×DifficultyNorm + 0.25×LearningImpact
+FREQUENCY_BAND_SCORES = {"High": 100, "Medium": 60, "Low": 30}
+DEFAULT_FREQUENCY_SCORE = 60
+DEFAULT_DIFFICULTY_SCORE = 3
+DEFAULT_LEARNING_IMPACT = 50
+
+IMPORTANCE_HIGH_THRESHOLD = 70
+IMPORTANCE_MEDIUM_THRESHOLD = 45
+
+
+def build_importance_expressions(dialect_name: str):
+    """
+    Build the importance_index and importance_band SQL expressions for a dialect.
+
+    Inputs are cast to floating point so SQLite does not fall back to integer
+    division; PostgreSQL needs the result cast back to NUMERIC because ROUND(x, 2)
+    is only defined for numeric there.
+    """
+    frequency_score = case(
+        *[(Question.frequency_band == band, score) for band, score in FREQUENCY_BAND_SCORES.items()],
+        else_=DEFAULT_FREQUENCY_SCORE
+    )
+    # Zero is treated like NULL, matching the `value or default` semantics of the Python formula
+    difficulty = func.coalesce(func.nullif(cast(Question.difficulty_score, Float), 0.0), float(DEFAULT_DIFFICULTY_SCORE))
+    learning_impact = func.coalesce(func.nullif(cast(Question.learning_impact, Float), 0.0), float(DEFAULT_LEARNING_IMPACT))
+    difficulty_norm = 20.0 + ((difficulty - 1.0) / 4.0) * 80.0
+
+    importance = 0.50 * cast(frequency_score, Float) + 0.25 * difficulty_norm + 0.25 * learning_impact
+
+    if dialect_name == 'sqlite':
+        importance_index = func.round(importance, 2)
+    else:
+        importance_index = func.round(cast(importance, Numeric), 2)
+
+    importance_band = case(
+        (importance >= IMPORTANCE_HIGH_THRESHOLD, "High"),
+        (importance >= IMPORTANCE_MEDIUM_THRESHOLD, "Medium"),
+        else_="Low"
+    )
+    return importance_index, importance_band
+
+
+def calculate_importance(frequency_band: Optional[str], difficulty_score, learning_impact) -> Dict[str, Any]:
+    """Python reference of the SQL formula, for single questions and verification"""
+    frequency_score = FREQUENCY_BAND_SCORES.get(frequency_band, DEFAULT_FREQUENCY_SCORE)
+    difficulty_norm = 20 + ((float(difficulty_score or DEFAULT_DIFFICULTY_SCORE) - 1) / 4) * 80
+    learning_impact = float(learning_impact) if learning_impact else DEFAULT_LEARNING_IMPACT
+
+    importance = 0.50 * frequency_score + 0.25 * difficulty_norm + 0.25 * learning_impact
+
+    if importance >= IMPORTANCE_HIGH_THRESHOLD:
+        band = "High"
+    elif importance >= IMPORTANCE_MEDIUM_THRESHOLD:
+        band = "Medium"
+    else:
+        band = "Low"
+
+    return {'importance_index': round(importance, 2), 'importance_band': band}
+
+
+async def recompute_importance_indices(db: AsyncSession, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Recompute importance indices for all active questions in O(1) round trips:
+    one grouped query for the distribution report and one UPDATE (skipped on dry run).
+    """
+    started = time.perf_counter()
+    dialect_name = get_dialect_name(db)
+    importance_index, importance_band = build_importance_expressions(dialect_name)
+
+    # Band transition matrix: current band -> recomputed band
+    transitions_result = await db.execute(
+        select(
+            Question.importance_band.label('current_band'),
+            importance_band.label('new_band'),
+            func.count(Question.id).label('count'),
+            func.sum(case((Question.importance_index.is_(None), 1), (Question.importance_index != importance_index, 1), else_=0)).label('index_changes')
+        )
+        .where(Question.is_active == True)
+        .group_by(Question.importance_band, importance_band)
+    )
+
+    before = {}
+    after = {}
+    transitions = {}
+    changed_bands = 0
+    changed_indices = 0
+    total = 0
+    for row in transitions_result:
+        current_band = row.current_band or 'None'
+        before[current_band] = before.get(current_band, 0) + row.count
+        after[row.new_band] = after.get(row.new_band, 0) + row.count
+        transitions[f"{current_band}->{row.new_band}"] = row.count
+        if current_band != row.new_band:
+            changed_bands += row.count
+        changed_indices += int(row.index_changes or 0)
+        total += row.count
+
+    updated_count = 0
+    if not dry_run:
+        result = await db.execute(
+            update(Question)
+            .where(Question.is_active == True)
+            .values(importance_index=importance_index, importance_band=importance_band)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        updated_count = result.rowcount
+
+    summary = {
+        'dry_run': dry_run,
+        'dialect': dialect_name,
+        'active_questions': total,
+        'updated_count': updated_count,
+        'index_changes': changed_indices,
+        'band_changes': changed_bands,
+        'distribution_before': before,
+        'distribution_after': after,
+        'transitions': transitions,
+        'duration_seconds': round(time.perf_counter() - started, 3)
+    }
+
+    action = "Would update" if dry_run else "Updated"
+    logger.info(f"{action} importance indices for {total} questions ({changed_bands} band changes)")
+    logger.info(f"Importance distribution: {before} -> {after}")
+    return summary
+
+
+def run_importance_recompute(dry_run: bool = False) -> Dict[str, Any]:
+    """Synchronous entry point for scripts/ and one-off maintenance"""
+    session = SessionLocal()
+    try:
+        return asyncio.run(recompute_importance_indices(AsyncSession(session), dry_run=dry_run))
+    finally:
+        session.close()
+
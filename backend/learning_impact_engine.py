@@ -0,0 +1,365 @@
+"""
+Batch Dynamic Learning Impact Engine
+Single-pass recompute of dynamic learning impact over the 90-day attempt window
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Tuple
+import numpy as np
+from sqlalchemy import select, update
+from database import Question, Attempt, Topic, Mastery, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+# Component defaults mirror BackgroundJobProcessor's per-question calculations
+DEFAULT_DYNAMIC_LI = 50.0
+DEFAULT_CTU_NO_CORRECT = 30.0
+DEFAULT_CTU_NO_MASTERY = 40.0
+DEFAULT_MISCONCEPTION_NO_INCORRECT = 20.0
+DEFAULT_RETENTION_NO_CORRECT = 30.0
+DEFAULT_RETENTION_NO_LATER = 50.0
+DEFAULT_TIME_TO_SKILL = 60.0
+
+_ROOT_FAMILY = "__root__"
+
+
+class LearningImpactBatchEngine:
+    """
+    Recomputes dynamic learning impact for the whole question bank in one pass.
+    Attempts are streamed once (ordered by question) into flat NumPy arrays and every
+    component is computed with group-by operations instead of per-question queries.
+    """
+
+    def __init__(self, window_days: int = 90, stream_batch_size: int = 50000, update_batch_size: int = 1000):
+        self.window_days = window_days
+        self.stream_batch_size = stream_batch_size
+        self.update_batch_size = update_batch_size
+
+    async def recompute(self, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Recompute dynamic LI, blend with static LI (0.60 × Static + 0.40 × Dynamic)
+        and bulk-update learning_impact and learning_impact_band
+        """
+        timings = {}
+        started = time.perf_counter()
+
+        stage = time.perf_counter()
+        question_meta = await self._load_question_meta(db)
+        family_means, user_codes = await self._load_family_mastery(db)
+        timings['load_reference_data'] = round(time.perf_counter() - stage, 3)
+
+        stage = time.perf_counter()
+        attempts = await self._stream_attempts(db, user_codes)
+        timings['stream_attempts'] = round(time.perf_counter() - stage, 3)
+
+        stage = time.perf_counter()
+        dynamic_by_question = self.compute_dynamic_scores(attempts, question_meta, family_means)
+        timings['compute_components'] = round(time.perf_counter() - stage, 3)
+
+        stage = time.perf_counter()
+        updates = []
+        band_distribution = {}
+        for question_id, meta in question_meta.items():
+            if not meta['is_active']:
+                continue
+            static_li = meta['learning_impact'] if meta['learning_impact'] else DEFAULT_DYNAMIC_LI
+            dynamic_li = dynamic_by_question.get(question_id, DEFAULT_DYNAMIC_LI)
+            blended_li = 0.60 * static_li + 0.40 * dynamic_li
+            band = self.determine_learning_impact_band(blended_li)
+            band_distribution[band] = band_distribution.get(band, 0) + 1
+            updates.append({
+                'id': question_id,
+                'learning_impact': round(blended_li, 2),
+                'learning_impact_band': band
+            })
+
+        for offset in range(0, len(updates), self.update_batch_size):
+            await db.execute(update(Question), updates[offset:offset + self.update_batch_size])
+        await db.commit()
+        timings['bulk_update'] = round(time.perf_counter() - stage, 3)
+        timings['total'] = round(time.perf_counter() - started, 3)
+
+        logger.info(
+            f"Updated dynamic learning impact for {len(updates)} questions "
+            f"from {attempts['count']} attempts in {timings['total']}s"
+        )
+
+        return {
+            'updated_count': len(updates),
+            'attempts_processed': attempts['count'],
+            'questions_with_attempts': len(dynamic_by_question),
+            'band_distribution': band_distribution,
+            'timings': timings
+        }
+
+    def determine_learning_impact_band(self, learning_impact: float) -> str:
+        """Map a blended learning impact score to its band"""
+        if learning_impact >= 70:
+            return "High"
+        elif learning_impact >= 45:
+            return "Medium"
+        return "Low"
+
+    async def _load_question_meta(self, db: AsyncSession) -> Dict[str, Dict[str, Any]]:
+        """Load the per-question attributes needed for grouping (all questions, not only active)"""
+        result = await db.execute(
+            select(
+                Question.id,
+                Question.is_active,
+                Question.learning_impact,
+                Question.subcategory,
+                Question.difficulty_band,
+                Topic.parent_id
+            ).outerjoin(Topic, Question.topic_id == Topic.id)
+        )
+
+        question_meta = {}
+        for row in result:
+            question_meta[row.id] = {
+                'is_active': bool(row.is_active),
+                'learning_impact': float(row.learning_impact) if row.learning_impact is not None else None,
+                'retention_group': (row.subcategory, row.difficulty_band),
+                'family': row.parent_id if row.parent_id is not None else _ROOT_FAMILY
+            }
+        return question_meta
+
+    async def _load_family_mastery(self, db: AsyncSession) -> Tuple[Dict[Tuple[int, str], float], Dict[str, int]]:
+        """
+        Average mastery per (user, topic family). A family is a parent topic together with
+        its children, matching the related-topic lookup used for cross-topic uplift.
+        """
+        topics_result = await db.execute(select(Topic.id, Topic.parent_id))
+        topic_families = {}
+        for row in topics_result:
+            parent_family = row.parent_id if row.parent_id is not None else _ROOT_FAMILY
+            topic_families[row.id] = (parent_family, row.id)
+
+        mastery_result = await db.execute(
+            select(Mastery.user_id, Mastery.topic_id, Mastery.mastery_pct)
+            .where(Mastery.mastery_pct.isnot(None))
+        )
+
+        user_codes = {}
+        sums = {}
+        counts = {}
+        for row in mastery_result:
+            families = topic_families.get(row.topic_id)
+            if not families:
+                continue
+            user_code = user_codes.setdefault(row.user_id, len(user_codes))
+            pct = float(row.mastery_pct)
+            for family in families:
+                key = (user_code, family)
+                sums[key] = sums.get(key, 0.0) + pct
+                counts[key] = counts.get(key, 0) + 1
+
+        family_means = {key: sums[key] / counts[key] for key in sums}
+        return family_means, user_codes
+
+    async def _stream_attempts(self, db: AsyncSession, user_codes: Dict[str, int]) -> Dict[str, Any]:
+        """Stream the attempt window once, sorted by question, into flat integer-coded arrays"""
+        cutoff = datetime.utcnow() - timedelta(days=self.window_days)
+        result = await db.execute(
+            select(
+                Attempt.question_id,
+                Attempt.user_id,
+                Attempt.correct,
+                Attempt.attempt_no,
+                Attempt.user_answer,
+                Attempt.created_at
+            )
+            .where(Attempt.created_at > cutoff)
+            .order_by(Attempt.question_id, Attempt.created_at)
+            .execution_options(yield_per=self.stream_batch_size)
+        )
+
+        question_codes = {}
+        answer_codes = {}
+        chunks = {'question': [], 'user': [], 'correct': [], 'attempt_no': [], 'answer': [], 'created_at': []}
+
+        for partition in result.partitions():
+            chunks['question'].append(np.fromiter(
+                (question_codes.setdefault(row[0], len(question_codes)) for row in partition),
+                dtype=np.int64, count=len(partition)
+            ))
+            chunks['user'].append(np.fromiter(
+                (user_codes.setdefault(row[1], len(user_codes)) for row in partition),
+                dtype=np.int64, count=len(partition)
+            ))
+            chunks['correct'].append(np.fromiter((bool(row[2]) for row in partition), dtype=bool, count=len(partition)))
+            chunks['attempt_no'].append(np.fromiter((row[3] or 0 for row in partition), dtype=np.int64, count=len(partition)))
+            chunks['answer'].append(np.fromiter(
+                (answer_codes.setdefault(row[4], len(answer_codes)) for row in partition),
+                dtype=np.int64, count=len(partition)
+            ))
+            chunks['created_at'].append(
+                np.array([row[5] for row in partition], dtype='datetime64[us]').astype(np.int64)
+            )
+
+        arrays = {
+            name: (np.concatenate(parts) if parts else np.empty(0, dtype=bool if name == 'correct' else np.int64))
+            for name, parts in chunks.items()
+        }
+        arrays['question_ids'] = list(question_codes.keys())
+        arrays['n_users'] = max(len(user_codes), 1)
+        arrays['n_answers'] = max(len(answer_codes), 1)
+        arrays['count'] = len(arrays['question'])
+        return arrays
+
+    def compute_dynamic_scores(
+        self,
+        attempts: Dict[str, Any],
+        question_meta: Dict[str, Dict[str, Any]],
+        family_means: Dict[Tuple[int, str], float]
+    ) -> Dict[str, float]:
+        """
+        Compute the weighted dynamic LI for every question present in the attempt window:
+        0.30 × CTU + 0.25 × Misconception + 0.25 × Retention + 0.20 × TimeToSkill
+        """
+        question_ids = attempts['question_ids']
+        n_questions = len(question_ids)
+        if n_questions == 0:
+            return {}
+
+        ctu = self._cross_topic_uplift(attempts, question_meta, family_means)
+        misconception = self._misconception_richness(attempts, n_questions)
+        retention = self._retention_stickiness(attempts, question_meta)
+        time_to_skill = self._time_to_skill(attempts, n_questions)
+
+        dynamic = np.clip(0.30 * ctu + 0.25 * misconception + 0.25 * retention + 0.20 * time_to_skill, 0.0, 100.0)
+        return {question_id: float(dynamic[code]) for code, question_id in enumerate(question_ids)}
+
+    def _cross_topic_uplift(self, attempts, question_meta, family_means) -> np.ndarray:
+        """Mean family mastery of users who answered each question correctly"""
+        n_questions = len(attempts['question_ids'])
+        n_users = attempts['n_users']
+        correct = attempts['correct']
+
+        pairs = np.unique(attempts['question'][correct] * n_users + attempts['user'][correct])
+        pair_questions = pairs // n_users
+        pair_users = pairs % n_users
+
+        families = [question_meta.get(question_id, {}).get('family') for question_id in attempts['question_ids']]
+        values = np.fromiter(
+            (family_means.get((int(user), families[question]), np.nan)
+             for question, user in zip(pair_questions, pair_users)),
+            dtype=float, count=len(pairs)
+        )
+        has_value = ~np.isnan(values)
+
+        correct_users = np.bincount(pair_questions, minlength=n_questions)
+        value_counts = np.bincount(pair_questions[has_value], minlength=n_questions)
+        value_sums = np.bincount(pair_questions[has_value], weights=values[has_value], minlength=n_questions)
+
+        return np.where(
+            correct_users == 0, DEFAULT_CTU_NO_CORRECT,
+            np.where(value_counts == 0, DEFAULT_CTU_NO_MASTERY, value_sums / np.maximum(value_counts, 1))
+        )
+
+    def _misconception_richness(self, attempts, n_questions: int) -> np.ndarray:
+        """Diversity of incorrect answers per question, scaled to 30-80"""
+        incorrect = ~attempts['correct']
+        incorrect_questions = attempts['question'][incorrect]
+        total_incorrect = np.bincount(incorrect_questions, minlength=n_questions)
+
+        n_answers = attempts['n_answers']
+        distinct_pairs = np.unique(incorrect_questions * n_answers + attempts['answer'][incorrect])
+        unique_incorrect = np.bincount(distinct_pairs // n_answers, minlength=n_questions)
+
+        richness = 30 + (unique_incorrect / np.maximum(total_incorrect, 1)) * 50
+        return np.where(total_incorrect == 0, DEFAULT_MISCONCEPTION_NO_INCORRECT, np.minimum(100.0, richness))
+
+    def _retention_stickiness(self, attempts, question_meta) -> np.ndarray:
+        """
+        Later accuracy on other questions of the same subcategory and difficulty band, for users
+        who got the question right on their first attempt
+        """
+        question_ids = attempts['question_ids']
+        n_questions = len(question_ids)
+        n_users = attempts['n_users']
+        questions = attempts['question']
+        users = attempts['user']
+        correct = attempts['correct']
+        created_at = attempts['created_at']
+
+        # Retention group (subcategory, difficulty band) of every question and attempt row
+        group_codes = {}
+        question_groups = np.fromiter(
+            (group_codes.setdefault(question_meta.get(question_id, {}).get('retention_group', (None, None)), len(group_codes))
+             for question_id in question_ids),
+            dtype=np.int64, count=n_questions
+        )
+        n_groups = max(len(group_codes), 1)
+        row_groups = question_groups[questions]
+
+        # Dense timestamp ranks keep the (user, group, time) composite key inside int64
+        unique_times, time_ranks = np.unique(created_at, return_inverse=True)
+        n_ranks = len(unique_times) + 1
+        segment_keys = users * n_groups + row_groups
+        composite = segment_keys * n_ranks + time_ranks
+        order = np.argsort(composite, kind='stable')
+        composite_sorted = composite[order]
+        cumulative_correct = np.concatenate(([0], np.cumsum(correct[order])))
+
+        # Latest attempt time of each (question, user) pair
+        pair_keys = questions * n_users + users
+        pair_order = np.lexsort((time_ranks, pair_keys))
+        sorted_pairs = pair_keys[pair_order]
+        last_in_pair = np.r_[sorted_pairs[1:] != sorted_pairs[:-1], True]
+        pair_last_keys = sorted_pairs[last_in_pair]
+        pair_last_ranks = time_ranks[pair_order][last_in_pair]
+
+        first_correct = correct & (attempts['attempt_no'] == 1)
+        qualifying = np.unique(pair_keys[first_correct])
+        qualifying_questions = qualifying // n_users
+        qualifying_users = qualifying % n_users
+        last_ranks = pair_last_ranks[np.searchsorted(pair_last_keys, qualifying)]
+
+        query_segments = qualifying_users * n_groups + question_groups[qualifying_questions]
+        start = np.searchsorted(composite_sorted, query_segments * n_ranks + last_ranks, side='right')
+        end = np.searchsorted(composite_sorted, (query_segments + 1) * n_ranks, side='left')
+        later_total = end - start
+        later_correct = cumulative_correct[end] - cumulative_correct[start]
+
+        has_later = later_total > 0
+        later_accuracy = np.where(has_later, later_correct / np.maximum(later_total, 1) * 100, 0.0)
+
+        qualifying_counts = np.bincount(qualifying_questions, minlength=n_questions)
+        later_counts = np.bincount(qualifying_questions[has_later], minlength=n_questions)
+        later_sums = np.bincount(qualifying_questions[has_later], weights=later_accuracy[has_later], minlength=n_questions)
+
+        return np.where(
+            qualifying_counts == 0, DEFAULT_RETENTION_NO_CORRECT,
+            np.where(later_counts == 0, DEFAULT_RETENTION_NO_LATER, later_sums / np.maximum(later_counts, 1))
+        )
+
+    def _time_to_skill(self, attempts, n_questions: int) -> np.ndarray:
+        """Average skill score for users who went from incorrect to correct on repeat attempts"""
+        n_users = attempts['n_users']
+        pair_keys = attempts['question'] * n_users + attempts['user']
+        order = np.lexsort((attempts['attempt_no'], pair_keys))
+        sorted_keys = pair_keys[order]
+        if len(sorted_keys) == 0:
+            return np.full(n_questions, DEFAULT_TIME_TO_SKILL)
+
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        group_sizes = np.diff(np.r_[starts, len(sorted_keys)])
+        sorted_correct = attempts['correct'][order]
+        no_correct = np.iinfo(np.int64).max
+        correct_attempt_no = np.where(sorted_correct, attempts['attempt_no'][order], no_correct)
+        first_correct_no = np.minimum.reduceat(correct_attempt_no, starts)
+
+        improved = (group_sizes > 1) & ~sorted_correct[starts] & (first_correct_no != no_correct)
+        skill_scores = np.maximum(20, 100 - (first_correct_no[improved] - 1) * 30)
+        improved_questions = sorted_keys[starts][improved] // n_users
+
+        improved_counts = np.bincount(improved_questions, minlength=n_questions)
+        improved_sums = np.bincount(improved_questions, weights=skill_scores, minlength=n_questions)
+        return np.where(improved_counts == 0, DEFAULT_TIME_TO_SKILL, improved_sums / np.maximum(improved_counts, 1))
+
+
+async def recompute_learning_impact(db: AsyncSession) -> Dict[str, Any]:
+    """Convenience entry point for jobs and admin scripts"""
+    return await LearningImpactBatchEngine().recompute(db)
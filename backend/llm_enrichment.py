@@ -23,62 +23,13 @@ from sqlalchemy.orm import Session
 from database import Question
 from enrichment_schema_manager import enrichment_schema, quality_controller
 from standardized_enrichment_engine import standardized_enricher
+from metrics import track_llm_call
+from taxonomy_registry import CANONICAL_TAXONOMY, taxonomy_registry
 import openai
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
-# Updated Canonical Taxonomy Structure (from CSV document)
-CANONICAL_TAXONOMY = {
-    "Arithmetic": {
-        "Time-Speed-Distance": ["Basics", "Relative Speed", "Circular Track Motion", "Boats and Streams", "Trains", "Races"],
-        "Time-Work": ["Work Time Effeciency", "Pipes and Cisterns", "Work Equivalence"],
-        "Ratios and Proportions": ["Simple Rations", "Compound Ratios", "Direct and Inverse Variation", "Partnerships"],
-        "Percentages": ["Basics", "Percentage Change", "Successive Percentage Change"],
-        "Averages and Alligation": ["Basic Averages", "Weighted Averages", "Alligations & Mixtures", "Three Mixture Alligations"],
-        "Profit-Loss-Discount": ["Basics", "Successive Profit/Loss/Discounts", "Marked Price and Cost Price Relations", "Discount Chains"],
-        "Simple and Compound Interest": ["Basics", "Difference between Simple Interest and Compound Interests", "Fractional Time Period Compound Interest"],
-        "Mixtures and Solutions": ["Replacements", "Concentration Change", "Solid-Liquid-Gas Mixtures"],
-        "Partnerships": ["Profit share"]
-    },
-    "Algebra": {
-        "Linear Equations": ["Two variable systems", "Three variable systems", "Dependent and Inconsistent Systems"],
-        "Quadratic Equations": ["Roots & Nature of Roots", "Sum and Product of Roots", "Maximum and Minimum Values"],
-        "Inequalities": ["Linear Inequalities", "Quadratic Inequalities", "Modulus and Absolute Value", "Arithmetic Mean", "Geometric Mean", "Cauchy Schwarz"],
-        "Progressions": ["Arithmetic Progression", "Geometric Progression", "Harmonic Progression", "Mixed Progressions"],
-        "Functions and Graphs": ["Linear Functions", "Quadratic Functions", "Polynomial Functions", "Modulus Functions", "Step Functions", "Transformations", "Domain Range", "Composition and Inverse Functions"],
-        "Logarithms and Exponents": ["Basics", "Change of Base Formula", "Soliving Log Equations", "Surds and Indices"],
-        "Special Algebraic Identities": ["Expansion and Factorisation", "Cubes and Squares", "Binomial Theorem"],
-        "Maxima and Minima": ["Optimsation with Algebraic Expressions"],
-        "Special Polynomials": ["Remainder Theorem", "Factor Theorem"]
-    },
-    "Geometry and Mensuration": {
-        "Triangles": ["Properties (Angles, Sides, Medians, Bisectors)", "Congruence & Similarity", "Pythagoras & Converse", "Inradius, Circumradius, Orthocentre"],
-        "Circles": ["Tangents & Chords", "Angles in a Circle", "Cyclic Quadrilaterals"],
-        "Polygons": ["Regular Polygons", "Interior / Exterior Angles"],
-        "Coordinate Geometry": ["Distance", "Section Formula", "Midpoint", "Equation of a line", "Slope & Intercepts", "Circles in Coordinate Plane", "Parabola", "Ellipse", "Hyperbola"],
-        "Mensuration 2D": ["Area Triangle", "Area Rectangle", "Area Trapezium", "Area Circle", "Sector"],
-        "Mensuration 3D": ["Volume Cubes", "Volume Cuboid", "Volume Cylinder", "Volume Cone", "Volume Sphere", "Volume Hemisphere", "Surface Areas"],
-        "Trigonometry": ["Heights and Distances", "Basic Trigonometric Ratios"]
-    },
-    "Number System": {
-        "Divisibility": ["Basic Divisibility Rules", "Factorisation of Integers"],
-        "HCF-LCM": ["Euclidean Algorithm", "Product of HCF and LCM"],
-        "Remainders": ["Basic Remainder Theorem", "Chinese Remainder Theorem", "Cyclicity of Remainders (Last Digits)", "Cyclicity of Remainders (Last Two Digits)"],
-        "Base Systems": ["Conversion between bases", "Arithmetic in different bases"],
-        "Digit Properties": ["Sum of Digits", "Last Digit Patterns", "Palindromes", "Repetitive Digits"],
-        "Number Properties": ["Perfect Squares", "Perfect Cubes"],
-        "Number Series": ["Sum of Squares", "Sum of Cubes", "Telescopic Series"],
-        "Factorials": ["Properties of Factorials"]
-    },
-    "Modern Math": {
-        "Permutation-Combination": ["Basics", "Circular Permutations", "Permutations with Repetitions", "Permutations with Restrictions", "Combinations with Repetitions", "Combinations with Restrictions"],
-        "Probability": ["Classical Probability", "Conditional Probability", "Bayes' Theorem"],
-        "Set Theory and Venn Diagram": ["Union and Intersection", "Complement and Difference of Sets", "Multi Set Problems"]
-    }
-}
-
-
 class LLMEnrichmentPipeline:
     def __init__(self, llm_api_key: str):
         self.llm_api_key = llm_api_key
@@ -108,11 +59,13 @@ class LLMEnrichmentPipeline:
             openai.api_key = openai_key
             client = openai.OpenAI(api_key=openai_key)
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000
-            )
+            with track_llm_call("openai", "gpt-4o", "analyze_text") as llm_call:
+                response = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=1000
+                )
+                llm_call.record_usage(response)
             
             return response.choices[0].message.content
             
@@ -219,14 +172,16 @@ Rules:
                 
             client = openai.OpenAI(api_key=openai_key)
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Question: {stem}"}
-                ],
-                max_tokens=200
-            )
+            with track_llm_call("openai", "gpt-4o", "generate_answer") as llm_call:
+                response = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": f"Question: {stem}"}
+                    ],
+                    max_tokens=200
+                )
+                llm_call.record_usage(response)
             
             # Clean and validate the answer
             answer = response.choices[0].message.content.strip()
@@ -333,14 +288,16 @@ RETURN FORMAT:
                 
             client = openai.OpenAI(api_key=openai_key)
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Question: {stem}"}
-                ],
-                max_tokens=500
-            )
+            with track_llm_call("openai", "gpt-4o", "categorize_question") as llm_call:
+                response = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": f"Question: {stem}"}
+                    ],
+                    max_tokens=500
+                )
+                llm_call.record_usage(response)
             
             result = json.loads(response.choices[0].message.content)
             category = result.get("category")
@@ -369,9 +326,7 @@ RETURN FORMAT:
                     logger.info(f"Upgraded 'Basics' to 'Relative Speed' based on content analysis")
             
             # Validate against taxonomy
-            if (category in CANONICAL_TAXONOMY and 
-                subcategory in CANONICAL_TAXONOMY[category] and
-                type_of_question in CANONICAL_TAXONOMY[category][subcategory]):
+            if taxonomy_registry.is_valid(category, subcategory, type_of_question):
                 return category, subcategory, type_of_question
             else:
                 logger.warning(f"Invalid categorization: {category}, {subcategory}, {type_of_question}")
@@ -416,11 +371,12 @@ The detailed solution should be educational and thorough - aim for at least 200-
                 
             client = openai.OpenAI(api_key=openai_key)
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"""
+            with track_llm_call("openai", "gpt-4o", "generate_solutions") as llm_call:
+                response = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": f"""
 Question: {stem}
 Correct Answer: {answer}
 Category: {category}
@@ -430,9 +386,10 @@ Please provide:
 1. SOLUTION APPROACH: [Brief strategy overview]
 2. DETAILED SOLUTION: [Comprehensive step-by-step explanation with basics]
 """}
-                ],
-                max_tokens=1500
-            )
+                    ],
+                    max_tokens=1500
+                )
+                llm_call.record_usage(response)
             
             response_text = response.choices[0].message.content.strip()
             
@@ -819,14 +776,16 @@ RULES:
             if image_url:
                 user_content += f"\nImage: {image_url}"
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_content}
-                ],
-                max_tokens=200
-            )
+            with track_llm_call("openai", "gpt-4o", "generate_answer") as llm_call:
+                response = client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": user_content}
+                    ],
+                    max_tokens=200
+                )
+                llm_call.record_usage(response)
             
             # Clean up the response to just get the answer
             answer = response.choices[0].message.content.strip()
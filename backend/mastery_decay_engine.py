@@ -0,0 +1,134 @@
+"""
+Bulk Mastery Decay Engine
+Applies time decay to all inactive users' mastery rows with one grouped UPDATE ... FROM
+"""
+
+import logging
+import math
+import time
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import select, update, func, cast, literal, Date, Integer
+from database import Mastery, Session, JobWatermark, AsyncSession, get_dialect_name
+
+logger = logging.getLogger(__name__)
+
+MASTERY_DECAY_JOB = "mastery_decay"
+
+# Used when the job has never run, so the first run decays the full inactivity period
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+class MasteryDecayEngine:
+    """
+    Decays mastery for inactive users in O(1) round trips.
+
+    Days to decay per user are the fully inactive days between the later of
+    (last session date, decay watermark) and yesterday. The watermark advances to
+    yesterday after each run, so repeated runs on the same day are no-ops and a
+    missed day is caught up on the next run.
+    """
+
+    def __init__(self, time_decay_factor: float = 0.95):
+        self.time_decay_factor = time_decay_factor
+
+    async def run(self, db: AsyncSession, today: Optional[date] = None) -> Dict[str, Any]:
+        """Apply decay factor ** days_inactive to every inactive user's mastery rows"""
+        started = time.perf_counter()
+        today = today or datetime.utcnow().date()
+        decay_through = today - timedelta(days=1)
+
+        watermark_row = (await db.execute(
+            select(JobWatermark).where(JobWatermark.job_name == MASTERY_DECAY_JOB)
+        )).scalar_one_or_none()
+        watermark = watermark_row.watermark.date() if watermark_row and watermark_row.watermark else _EPOCH_DATE
+
+        if watermark >= decay_through:
+            logger.info(f"Mastery decay already applied through {watermark}, skipping")
+            return {'status': 'skipped', 'watermark': watermark.isoformat(), 'users_decayed': 0, 'rows_affected': 0}
+
+        dialect_name = get_dialect_name(db)
+        if dialect_name == 'sqlite':
+            _ensure_sqlite_power(db)
+
+        inactive_days = self._build_inactive_days_subquery(dialect_name, decay_through, watermark)
+
+        users_decayed = (await db.execute(select(func.count()).select_from(inactive_days))).scalar() or 0
+
+        factor = func.power(self.time_decay_factor, inactive_days.c.days)
+        accuracy_easy = func.coalesce(Mastery.accuracy_easy, 0) * factor
+        accuracy_med = func.coalesce(Mastery.accuracy_med, 0) * factor
+        accuracy_hard = func.coalesce(Mastery.accuracy_hard, 0) * factor
+        efficiency_score = func.coalesce(Mastery.efficiency_score, 0) * factor
+
+        # Same formula as MasteryTracker.calculate_overall_mastery, evaluated on the decayed values
+        least = func.least if dialect_name != 'sqlite' else func.min
+        greatest = func.greatest if dialect_name != 'sqlite' else func.max
+        weighted_accuracy = 0.2 * accuracy_easy + 0.4 * accuracy_med + 0.4 * accuracy_hard
+        efficiency_bonus = least(0.1, efficiency_score * 0.1)
+        exposure_factor = least(1.0, func.coalesce(Mastery.exposure_score, 0) / 10.0)
+        mastery_pct = greatest(0.0, least(1.0, (weighted_accuracy + efficiency_bonus) * exposure_factor))
+
+        result = await db.execute(
+            update(Mastery)
+            .where(Mastery.user_id == inactive_days.c.user_id)
+            .values(
+                accuracy_easy=accuracy_easy,
+                accuracy_med=accuracy_med,
+                accuracy_hard=accuracy_hard,
+                efficiency_score=efficiency_score,
+                mastery_pct=mastery_pct,
+                last_updated=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows_affected = result.rowcount
+
+        if watermark_row is None:
+            watermark_row = JobWatermark(job_name=MASTERY_DECAY_JOB)
+            db.add(watermark_row)
+        watermark_row.watermark = datetime.combine(decay_through, datetime.min.time())
+        watermark_row.last_affected_rows = rows_affected
+        watermark_row.updated_at = datetime.utcnow()
+        await db.commit()
+
+        duration = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Applied mastery decay through {decay_through} to {users_decayed} inactive users "
+            f"({rows_affected} mastery rows) in {duration}s"
+        )
+
+        return {
+            'status': 'completed',
+            'watermark': decay_through.isoformat(),
+            'previous_watermark': None if watermark == _EPOCH_DATE else watermark.isoformat(),
+            'users_decayed': users_decayed,
+            'rows_affected': rows_affected,
+            'duration_seconds': duration
+        }
+
+    def _build_inactive_days_subquery(self, dialect_name: str, decay_through: date, watermark: date):
+        """One grouped query over sessions: (user_id, days to decay) for users with days > 0"""
+        last_activity = func.max(Session.started_at)
+
+        if dialect_name == 'sqlite':
+            # Dates are ISO strings in SQLite, so MAX() picks the later one and julianday() does the arithmetic
+            decay_from = func.max(func.date(last_activity), literal(watermark.isoformat()))
+            days = cast(func.julianday(literal(decay_through.isoformat())) - func.julianday(decay_from), Integer)
+        else:
+            decay_from = func.greatest(cast(last_activity, Date), literal(watermark, Date))
+            days = literal(decay_through, Date) - decay_from
+
+        return (
+            select(Session.user_id.label('user_id'), days.label('days'))
+            .group_by(Session.user_id)
+            .having(days > 0)
+            .subquery('inactive_days')
+        )
+
+
+def _ensure_sqlite_power(db):
+    """SQLite builds without math functions have no power(); register a Python fallback"""
+    session = getattr(db, '_session', db)
+    dbapi_connection = session.connection().connection.dbapi_connection
+    dbapi_connection.create_function("power", 2, math.pow, deterministic=True)
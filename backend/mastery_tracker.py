@@ -6,9 +6,9 @@ Implements EWMA-based mastery calculation with time decay as per specification
 import uuid
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
-from database import Mastery, Attempt, User, Topic, Question
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc, func
+from database import Mastery, TypeMastery, Attempt, User, Topic, Question, AsyncSession, get_dialect_name, dialect_insert
+from taxonomy_registry import taxonomy_registry
+from sqlalchemy import select, update, delete, and_, or_, desc, func, case, literal
 import logging
 import math
 from formulas import (
@@ -34,215 +34,258 @@ class MasteryTracker:
             "Medium": 150,   # seconds
             "Difficult": 210 # seconds
         }
+        
+        # Mastery accuracy column per difficulty band
+        self.difficulty_accuracy_columns = {
+            "Easy": "accuracy_easy",
+            "Medium": "accuracy_med",
+            "Difficult": "accuracy_hard"
+        }
     
-    async def update_mastery_after_attempt(self, db: AsyncSession, attempt: Attempt):
-        """Update mastery immediately after a question attempt"""
+    async def update_mastery_for_attempt(self, db: AsyncSession, attempt: Attempt, question: Question,
+                                         include_topic_mastery: bool = True,
+                                         include_type_mastery: bool = True) -> bool:
+        """
+        Update topic and type mastery for an attempt on an already-loaded question.
+        Each row is one INSERT ... ON CONFLICT DO UPDATE with the EWMA arithmetic in SQL,
+        so concurrent submissions for the same user/topic cannot lose updates; commits once.
+        """
         try:
-            # Get question to determine topic
-            question_result = await db.execute(select(Question).where(Question.id == attempt.question_id))
-            question = question_result.scalar_one_or_none()
-            
-            if not question or not question.topic_id:
-                logger.warning(f"No topic found for question {attempt.question_id}")
-                return
-            
-            # Get or create mastery record
-            mastery_result = await db.execute(
-                select(Mastery).where(
-                    Mastery.user_id == attempt.user_id,
-                    Mastery.topic_id == question.topic_id
-                )
-            )
-            mastery = mastery_result.scalar_one_or_none()
-            
-            if not mastery:
-                mastery = Mastery(
-                    user_id=attempt.user_id,
-                    topic_id=question.topic_id,
-                    exposure_score=0,
-                    accuracy_easy=0,
-                    accuracy_med=0,
-                    accuracy_hard=0,
-                    efficiency_score=0,
-                    mastery_pct=0,
-                    last_updated=datetime.utcnow()
-                )
-                db.add(mastery)
-                await db.flush()
+            if include_topic_mastery:
+                if question.topic_id:
+                    await db.execute(self.build_mastery_upsert(db, attempt, question))
+                else:
+                    logger.warning(f"No topic found for question {attempt.question_id}")
             
-            # Update mastery with this attempt
-            await self.update_mastery_scores(db, mastery, attempt, question)
+            if include_type_mastery:
+                await db.execute(self.build_type_mastery_upsert(db, attempt, question))
             
             await db.commit()
-            logger.info(f"Updated mastery for user {attempt.user_id}, topic {question.topic_id}")
+            logger.info(f"Updated mastery for user {attempt.user_id}, question {question.id}")
+            return True
             
         except Exception as e:
             logger.error(f"Error updating mastery after attempt: {e}")
             await db.rollback()
+            return False
+    
+    async def update_mastery_after_attempt(self, db: AsyncSession, attempt: Attempt):
+        """Update topic mastery immediately after a question attempt"""
+        question = await self._get_attempt_question(db, attempt)
+        if question:
+            await self.update_mastery_for_attempt(db, attempt, question, include_type_mastery=False)
 
     async def update_type_mastery_after_attempt(self, db: AsyncSession, attempt: Attempt):
         """Update type-level mastery after a question attempt (for three-phase adaptive system)"""
+        question = await self._get_attempt_question(db, attempt)
+        if question:
+            await self.update_mastery_for_attempt(db, attempt, question, include_topic_mastery=False)
+    
+    async def _get_attempt_question(self, db: AsyncSession, attempt: Attempt) -> Optional[Question]:
+        question_result = await db.execute(select(Question).where(Question.id == attempt.question_id))
+        question = question_result.scalar_one_or_none()
+        if not question:
+            logger.warning(f"No question found for attempt {attempt.id}")
+        return question
+    
+    def build_mastery_upsert(self, db: AsyncSession, attempt: Attempt, question: Question):
+        """Topic mastery upsert: exposure +1, EWMA of the difficulty's accuracy and of efficiency, then mastery_pct"""
+        alpha = self.ewma_alpha
+        accuracy_point = 1.0 if attempt.correct else 0.0
+        efficiency_point = self.calculate_efficiency_point(attempt, question)
+        accuracy_column = self.difficulty_accuracy_columns.get(question.difficulty_band)
+        now = datetime.utcnow()
+        
+        # First attempt: the same update applied to an all-zero row
+        initial = Mastery(exposure_score=1.0, accuracy_easy=0.0, accuracy_med=0.0, accuracy_hard=0.0,
+                          efficiency_score=alpha * efficiency_point)
+        if accuracy_column:
+            setattr(initial, accuracy_column, max(0.0, min(1.0, alpha * accuracy_point)))
+        initial.mastery_pct = self.calculate_overall_mastery(initial)
+        
+        dialect_name = get_dialect_name(db)
+        least = func.least if dialect_name != 'sqlite' else func.min
+        greatest = func.greatest if dialect_name != 'sqlite' else func.max
+        
+        # Existing row: same arithmetic as calculate_overall_mastery, on the updated values
+        accuracy = {
+            column: func.coalesce(getattr(Mastery, column), 0)
+            for column in ('accuracy_easy', 'accuracy_med', 'accuracy_hard')
+        }
+        if accuracy_column:
+            accuracy[accuracy_column] = greatest(0.0, least(1.0, alpha * accuracy_point + (1 - alpha) * accuracy[accuracy_column]))
+        exposure_score = func.coalesce(Mastery.exposure_score, 0) + 1.0
+        efficiency_score = alpha * efficiency_point + (1 - alpha) * func.coalesce(Mastery.efficiency_score, 0)
+        weighted_accuracy = 0.2 * accuracy['accuracy_easy'] + 0.4 * accuracy['accuracy_med'] + 0.4 * accuracy['accuracy_hard']
+        efficiency_bonus = least(0.1, efficiency_score * 0.1)
+        exposure_factor = least(1.0, exposure_score / 10.0)
+        mastery_pct = greatest(0.0, least(1.0, (weighted_accuracy + efficiency_bonus) * exposure_factor))
+        
+        updates = {
+            'exposure_score': exposure_score,
+            'efficiency_score': efficiency_score,
+            'mastery_pct': mastery_pct,
+            'last_updated': now
+        }
+        if accuracy_column:
+            updates[accuracy_column] = accuracy[accuracy_column]
+        
+        return dialect_insert(db, Mastery).values(
+            user_id=attempt.user_id,
+            topic_id=question.topic_id,
+            exposure_score=initial.exposure_score,
+            accuracy_easy=initial.accuracy_easy,
+            accuracy_med=initial.accuracy_med,
+            accuracy_hard=initial.accuracy_hard,
+            efficiency_score=initial.efficiency_score,
+            mastery_pct=initial.mastery_pct,
+            last_updated=now
+        ).on_conflict_do_update(index_elements=['user_id', 'topic_id'], set_=updates)
+    
+    def build_type_mastery_upsert(self, db: AsyncSession, attempt: Attempt, question: Question):
+        """Type mastery upsert: counts, accuracy, EWMA average time (alpha 0.3) and 70/30 accuracy/efficiency score"""
+        category = self.get_category_from_subcategory(question.subcategory or 'Unknown')
+        subcategory = question.subcategory or 'Unknown'
+        type_of_question = question.type_of_question or 'General'
+        correct_point = 1 if attempt.correct else 0
+        time_taken = attempt.time_sec or 0
+        now = datetime.utcnow()
+        
+        dialect_name = get_dialect_name(db)
+        greatest = func.greatest if dialect_name != 'sqlite' else func.max
+        
+        total_attempts = func.coalesce(TypeMastery.total_attempts, 0) + 1
+        correct_attempts = func.coalesce(TypeMastery.correct_attempts, 0) + correct_point
+        accuracy_rate = literal(1.0) * correct_attempts / total_attempts
+        current_avg_time = func.coalesce(TypeMastery.avg_time_taken, 0)
+        if time_taken:
+            avg_time_taken = case((current_avg_time > 0, 0.3 * time_taken + 0.7 * current_avg_time), else_=time_taken)
+        else:
+            avg_time_taken = current_avg_time
+        # Efficiency against a 120s target, floored at 0.3
+        efficiency = case((avg_time_taken <= 120, 1.0), else_=greatest(0.3, 120.0 / avg_time_taken))
+        
+        initial_efficiency = 1.0 if time_taken <= 120 else max(0.3, 120.0 / time_taken)
+        
+        return dialect_insert(db, TypeMastery).values(
+            user_id=attempt.user_id,
+            category=category,
+            subcategory=subcategory,
+            type_of_question=type_of_question,
+            total_attempts=1,
+            correct_attempts=correct_point,
+            accuracy_rate=float(correct_point),
+            avg_time_taken=time_taken,
+            mastery_score=0.7 * correct_point + 0.3 * initial_efficiency,
+            first_attempt_date=now,
+            last_attempt_date=now,
+            last_updated=now
+        ).on_conflict_do_update(
+            index_elements=['user_id', 'category', 'subcategory', 'type_of_question'],
+            set_={
+                'total_attempts': total_attempts,
+                'correct_attempts': correct_attempts,
+                'accuracy_rate': accuracy_rate,
+                'avg_time_taken': avg_time_taken,
+                'mastery_score': 0.7 * accuracy_rate + 0.3 * efficiency,
+                'last_attempt_date': now,
+                'last_updated': now
+            }
+        )
+
+    def get_category_from_subcategory(self, subcategory: str) -> str:
+        """Map subcategory to canonical category for type mastery tracking"""
+        return taxonomy_registry.resolve_category(subcategory)
+
+    async def realign_type_mastery_categories(self, db: AsyncSession) -> Dict[str, Any]:
+        """
+        Re-key type_mastery rows whose category no longer matches the taxonomy registry (e.g. Trigonometry,
+        formerly defaulted to Arithmetic), merging into the user's row under the current category if one
+        exists. Idempotent; a no-op when every row is aligned.
+        """
         try:
-            # Get question to determine type information
-            question_result = await db.execute(select(Question).where(Question.id == attempt.question_id))
-            question = question_result.scalar_one_or_none()
-            
-            if not question:
-                logger.warning(f"No question found for attempt {attempt.id}")
-                return
-            
-            # Extract taxonomy triple
-            category = self.get_category_from_subcategory(question.subcategory or 'Unknown')
-            subcategory = question.subcategory or 'Unknown'
-            type_of_question = question.type_of_question or 'General'
-            
-            from database import TypeMastery
-            
-            # Get or create type mastery record
-            type_mastery_result = await db.execute(
-                select(TypeMastery).where(
-                    TypeMastery.user_id == attempt.user_id,
-                    TypeMastery.category == category,
-                    TypeMastery.subcategory == subcategory,
-                    TypeMastery.type_of_question == type_of_question
-                )
-            )
-            type_mastery = type_mastery_result.scalar_one_or_none()
-            
-            if not type_mastery:
-                type_mastery = TypeMastery(
-                    user_id=attempt.user_id,
-                    category=category,
-                    subcategory=subcategory,
-                    type_of_question=type_of_question,
-                    total_attempts=0,
-                    correct_attempts=0,
-                    accuracy_rate=0,
-                    avg_time_taken=0,
-                    mastery_score=0,
-                    first_attempt_date=datetime.utcnow(),
-                    last_attempt_date=datetime.utcnow(),
-                    last_updated=datetime.utcnow()
-                )
-                db.add(type_mastery)
-                await db.flush()
-            
-            # Update type mastery with this attempt
-            await self.update_type_mastery_scores(db, type_mastery, attempt)
-            
+            pairs = (await db.execute(
+                select(TypeMastery.category, TypeMastery.subcategory).distinct()
+            )).all()
+            stale = [
+                (category, subcategory, self.get_category_from_subcategory(subcategory))
+                for category, subcategory in pairs
+                if category != self.get_category_from_subcategory(subcategory)
+            ]
+            moved = merged = 0
+            for old_category, subcategory, new_category in stale:
+                rows = (await db.execute(
+                    select(TypeMastery).where(TypeMastery.category == old_category, TypeMastery.subcategory == subcategory)
+                )).scalars().all()
+                for row in rows:
+                    target = (await db.execute(
+                        select(TypeMastery).where(
+                            TypeMastery.user_id == row.user_id,
+                            TypeMastery.category == new_category,
+                            TypeMastery.subcategory == subcategory,
+                            TypeMastery.type_of_question == row.type_of_question
+                        )
+                    )).scalar_one_or_none()
+                    if target is None:
+                        await db.execute(
+                            update(TypeMastery)
+                            .where(
+                                TypeMastery.user_id == row.user_id,
+                                TypeMastery.category == old_category,
+                                TypeMastery.subcategory == subcategory,
+                                TypeMastery.type_of_question == row.type_of_question
+                            )
+                            .values(category=new_category)
+                            .execution_options(synchronize_session=False)
+                        )
+                        moved += 1
+                    else:
+                        self._merge_type_mastery(target, row)
+                        await db.execute(
+                            delete(TypeMastery)
+                            .where(
+                                TypeMastery.user_id == row.user_id,
+                                TypeMastery.category == old_category,
+                                TypeMastery.subcategory == subcategory,
+                                TypeMastery.type_of_question == row.type_of_question
+                            )
+                            .execution_options(synchronize_session=False)
+                        )
+                        merged += 1
             await db.commit()
-            logger.info(f"Updated type mastery for user {attempt.user_id}: {category}>{subcategory}>{type_of_question}")
-            
+            if stale:
+                logger.info(f"Realigned type mastery categories: {moved} rows moved, {merged} merged ({len(stale)} subcategories)")
+            return {'subcategories': len(stale), 'moved': moved, 'merged': merged}
+
         except Exception as e:
-            logger.error(f"Error updating type mastery after attempt: {e}")
+            logger.error(f"Error realigning type mastery categories: {e}")
             await db.rollback()
+            return {'status': 'error', 'error': str(e)}
 
-    async def update_type_mastery_scores(self, db: AsyncSession, type_mastery, attempt: Attempt):
-        """Update type-level mastery scores based on attempt"""
-        try:
-            # Update attempt counts
-            type_mastery.total_attempts += 1
-            if attempt.is_correct:
-                type_mastery.correct_attempts += 1
-            
-            # Calculate new accuracy rate
-            type_mastery.accuracy_rate = type_mastery.correct_attempts / type_mastery.total_attempts if type_mastery.total_attempts > 0 else 0
-            
-            # Update average time (EWMA with alpha=0.3)
-            if attempt.time_taken:
-                if type_mastery.avg_time_taken > 0:
-                    type_mastery.avg_time_taken = 0.3 * attempt.time_taken + 0.7 * type_mastery.avg_time_taken
-                else:
-                    type_mastery.avg_time_taken = attempt.time_taken
-            
-            # Calculate mastery score (combination of accuracy and efficiency)
-            accuracy_component = float(type_mastery.accuracy_rate)
-            
-            # Efficiency component based on time
-            efficiency_component = 1.0  # Default to full efficiency
-            if type_mastery.avg_time_taken > 0:
-                # Assume target time is 120 seconds
-                target_time = 120
-                if type_mastery.avg_time_taken <= target_time:
-                    efficiency_component = 1.0
-                else:
-                    efficiency_component = max(0.3, target_time / type_mastery.avg_time_taken)
-            
-            # Combined mastery score (70% accuracy, 30% efficiency)
-            type_mastery.mastery_score = 0.7 * accuracy_component + 0.3 * efficiency_component
-            
-            # Update timestamps
-            type_mastery.last_attempt_date = datetime.utcnow()
-            type_mastery.last_updated = datetime.utcnow()
-            
-            logger.debug(f"Type mastery updated: Accuracy={type_mastery.accuracy_rate:.2f}, Mastery={type_mastery.mastery_score:.2f}")
-            
-        except Exception as e:
-            logger.error(f"Error updating type mastery scores: {e}")
+    def _merge_type_mastery(self, target: TypeMastery, source: TypeMastery):
+        """Fold source's counts into target; averages weighted by attempts"""
+        target_attempts = target.total_attempts or 0
+        source_attempts = source.total_attempts or 0
+        total_attempts = target_attempts + source_attempts
+        correct_attempts = (target.correct_attempts or 0) + (source.correct_attempts or 0)
 
-    def get_category_from_subcategory(self, subcategory: str) -> str:
-        """Map subcategory to canonical category for type mastery tracking"""
-        try:
-            # Canonical mapping based on the taxonomy
-            canonical_mapping = {
-                # Arithmetic
-                "Time-Speed-Distance": "Arithmetic",
-                "Time-Work": "Arithmetic", 
-                "Ratios and Proportions": "Arithmetic",
-                "Percentages": "Arithmetic",
-                "Averages and Alligation": "Arithmetic",
-                "Profit-Loss-Discount": "Arithmetic",
-                "Simple and Compound Interest": "Arithmetic",
-                "Mixtures and Solutions": "Arithmetic",
-                "Partnerships": "Arithmetic",
-                
-                # Algebra
-                "Linear Equations": "Algebra",
-                "Quadratic Equations": "Algebra", 
-                "Inequalities": "Algebra",
-                "Progressions": "Algebra",
-                "Functions and Graphs": "Algebra",
-                "Logarithms and Exponents": "Algebra",
-                "Special Algebraic Identities": "Algebra",
-                "Maxima and Minima": "Algebra",
-                "Special Polynomials": "Algebra",
-                
-                # Geometry and Mensuration
-                "Triangles": "Geometry and Mensuration",
-                "Circles": "Geometry and Mensuration",
-                "Polygons": "Geometry and Mensuration",
-                "Lines and Angles": "Geometry and Mensuration",
-                "Coordinate Geometry": "Geometry and Mensuration",
-                "Mensuration 2D": "Geometry and Mensuration", 
-                "Mensuration 3D": "Geometry and Mensuration",
-                
-                # Number System
-                "Divisibility": "Number System",
-                "HCF-LCM": "Number System",
-                "Remainders": "Number System",
-                "Base Systems": "Number System",
-                "Digit Properties": "Number System",
-                "Number Properties": "Number System",
-                "Number Series": "Number System", 
-                "Factorials": "Number System",
-                
-                # Modern Math
-                "Permutation-Combination": "Modern Math",
-                "Probability": "Modern Math",
-                "Set Theory and Venn Diagram": "Modern Math"
-            }
-            
-            return canonical_mapping.get(subcategory, "Arithmetic")  # Default to Arithmetic
-            
-        except Exception as e:
-            logger.error(f"Error mapping subcategory to category: {e}")
-            return "Arithmetic"
+        def weighted(target_value, source_value) -> float:
+            if not total_attempts:
+                return float(target_value or 0)
+            return (float(target_value or 0) * target_attempts + float(source_value or 0) * source_attempts) / total_attempts
+
+        target.avg_time_taken = round(weighted(target.avg_time_taken, source.avg_time_taken), 2)
+        target.mastery_score = round(weighted(target.mastery_score, source.mastery_score), 2)
+        target.total_attempts = total_attempts
+        target.correct_attempts = correct_attempts
+        target.accuracy_rate = round(correct_attempts / total_attempts, 2) if total_attempts else 0
+        target.first_attempt_date = min(filter(None, [target.first_attempt_date, source.first_attempt_date]), default=None)
+        target.last_attempt_date = max(filter(None, [target.last_attempt_date, source.last_attempt_date]), default=None)
+        target.last_updated = datetime.utcnow()
 
     async def get_type_mastery_breakdown(self, db: AsyncSession, user_id: str) -> List[Dict[str, Any]]:
         """Get detailed type-level mastery breakdown for user"""
         try:
-            from database import TypeMastery
-            
             result = await db.execute(
                 select(TypeMastery).where(TypeMastery.user_id == user_id)
                 .order_by(TypeMastery.category, TypeMastery.subcategory, TypeMastery.type_of_question)
@@ -271,39 +314,6 @@ class MasteryTracker:
             logger.error(f"Error getting type mastery breakdown: {e}")
             return []
     
-    async def update_mastery_scores(self, db: AsyncSession, mastery: Mastery, 
-                                  attempt: Attempt, question: Question):
-        """Update all mastery component scores"""
-        try:
-            # Update exposure score (incremental)
-            mastery.exposure_score = float(mastery.exposure_score) + 1.0
-            
-            # Update difficulty-specific accuracy using EWMA
-            difficulty = question.difficulty_band
-            current_accuracy = self.get_difficulty_accuracy(mastery, difficulty)
-            new_accuracy_point = 1.0 if attempt.correct else 0.0
-            
-            # EWMA update: new_value = alpha * new_point + (1 - alpha) * old_value
-            updated_accuracy = (self.ewma_alpha * new_accuracy_point + 
-                              (1 - self.ewma_alpha) * current_accuracy)
-            
-            self.set_difficulty_accuracy(mastery, difficulty, updated_accuracy)
-            
-            # Update efficiency score
-            efficiency_point = self.calculate_efficiency_point(attempt, question)
-            current_efficiency = float(mastery.efficiency_score)
-            updated_efficiency = (self.ewma_alpha * efficiency_point + 
-                                (1 - self.ewma_alpha) * current_efficiency)
-            mastery.efficiency_score = updated_efficiency
-            
-            # Calculate overall mastery percentage
-            mastery.mastery_pct = self.calculate_overall_mastery(mastery)
-            mastery.last_updated = datetime.utcnow()
-            
-        except Exception as e:
-            logger.error(f"Error updating mastery scores: {e}")
-            raise
-    
     def get_difficulty_accuracy(self, mastery: Mastery, difficulty: str) -> float:
         """Get accuracy for specific difficulty level"""
         if difficulty == "Easy":
@@ -7,6 +7,7 @@ import json
 import uuid
 from typing import Dict, List
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from metrics import track_llm_call
 import logging
 
 logger = logging.getLogger(__name__)
@@ -97,7 +98,8 @@ Difficulty: {difficulty_band}
 Generate 4 MCQ options where one matches the correct answer and three are plausible wrong answers based on common mistakes. Return ONLY the JSON object."""
 
             user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            with track_llm_call("openai", "gpt-4o-mini", "generate_options"):
+                response = await chat.send_message(user_message)
             
             logger.info(f"MCQ LLM raw response: {response}")
             
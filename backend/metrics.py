@@ -0,0 +1,173 @@
+"""
+Prometheus Metrics for CAT Preparation Platform
+HTTP latency, in-flight requests and bytes saved by compression / 304s, database pool saturation,
+LLM call latency/errors/tokens, enrichment queue depth and background job run times, exposed in
+Prometheus text format at /metrics
+"""
+
+import os
+import time
+import logging
+import functools
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Optional bearer token for the /metrics endpoint (unset: open, expected behind the internal network)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+HTTP_RESPONSE_BYTES_SAVED = Counter(
+    "http_response_bytes_saved_total", "Response body bytes not sent thanks to compression or 304 Not Modified",
+    ["mechanism"]
+)
+HTTP_NOT_MODIFIED = Counter("http_not_modified_total", "Conditional GETs answered with 304 Not Modified", ["route"])
+
+LLM_CALL_DURATION = Histogram(
+    "llm_call_duration_seconds", "LLM call latency",
+    ["provider", "model", "operation"],
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+LLM_CALL_ERRORS = Counter("llm_call_errors_total", "LLM calls that raised", ["provider", "model", "operation"])
+# Only responses with a usage object (OpenAI SDK calls) are counted; LlmChat.send_message returns plain text,
+# so Gemini and Anthropic calls made through it appear in the call metrics but not here
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens reported by the provider", ["provider", "model", "kind"])
+
+ENRICHMENT_QUEUE_DEPTH = Gauge(
+    "enrichment_queue_depth", "Background enrichment tasks queued or running in this worker", ["kind"]
+)
+
+JOB_RUN_DURATION = Histogram(
+    "background_job_duration_seconds", "Scheduled background job run time",
+    ["job", "status"],
+    buckets=(1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 1800.0, 3600.0, 7200.0)
+)
+
+
+class DatabasePoolCollector:
+    """Connection pool gauges, read from the pool at scrape time (nothing in the request path)"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.pool
+        for name, documentation, reader in (
+            ("db_pool_size", "Configured connection pool size", "size"),
+            ("db_pool_checked_out", "Connections currently checked out", "checkedout"),
+            ("db_pool_checked_in", "Idle connections in the pool", "checkedin"),
+            ("db_pool_overflow", "Connections open beyond pool_size (negative: unused pool slots)", "overflow"),
+        ):
+            value = getattr(pool, reader, None)
+            if callable(value):
+                yield GaugeMetricFamily(name, documentation, value=value())
+
+
+def register_database_pool(engine):
+    REGISTRY.register(DatabasePoolCollector(engine))
+
+
+class LLMCall:
+    """Handle yielded by track_llm_call, for recording token usage from the response"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+
+    def record_usage(self, response: Any):
+        """Token counts from an OpenAI (prompt/completion) or Anthropic (input/output) style response"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        for kind, attributes in (("prompt", ("prompt_tokens", "input_tokens")), ("completion", ("completion_tokens", "output_tokens"))):
+            for attribute in attributes:
+                tokens = getattr(usage, attribute, None)
+                if tokens:
+                    LLM_TOKENS.labels(self.provider, self.model, kind).inc(tokens)
+                    break
+
+
+@contextmanager
+def track_llm_call(provider: str, model: str, operation: str) -> Iterator[LLMCall]:
+    """Time an LLM call; exceptions are counted as errors and re-raised"""
+    started = time.perf_counter()
+    try:
+        yield LLMCall(provider, model)
+    except Exception:
+        LLM_CALL_ERRORS.labels(provider, model, operation).inc()
+        raise
+    finally:
+        LLM_CALL_DURATION.labels(provider, model, operation).observe(time.perf_counter() - started)
+
+
+def track_enrichment_task(kind: str):
+    """Decorator for background enrichment coroutines: counts them in enrichment_queue_depth while pending"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            ENRICHMENT_QUEUE_DEPTH.labels(kind).inc()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                ENRICHMENT_QUEUE_DEPTH.labels(kind).dec()
+        return wrapper
+    return decorator
+
+
+def observe_job_run(job_name: str, status: str, seconds: float):
+    JOB_RUN_DURATION.labels(job_name, status).observe(seconds)
+
+
+class HTTPMetricsMiddleware:
+    """ASGI middleware: per-route latency histogram and in-flight gauge (route templates, not raw paths)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_templates: Optional[Dict[Any, str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(
+                scope.get("method", ""), self._route_template(scope), str(status_holder["status"])
+            ).observe(time.perf_counter() - started)
+
+    def _route_template(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "<unmatched>"
+        if self._route_templates is None:
+            app = scope.get("app")
+            self._route_templates = {
+                getattr(route, "endpoint", None): route.path
+                for route in getattr(app, "routes", [])
+                if hasattr(route, "path")
+            }
+        return self._route_templates.get(endpoint, "<unmatched>")
+
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
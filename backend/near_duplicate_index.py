@@ -0,0 +1,250 @@
+"""
+Near-Duplicate Detection for CAT Preparation Platform
+MinHash signatures over shingled, normalized stems with LSH banding, for questions and PYQs
+"""
+
+import os
+import re
+import zlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Set, Tuple, Optional, Any, Iterable
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from database import Question, PYQQuestion, StemSignature, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+LSH_BANDS = 32  # 32 bands × 4 rows: a pair at 0.8 Jaccard shares a band with probability > 0.9999
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3  # word 3-grams
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_JACCARD_THRESHOLD", "0.8"))
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+# Fixed seed: signatures are persisted, so the permutations must be identical in every process
+_rng = np.random.RandomState(20240817)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+ITEM_MODELS = {
+    'question': Question,
+    'pyq': PYQQuestion
+}
+
+
+def normalize_stem(stem: Optional[str]) -> List[str]:
+    """Lowercased alphanumeric tokens with markup removed; numbers are kept, they distinguish questions"""
+    if not stem:
+        return []
+    return _TOKEN_PATTERN.findall(_TAG_PATTERN.sub(" ", stem).lower())
+
+
+def shingle_hashes(stem: Optional[str]) -> np.ndarray:
+    tokens = normalize_stem(stem)
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)} if tokens else set()
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def minhash_signature(stem: Optional[str]) -> Optional[np.ndarray]:
+    """NUM_PERM minimum hashes of the stem's shingles, or None for an empty stem"""
+    hashes = shingle_hashes(stem)
+    if hashes.size == 0:
+        return None
+    # (a·x + b) mod p with 32-bit a, b, x stays below 2^64, so uint64 arithmetic is exact
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def estimated_jaccard(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+    return float(np.count_nonzero(signature_a == signature_b)) / NUM_PERM
+
+
+def band_keys(signature: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [
+        (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes())
+        for band in range(LSH_BANDS)
+    ]
+
+
+class NearDuplicateIndex:
+    """
+    In-memory LSH buckets over persisted stem signatures, one namespace per item type.
+
+    A lookup hashes the stem, probes LSH_BANDS buckets and verifies candidates by
+    estimated Jaccard, so checking a CSV row costs well under a millisecond
+    regardless of bank size. Workers reload when stem_signatures changes.
+    """
+
+    def __init__(self, item_type: str):
+        if item_type not in ITEM_MODELS:
+            raise ValueError(f"Unknown item type: {item_type}")
+        self.item_type = item_type
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._signature_state: Optional[Tuple[int, Any]] = None
+
+    def add(self, item_id: str, signature: np.ndarray):
+        self.signatures[item_id] = signature
+        for key in band_keys(signature):
+            self.buckets.setdefault(key, set()).add(item_id)
+
+    def find_duplicates(self, signature: Optional[np.ndarray], threshold: float = DUPLICATE_THRESHOLD) -> List[Tuple[str, float]]:
+        """Indexed items whose estimated Jaccard with the signature is at least threshold, best first"""
+        if signature is None:
+            return []
+        candidates: Set[str] = set()
+        for key in band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+
+        matches = []
+        for item_id in candidates:
+            similarity = estimated_jaccard(signature, self.signatures[item_id])
+            if similarity >= threshold:
+                matches.append((item_id, similarity))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def invalidate(self):
+        """Force a reload on the next ensure_fresh (e.g. after an upload added rows that were rolled back)"""
+        self._signature_state = None
+
+    def clusters(self, threshold: float = DUPLICATE_THRESHOLD) -> List[List[str]]:
+        """Connected components of verified near-duplicate pairs across the whole namespace"""
+        parent = {}
+
+        def find(item_id):
+            root = item_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while parent.get(item_id, item_id) != root:
+                parent[item_id], item_id = root, parent[item_id]
+            return root
+
+        for bucket in self.buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = sorted(bucket)
+            for i, item_a in enumerate(members):
+                for item_b in members[i + 1:]:
+                    if find(item_a) == find(item_b):
+                        continue
+                    if estimated_jaccard(self.signatures[item_a], self.signatures[item_b]) >= threshold:
+                        root_a = find(item_a)
+                        parent.setdefault(root_a, root_a)
+                        parent[find(item_b)] = root_a
+
+        groups: Dict[str, List[str]] = {}
+        for item_id in parent:
+            groups.setdefault(find(item_id), []).append(item_id)
+        return sorted((sorted(members) for members in groups.values() if len(members) > 1), key=len, reverse=True)
+
+    async def ensure_fresh(self, db: AsyncSession):
+        """Backfill signatures for items that have none, then reload if the table changed"""
+        model = ITEM_MODELS[self.item_type]
+        missing = await db.execute(
+            select(model.id, model.stem)
+            .where(~select(StemSignature.item_id)
+                   .where(StemSignature.item_type == self.item_type, StemSignature.item_id == model.id)
+                   .exists())
+        )
+        missing_rows = missing.all()
+        if missing_rows:
+            await record_signatures(db, self.item_type, [(item_id, minhash_signature(stem)) for item_id, stem in missing_rows])
+            logger.info(f"Computed stem signatures for {len(missing_rows)} {self.item_type} items")
+
+        state = (await db.execute(
+            select(func.count(), func.max(StemSignature.created_at))
+            .where(StemSignature.item_type == self.item_type)
+        )).one()
+        state = (state[0], state[1])
+        if state != self._signature_state:
+            await self.load(db)
+            self._signature_state = state
+
+    async def load(self, db: AsyncSession):
+        rows = await db.execute(
+            select(StemSignature.item_id, StemSignature.signature).where(StemSignature.item_type == self.item_type)
+        )
+        self.signatures = {}
+        self.buckets = {}
+        for item_id, signature in rows:
+            self.add(item_id, np.frombuffer(signature, dtype='<u4'))
+        logger.info(f"Loaded near-duplicate index for {len(self.signatures)} {self.item_type} items")
+
+
+async def record_signatures(db: AsyncSession, item_type: str, signatures: Iterable[Tuple[str, Optional[np.ndarray]]]):
+    """Persist (item_id, signature) pairs, replacing existing ones; items with empty stems are skipped. Commits."""
+    rows = [
+        {
+            'item_type': item_type,
+            'item_id': item_id,
+            'signature': signature.astype('<u4').tobytes(),
+            'created_at': datetime.utcnow()
+        }
+        for item_id, signature in signatures
+        if signature is not None
+    ]
+    if not rows:
+        return
+    await db.execute(
+        delete(StemSignature).where(
+            StemSignature.item_type == item_type,
+            StemSignature.item_id.in_([row['item_id'] for row in rows])
+        )
+    )
+    await db.execute(insert(StemSignature), rows)
+    await db.commit()
+
+
+async def build_duplicate_report(db: AsyncSession, index: NearDuplicateIndex, threshold: float = DUPLICATE_THRESHOLD) -> Dict[str, Any]:
+    """Duplicate clusters across the whole bank with stem previews"""
+    await index.ensure_fresh(db)
+    clusters = index.clusters(threshold)
+
+    model = ITEM_MODELS[index.item_type]
+    member_ids = [item_id for cluster in clusters for item_id in cluster]
+    items = {}
+    if member_ids:
+        rows = await db.execute(
+            select(model.id, model.stem, model.subcategory, model.created_at).where(model.id.in_(member_ids))
+        )
+        items = {row.id: row for row in rows}
+
+    report_clusters = []
+    for cluster in clusters:
+        anchor = index.signatures[cluster[0]]
+        report_clusters.append({
+            'size': len(cluster),
+            'items': [
+                {
+                    'id': item_id,
+                    'stem': (items[item_id].stem or '')[:200] if item_id in items else None,
+                    'subcategory': items[item_id].subcategory if item_id in items else None,
+                    'created_at': items[item_id].created_at.isoformat() if item_id in items and items[item_id].created_at else None,
+                    'similarity_to_first': round(estimated_jaccard(anchor, index.signatures[item_id]), 3)
+                }
+                for item_id in cluster
+            ]
+        })
+
+    return {
+        'item_type': index.item_type,
+        'threshold': threshold,
+        'items_indexed': len(index.signatures),
+        'cluster_count': len(report_clusters),
+        'duplicate_items': sum(cluster['size'] - 1 for cluster in report_clusters),
+        'clusters': report_clusters
+    }
+
+
+# Shared per-process indexes
+question_duplicate_index = NearDuplicateIndex('question')
+pyq_duplicate_index = NearDuplicateIndex('pyq')
@@ -9,15 +9,20 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime, date, timedelta
 from database import get_database, Plan, PlanUnit, Question, Topic, Mastery, Attempt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc, func, text
+from sqlalchemy import select, and_, or_, desc, func
 import logging
 import random
+from question_priority_ranking import (
+    PRIORITY_WEIGHTS,
+    UserPriorityPool,
+    global_priority_ranking,
+    load_attempt_overlay
+)
 from formulas import (
     calculate_frequency_score,
     calculate_importance_score_v13, 
     calculate_learning_impact_v13,
     get_mastery_category,
-    can_attempt_question,
     get_next_attempt_time
 )
 
@@ -40,12 +45,7 @@ class IntelligentPlanEngine:
         }
         
         # Priority weights for question selection
-        self.priority_weights = {
-            "importance_score": 0.4,
-            "mastery_gap": 0.3,
-            "learning_impact": 0.2,
-            "recency": 0.1
-        }
+        self.priority_weights = PRIORITY_WEIGHTS
     
     async def create_intelligent_plan(self, db: AsyncSession, user_id: str, track: str, 
                                     daily_minutes_weekday: int, daily_minutes_weekend: int,
@@ -97,8 +97,8 @@ class IntelligentPlanEngine:
             # Get user's current mastery state
             mastery_data = await self.get_user_mastery_state(db, user_id)
             
-            # Get available questions with v1.3 scores
-            questions_pool = await self.get_prioritized_questions_pool(db, user_id)
+            # Shared v1.3 priority ranking with this user's attempt overlay
+            questions_pool = await self.get_user_priority_pool(db, user_id)
             
             target_counts = self.daily_question_targets[track]
             
@@ -202,94 +202,24 @@ class IntelligentPlanEngine:
             return {"by_topic": {}, "by_category": {}, "overall_average": 0.0, 
                    "needs_focus": [], "on_track": [], "mastered": []}
     
-    async def get_prioritized_questions_pool(self, db: AsyncSession, user_id: str) -> List[Dict]:
+    async def get_user_priority_pool(self, db: AsyncSession, user_id: str) -> UserPriorityPool:
+        """
+        Global v1.3 priority ranking (re-sorted only when question scores change)
+        overlaid with the user's attempt spacing state
+        """
+        await global_priority_ranking.ensure_fresh(db)
+        overlay = await load_attempt_overlay(db, user_id)
+        return UserPriorityPool(global_priority_ranking, overlay)
+    
+    async def get_prioritized_questions_pool(self, db: AsyncSession, user_id: str,
+                                             limit: Optional[int] = None) -> List[Dict]:
         """
-        Get questions prioritized by v1.3 formulas and user mastery gaps
+        Get questions prioritized by v1.3 formulas (top `limit`, or all), with the user's attempt state
         """
         try:
-            # Get questions with their v1.3 scores and attempt history
-            questions_query = text("""
-                SELECT 
-                    q.id,
-                    q.topic_id,
-                    q.subcategory,
-                    q.difficulty_band,
-                    q.importance_score_v13,
-                    q.learning_impact_v13,
-                    q.frequency_score,
-                    t.name as topic_name,
-                    t.category,
-                    COALESCE(last_attempts.last_attempt_date, NULL) as last_attempt_date,
-                    COALESCE(attempt_stats.incorrect_count, 0) as incorrect_count,
-                    COALESCE(attempt_stats.total_attempts, 0) as total_attempts
-                FROM questions q
-                JOIN topics t ON q.topic_id = t.id
-                LEFT JOIN (
-                    SELECT 
-                        question_id,
-                        MAX(created_at) as last_attempt_date
-                    FROM attempts 
-                    WHERE user_id = :user_id
-                    GROUP BY question_id
-                ) last_attempts ON q.id = last_attempts.question_id
-                LEFT JOIN (
-                    SELECT 
-                        question_id,
-                        SUM(CASE WHEN correct = false THEN 1 ELSE 0 END) as incorrect_count,
-                        COUNT(*) as total_attempts
-                    FROM attempts 
-                    WHERE user_id = :user_id
-                    GROUP BY question_id
-                ) attempt_stats ON q.id = attempt_stats.question_id
-                WHERE q.is_active = true
-                ORDER BY 
-                    COALESCE(q.importance_score_v13, 0) DESC,
-                    COALESCE(q.learning_impact_v13, 0) DESC
-            """)
-            
-            result = await db.execute(questions_query, {"user_id": user_id})
-            questions_data = result.fetchall()
-            
-            prioritized_questions = []
-            
-            for row in questions_data:
-                # Calculate priority score based on multiple factors
-                importance_score = float(row.importance_score_v13 or 0)
-                learning_impact = float(row.learning_impact_v13 or 0)
-                frequency_score = float(row.frequency_score or 0)
-                
-                # Check attempt spacing eligibility
-                can_attempt = True
-                if row.last_attempt_date:
-                    from datetime import datetime
-                    last_attempt = datetime.fromisoformat(str(row.last_attempt_date))
-                    can_attempt = can_attempt_question(last_attempt, row.incorrect_count)
-                
-                # Calculate composite priority
-                priority_score = (
-                    importance_score * self.priority_weights["importance_score"] +
-                    learning_impact * self.priority_weights["learning_impact"] +
-                    frequency_score * self.priority_weights["recency"]
-                )
-                
-                prioritized_questions.append({
-                    "id": str(row.id),
-                    "topic_id": str(row.topic_id),
-                    "topic_name": row.topic_name,
-                    "subcategory": row.subcategory,
-                    "category": row.category,
-                    "difficulty_band": row.difficulty_band,
-                    "importance_score": importance_score,
-                    "learning_impact": learning_impact,
-                    "frequency_score": frequency_score,
-                    "priority_score": priority_score,
-                    "can_attempt": can_attempt,
-                    "last_attempt_date": row.last_attempt_date,
-                    "total_attempts": row.total_attempts
-                })
-            
-            # Sort by priority score
-            prioritized_questions.sort(key=lambda x: x["priority_score"], reverse=True)
+            pool = await self.get_user_priority_pool(db, user_id)
+            entries = pool.top(limit if limit is not None else len(pool), eligible_only=False)
+            prioritized_questions = [pool.describe(entry) for entry in entries]
             
             logger.info(f"Retrieved {len(prioritized_questions)} prioritized questions for user {user_id}")
             return prioritized_questions
@@ -298,7 +228,7 @@ class IntelligentPlanEngine:
             logger.error(f"Error getting prioritized questions pool: {e}")
             return []
     
-    async def select_daily_questions(self, db: AsyncSession, user_id: str, questions_pool: List[Dict], 
+    async def select_daily_questions(self, db: AsyncSession, user_id: str, questions_pool: UserPriorityPool, 
                                    mastery_data: Dict, daily_target: int, current_date: date) -> List[str]:
         """
         Intelligently select questions for a specific day based on mastery gaps and priorities
@@ -307,6 +237,11 @@ class IntelligentPlanEngine:
             selected_questions = []
             used_questions = set()
             
+            def take(count: int, topic_names: Optional[List[str]] = None, eligible_only: bool = True):
+                for entry in questions_pool.top(count, topic_names, eligible_only, used_questions):
+                    selected_questions.append(entry.id)
+                    used_questions.add(entry.id)
+            
             # Focus on topics that need attention first
             needs_focus_topics = mastery_data.get("needs_focus", [])
             on_track_topics = mastery_data.get("on_track", [])
@@ -317,42 +252,16 @@ class IntelligentPlanEngine:
             challenge_allocation = daily_target - focus_allocation - review_allocation  # 10% to mastered
             
             # Select questions for "needs focus" topics
-            for question in questions_pool:
-                if (len(selected_questions) < focus_allocation and 
-                    question["topic_name"] in needs_focus_topics and
-                    question["can_attempt"] and
-                    question["id"] not in used_questions):
-                    
-                    selected_questions.append(question["id"])
-                    used_questions.add(question["id"])
+            take(focus_allocation - len(selected_questions), needs_focus_topics)
             
             # Select questions for "on track" topics
-            for question in questions_pool:
-                if (len(selected_questions) < focus_allocation + review_allocation and 
-                    question["topic_name"] in on_track_topics and
-                    question["can_attempt"] and
-                    question["id"] not in used_questions):
-                    
-                    selected_questions.append(question["id"])
-                    used_questions.add(question["id"])
+            take(focus_allocation + review_allocation - len(selected_questions), on_track_topics)
             
             # Fill remaining slots with high-priority questions
-            for question in questions_pool:
-                if (len(selected_questions) < daily_target and
-                    question["can_attempt"] and
-                    question["id"] not in used_questions):
-                    
-                    selected_questions.append(question["id"])
-                    used_questions.add(question["id"])
+            take(daily_target - len(selected_questions))
             
             # If still not enough, relax spacing constraints for incorrect attempts >= 2
-            if len(selected_questions) < daily_target:
-                for question in questions_pool:
-                    if (len(selected_questions) < daily_target and
-                        question["id"] not in used_questions):
-                        
-                        selected_questions.append(question["id"])
-                        used_questions.add(question["id"])
+            take(daily_target - len(selected_questions), eligible_only=False)
             
             logger.info(f"Selected {len(selected_questions)} questions for {current_date}")
             return selected_questions
@@ -444,7 +353,7 @@ class IntelligentPlanEngine:
             future_units = future_units_result.scalars().all()
             
             # Re-prioritize questions for upcoming units
-            questions_pool = await self.get_prioritized_questions_pool(db, plan.user_id)
+            questions_pool = await self.get_user_priority_pool(db, plan.user_id)
             
             for unit in future_units:
                 # Regenerate question selection based on current mastery
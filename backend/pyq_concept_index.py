@@ -0,0 +1,190 @@
+"""
+PYQ Concept Index for CAT Preparation Platform
+Inverted index (term -> PYQ question ids) used to find conceptual PYQ matches without scanning every PYQ
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Dict, Set, Tuple, Iterable, Optional, Any
+from sqlalchemy import select, delete, func, insert
+from database import PYQQuestion, PYQPaper, PYQConceptTerm, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+SUBCATEGORY_TERM_PREFIX = "sub:"
+SUBCATEGORY_WEIGHT = 0.4
+KEYWORD_WEIGHT = 0.4
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9%]+")
+
+
+def normalize_token(token: str) -> str:
+    """Light plural folding so 'triangles' matches 'triangle' ('ss' endings are kept: 'loss')"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    """Lowercased alphanumeric tokens of a stem or keyword; '_' and punctuation separate tokens"""
+    if not text:
+        return set()
+    return {normalize_token(token) for token in _TOKEN_PATTERN.findall(str(text).lower())}
+
+
+def subcategory_term(subcategory: Optional[str]) -> Optional[str]:
+    """Subcategories match exactly (case-insensitive), so they are indexed as one whole term"""
+    if not subcategory or not subcategory.strip():
+        return None
+    return SUBCATEGORY_TERM_PREFIX + subcategory.strip().lower()[:250]
+
+
+def pyq_terms(stem: Optional[str], subcategory: Optional[str]) -> Set[str]:
+    terms = {token[:255] for token in tokenize(stem)}
+    sub_term = subcategory_term(subcategory)
+    if sub_term:
+        terms.add(sub_term)
+    return terms
+
+
+def keyword_similarity(question_pattern: Dict[str, Any], stem: Optional[str], subcategory: Optional[str]) -> float:
+    """
+    Reference similarity for one PYQ: 0.4 for a subcategory match plus 0.4 × the share of
+    pattern keywords whose tokens all occur in the stem. PYQConceptIndex.score computes the
+    same value for all PYQs at once from postings.
+    """
+    score = 0.0
+    approach_term = subcategory_term(question_pattern.get('solution_approach', ''))
+    if approach_term and approach_term == subcategory_term(subcategory):
+        score += SUBCATEGORY_WEIGHT
+
+    pattern_keywords = set(question_pattern.get('keywords', []))
+    if pattern_keywords:
+        stem_tokens = tokenize(stem)
+        keyword_matches = 0
+        for keyword in pattern_keywords:
+            keyword_tokens = tokenize(keyword)
+            if keyword_tokens and keyword_tokens <= stem_tokens:
+                keyword_matches += 1
+        score += KEYWORD_WEIGHT * (keyword_matches / len(pattern_keywords))
+
+    return min(1.0, score)
+
+
+class PYQConceptIndex:
+    """
+    In-memory postings lists loaded from pyq_concept_terms.
+
+    Rows are written when PYQs are ingested or re-classified (index_pyq_questions);
+    every worker keeps its own copy and reloads when the table signature
+    (row count, latest indexed_at) changes.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Set[str]] = {}
+        self.pyq_years: Dict[str, int] = {}
+        self._signature: Optional[Tuple[int, Any]] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.pyq_years)
+
+    async def ensure_fresh(self, db: AsyncSession):
+        """Backfill PYQs that have no postings yet, then reload if the table changed"""
+        missing = await db.execute(
+            select(PYQQuestion)
+            .where(~select(PYQConceptTerm.pyq_question_id)
+                   .where(PYQConceptTerm.pyq_question_id == PYQQuestion.id)
+                   .exists())
+        )
+        missing_questions = missing.scalars().all()
+        if missing_questions:
+            await index_pyq_questions(db, missing_questions)
+            logger.info(f"Indexed concept terms for {len(missing_questions)} PYQ questions")
+
+        signature_row = (await db.execute(
+            select(func.count(), func.max(PYQConceptTerm.indexed_at)).select_from(PYQConceptTerm)
+        )).one()
+        signature = (signature_row[0], signature_row[1])
+        if signature != self._signature:
+            await self.load(db)
+            self._signature = signature
+
+    async def load(self, db: AsyncSession):
+        rows = await db.execute(
+            select(PYQConceptTerm.term, PYQConceptTerm.pyq_question_id, PYQPaper.year)
+            .join(PYQQuestion, PYQConceptTerm.pyq_question_id == PYQQuestion.id)
+            .join(PYQPaper, PYQQuestion.paper_id == PYQPaper.id)
+        )
+        self.postings = {}
+        self.pyq_years = {}
+        for term, pyq_question_id, year in rows:
+            self.add(pyq_question_id, year, (term,))
+        logger.info(f"Loaded PYQ concept index: {len(self.pyq_years)} PYQs, {len(self.postings)} terms")
+
+    def add(self, pyq_question_id: str, year: int, terms: Iterable[str]):
+        for term in terms:
+            self.postings.setdefault(term, set()).add(pyq_question_id)
+        self.pyq_years[pyq_question_id] = year
+
+    def score(self, question_pattern: Dict[str, Any], min_year: Optional[int] = None) -> Dict[str, float]:
+        """
+        Similarity of every candidate PYQ to the pattern, from postings intersections.
+        PYQs sharing neither the subcategory nor a full keyword score 0 and are not returned.
+        """
+        scores: Dict[str, float] = {}
+
+        approach_term = subcategory_term(question_pattern.get('solution_approach', ''))
+        for pyq_question_id in self.postings.get(approach_term, ()):
+            scores[pyq_question_id] = SUBCATEGORY_WEIGHT
+
+        pattern_keywords = set(question_pattern.get('keywords', []))
+        if pattern_keywords:
+            keyword_weight = KEYWORD_WEIGHT / len(pattern_keywords)
+            for keyword in pattern_keywords:
+                for pyq_question_id in self._match_all(tokenize(keyword)):
+                    scores[pyq_question_id] = scores.get(pyq_question_id, 0.0) + keyword_weight
+
+        if min_year is not None:
+            scores = {
+                pyq_question_id: score for pyq_question_id, score in scores.items()
+                if self.pyq_years.get(pyq_question_id, 0) >= min_year
+            }
+        return {pyq_question_id: min(1.0, score) for pyq_question_id, score in scores.items()}
+
+    def _match_all(self, tokens: Set[str]) -> Set[str]:
+        """PYQs containing every token: intersect postings smallest-first"""
+        if not tokens:
+            return set()
+        lists = sorted((self.postings.get(token, set()) for token in tokens), key=len)
+        matched = set(lists[0])
+        for postings in lists[1:]:
+            if not matched:
+                break
+            matched &= postings
+        return matched
+
+
+async def index_pyq_questions(db: AsyncSession, pyq_questions: Iterable[PYQQuestion]):
+    """(Re)write postings for PYQs after ingest or re-classification; commits"""
+    pyq_questions = [pyq for pyq in pyq_questions if pyq.id]
+    if not pyq_questions:
+        return
+
+    pyq_ids = [pyq.id for pyq in pyq_questions]
+    await db.execute(delete(PYQConceptTerm).where(PYQConceptTerm.pyq_question_id.in_(pyq_ids)))
+
+    now = datetime.utcnow()
+    rows = [
+        {'pyq_question_id': pyq.id, 'term': term, 'indexed_at': now}
+        for pyq in pyq_questions
+        for term in pyq_terms(pyq.stem, pyq.subcategory)
+    ]
+    if rows:
+        await db.execute(insert(PYQConceptTerm), rows)
+    await db.commit()
+
+
+# Shared per-process index
+pyq_concept_index = PYQConceptIndex()
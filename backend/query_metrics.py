@@ -0,0 +1,178 @@
+"""
+Per-Request SQL Metrics for CAT Preparation Platform
+Counts queries and database time per request via SQLAlchemy cursor events, reports them in
+Server-Timing headers, logs requests over budget or with repeated (N+1) statements, and lets
+tests pin query budgets for endpoints
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, List, Tuple, Iterator
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_METRICS_ENABLED = os.getenv("QUERY_METRICS_ENABLED", "true").lower() == "true"
+QUERY_BUDGET_COUNT = int(os.getenv("QUERY_BUDGET_COUNT", "50"))
+QUERY_BUDGET_MS = float(os.getenv("QUERY_BUDGET_MS", "500"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "10"))
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse whitespace and IN-lists so repeats of one statement shape count together"""
+    return _IN_LIST.sub("(…)", _WHITESPACE.sub(" ", statement).strip())[:500]
+
+
+class QueryStats:
+    """Queries seen during one request (or one assert_query_budget block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.statements: Counter = Counter()
+
+    @property
+    def total_ms(self) -> float:
+        return self.total_seconds * 1000
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.statements[normalize_statement(statement)] += 1
+
+    def top_repeated(self) -> Optional[Tuple[str, int]]:
+        if not self.statements:
+            return None
+        return self.statements.most_common(1)[0]
+
+    def summary(self) -> str:
+        top = self.top_repeated()
+        repeated = f", top statement ×{top[1]}: {top[0][:200]}" if top and top[1] > 1 else ""
+        return f"{self.count} queries in {self.total_ms:.1f}ms{repeated}"
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+
+# Active assert_query_budget captures; they see queries from every thread (TestClient runs the app in another thread)
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+_installed_engines = set()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_times")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.record(statement, elapsed)
+
+
+def install_query_listeners(engine: Engine):
+    """Attach the cursor timing listeners to an engine (idempotent)"""
+    if id(engine) in _installed_engines:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _installed_engines.add(id(engine))
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+class QueryMetricsMiddleware:
+    """
+    ASGI middleware: collects QueryStats for each HTTP request, adds a Server-Timing
+    header (db;dur=<ms>;desc="<n> queries") and logs requests over budget or with a
+    statement repeated N_PLUS_ONE_THRESHOLD+ times
+    """
+
+    def __init__(self, app, max_queries: int = QUERY_BUDGET_COUNT, max_ms: float = QUERY_BUDGET_MS,
+                 n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.max_queries = max_queries
+        self.max_ms = max_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={stats.total_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            self._log_if_over_budget(scope, stats)
+
+    def _log_if_over_budget(self, scope, stats: QueryStats):
+        endpoint = f"{scope.get('method', '')} {scope.get('path', '')}"
+        if stats.count > self.max_queries or stats.total_ms > self.max_ms:
+            logger.warning(f"🐢 Query budget exceeded for {endpoint}: {stats.summary()} "
+                           f"(budget {self.max_queries} queries / {self.max_ms:.0f}ms)")
+        top = stats.top_repeated()
+        if top and top[1] >= self.n_plus_one_threshold:
+            logger.warning(f"🔁 Possible N+1 in {endpoint}: statement repeated {top[1]}× — {top[0][:200]}")
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Collect every query run (on any thread) while the block executes"""
+    stats = QueryStats()
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_ms: Optional[float] = None) -> Iterator[QueryStats]:
+    """
+    Test helper: fail if the block runs more than max_queries statements (or takes more than max_ms in the database).
+
+        with assert_query_budget(5):
+            client.get("/api/dashboard/mastery", headers=auth_headers)
+    """
+    with capture_queries() as stats:
+        yield stats
+
+    if stats.count > max_queries:
+        raise AssertionError(f"Query budget exceeded: {stats.summary()} (budget {max_queries})")
+    if max_ms is not None and stats.total_ms > max_ms:
+        raise AssertionError(f"Database time budget exceeded: {stats.summary()} (budget {max_ms:.0f}ms)")
@@ -0,0 +1,212 @@
+"""
+Question Payload Rendering for CAT Preparation Platform
+orjson-based default response class, plus per-question public payloads (stem, options, cleaned
+solutions) pre-rendered once into JSON fragments and spliced into session responses
+"""
+
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Any, Dict, Optional, Tuple
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from database import Question
+
+logger = logging.getLogger(__name__)
+
+QUESTION_PAYLOAD_CACHE_SIZE = 20000
+
+_HORIZONTAL_WHITESPACE = re.compile(r'[ \t]+')
+_EXCESS_BLANK_LINES = re.compile(r'\n\s*\n\s*\n+')
+
+
+def clean_solution_text(text: str) -> str:
+    """Clean solution text while preserving line breaks and formatting for proper display"""
+    if not text:
+        return text
+
+    # Preserve line breaks and proper formatting - DO NOT COLLAPSE NEWLINES
+    # Only clean up excessive whitespace while preserving structure
+
+    # Remove LaTeX dollar signs and other LaTeX artifacts
+    cleaned = text.replace('$', '')  # Remove all dollar signs
+    cleaned = cleaned.replace('\\(', '').replace('\\)', '')  # Remove LaTeX delimiters
+    cleaned = cleaned.replace('\\[', '').replace('\\]', '')  # Remove LaTeX display delimiters
+
+    # Remove excessive spaces (but preserve single spaces and line breaks)
+    cleaned = _HORIZONTAL_WHITESPACE.sub(' ', cleaned)  # Only collapse horizontal whitespace
+
+    # Preserve double line breaks for paragraph separation
+    cleaned = _EXCESS_BLANK_LINES.sub('\n\n', cleaned)  # Max 2 consecutive newlines
+
+    # Remove trailing whitespace from each line but preserve line breaks
+    cleaned = '\n'.join(line.rstrip() for line in cleaned.split('\n'))
+
+    # Remove leading/trailing whitespace from entire text
+    return cleaned.strip()
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not serialize natively; anything unusual goes through FastAPI's encoder"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson, with Decimal / set support and splicing of orjson.Fragment values"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value else None
+
+
+# Fields each payload is rendered from; a cached fragment is reused only while these are unchanged
+_SOURCE_FIELDS = (
+    "stem", "answer", "solution_approach", "detailed_solution", "subcategory", "type_of_question",
+    "difficulty_band", "difficulty_score", "pyq_frequency_score", "has_image", "image_url",
+    "image_alt_text", "mcq_options", "created_at"
+)
+
+
+def _source(question: Question) -> Tuple:
+    return tuple(getattr(question, field) for field in _SOURCE_FIELDS)
+
+
+def _session_item(question: Question) -> Dict[str, Any]:
+    """Question as listed in the /sessions/start response"""
+    return {
+        "id": str(question.id),
+        "stem": question.stem,
+        "answer": question.answer,
+        "solution_approach": question.solution_approach,
+        "detailed_solution": question.detailed_solution,
+        "subcategory": question.subcategory,
+        "type_of_question": question.type_of_question,
+        "difficulty_band": question.difficulty_band,
+        "difficulty_score": _optional_float(question.difficulty_score),
+        "pyq_frequency_score": _optional_float(question.pyq_frequency_score),
+        "has_image": question.has_image,
+        "image_url": question.image_url,
+        "image_alt_text": question.image_alt_text,
+        "created_at": question.created_at.isoformat()
+    }
+
+
+def _cleaned_fields(question: Question) -> Dict[str, Any]:
+    return {
+        "answer": clean_solution_text(question.answer),
+        "solution_approach": clean_solution_text(question.solution_approach),
+        "detailed_solution": clean_solution_text(question.detailed_solution)
+    }
+
+
+def _stored_options(question: Question) -> Optional[Dict[str, Any]]:
+    if not question.mcq_options:
+        return None
+    try:
+        return json.loads(question.mcq_options) or None
+    except Exception as json_error:
+        logger.warning(f"Failed to parse stored MCQ options for question {question.id}: {json_error}")
+        return None
+
+
+def build_next_question_payload(question: Question, options: Dict[str, Any],
+                                cleaned: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Question as served by next-question (options, cleaned solutions with fallbacks)"""
+    cleaned = cleaned or _cleaned_fields(question)
+    return {
+        "id": str(question.id),
+        "stem": question.stem,
+        "subcategory": question.subcategory,
+        "difficulty_band": question.difficulty_band,
+        "type_of_question": question.type_of_question,
+        "has_image": question.has_image,
+        "image_url": question.image_url,
+        "image_alt_text": question.image_alt_text,
+        "options": options,
+        # Include solutions (with cleaned formatting and fallback when enrichment is missing)
+        "answer": cleaned["answer"] or options.get("A", "Answer not available"),
+        "solution_approach": cleaned["solution_approach"] or "Solution approach will be provided after enrichment",
+        "detailed_solution": cleaned["detailed_solution"] or "Detailed solution will be provided after enrichment"
+    }
+
+
+class _RenderedQuestion:
+    __slots__ = ("source", "cleaned", "options", "session_item", "next_question")
+
+    def __init__(self, question: Question):
+        self.source = _source(question)
+        self.cleaned = _cleaned_fields(question)
+        self.options = _stored_options(question)
+        self.session_item = orjson.Fragment(dumps(_session_item(question)))
+        self.next_question = (
+            orjson.Fragment(dumps(build_next_question_payload(question, self.options, self.cleaned)))
+            if self.options else None
+        )
+
+
+class QuestionPayloadCache:
+    """
+    Per-process LRU of rendered question payloads. Entries are checked against the question's
+    current field values on every lookup, so edits and re-enrichment rebuild them automatically.
+    """
+
+    def __init__(self, max_size: int = QUESTION_PAYLOAD_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, _RenderedQuestion]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _rendered(self, question: Question) -> _RenderedQuestion:
+        question_id = str(question.id)
+        with self._lock:
+            entry = self._entries.get(question_id)
+            if entry is not None and entry.source == _source(question):
+                self._entries.move_to_end(question_id)
+                return entry
+
+        entry = _RenderedQuestion(question)
+        with self._lock:
+            self._entries[question_id] = entry
+            self._entries.move_to_end(question_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def session_item(self, question: Question) -> orjson.Fragment:
+        return self._rendered(question).session_item
+
+    def next_question(self, question: Question) -> Optional[orjson.Fragment]:
+        """Pre-rendered next-question payload, or None when options are not stored (generated per request)"""
+        return self._rendered(question).next_question
+
+    def cleaned(self, question: Question) -> Dict[str, Any]:
+        """Cleaned answer / solution_approach / detailed_solution"""
+        return self._rendered(question).cleaned
+
+    def invalidate(self, question_id: Optional[str] = None):
+        with self._lock:
+            if question_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(question_id), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Shared per-process cache
+question_payload_cache = QuestionPayloadCache()
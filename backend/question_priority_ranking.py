@@ -0,0 +1,239 @@
+"""
+Global Question Priority Ranking for CAT Preparation Platform
+User-independent v1.3 priority order of the active question bank, shared by all plan generation,
+with a per-user overlay of attempt spacing eligibility
+"""
+
+import heapq
+import logging
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional, Tuple, Any, Iterable, Iterator, Set
+from sqlalchemy import select, text, func, case
+from database import Attempt, ReviewSchedule, AsyncSession
+from formulas import can_attempt_question
+
+logger = logging.getLogger(__name__)
+
+# Priority weights for question selection (mastery_gap is applied through topic focus, not per question)
+PRIORITY_WEIGHTS = {
+    "importance_score": 0.4,
+    "mastery_gap": 0.3,
+    "learning_impact": 0.2,
+    "recency": 0.1
+}
+
+RankedQuestion = namedtuple("RankedQuestion", [
+    "rank", "id", "topic_id", "topic_name", "subcategory", "category", "difficulty_band",
+    "importance_score", "learning_impact", "frequency_score", "priority_score"
+])
+
+# (last_attempt_at, incorrect_count, total_attempts) per attempted question
+AttemptOverlay = Dict[str, Tuple[datetime, int, int]]
+
+_RANKING_QUERY = text("""
+    SELECT
+        q.id,
+        q.topic_id,
+        q.subcategory,
+        q.difficulty_band,
+        q.importance_score_v13,
+        q.learning_impact_v13,
+        q.frequency_score,
+        t.name as topic_name,
+        t.category
+    FROM questions q
+    JOIN topics t ON q.topic_id = t.id
+    WHERE q.is_active = true
+""")
+
+# Cheap aggregate that changes whenever the active bank or any ranking input changes
+_SIGNATURE_QUERY = text("""
+    SELECT
+        COUNT(*),
+        SUM(COALESCE(importance_score_v13, 0)),
+        SUM(COALESCE(learning_impact_v13, 0)),
+        SUM(COALESCE(frequency_score, 0)),
+        MAX(frequency_last_updated)
+    FROM questions
+    WHERE is_active = true
+""")
+
+
+def priority_score(importance_score: float, learning_impact: float, frequency_score: float) -> float:
+    return (
+        importance_score * PRIORITY_WEIGHTS["importance_score"] +
+        learning_impact * PRIORITY_WEIGHTS["learning_impact"] +
+        frequency_score * PRIORITY_WEIGHTS["recency"]
+    )
+
+
+class GlobalPriorityRanking:
+    """
+    Active questions sorted once by priority score, plus per-topic lists in the same order.
+
+    Priority only depends on question scores, so every worker keeps one ranking and
+    re-sorts only when the score signature changes; plan generation never sorts the bank.
+    """
+
+    def __init__(self):
+        self.entries: List[RankedQuestion] = []
+        self.by_topic: Dict[str, List[RankedQuestion]] = {}
+        self._signature: Optional[Tuple[Any, ...]] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.entries)
+
+    def invalidate(self):
+        """Force a reload on the next ensure_fresh"""
+        self._signature = None
+
+    async def ensure_fresh(self, db: AsyncSession):
+        signature = tuple((await db.execute(_SIGNATURE_QUERY)).one())
+        if signature != self._signature:
+            await self.load(db)
+            self._signature = signature
+
+    async def load(self, db: AsyncSession):
+        rows = (await db.execute(_RANKING_QUERY)).fetchall()
+        self.build(
+            (row.id, row.topic_id, row.topic_name, row.subcategory, row.category, row.difficulty_band,
+             float(row.importance_score_v13 or 0), float(row.learning_impact_v13 or 0), float(row.frequency_score or 0))
+            for row in rows
+        )
+        logger.info(f"Loaded global priority ranking: {len(self.entries)} questions, {len(self.by_topic)} topics")
+
+    def build(self, rows: Iterable[Tuple]):
+        """Rank (id, topic_id, topic_name, subcategory, category, difficulty_band, importance, learning_impact, frequency) rows"""
+        scored = [
+            (priority_score(importance, impact, frequency), importance, impact, str(question_id),
+             str(topic_id), topic_name, subcategory, category, difficulty_band, frequency)
+            for question_id, topic_id, topic_name, subcategory, category, difficulty_band, importance, impact, frequency in rows
+        ]
+        # Priority first; ties keep the previous importance → learning impact order
+        scored.sort(key=lambda item: (-item[0], -item[1], -item[2], item[3]))
+
+        self.entries = [
+            RankedQuestion(
+                rank=rank, id=question_id, topic_id=topic_id, topic_name=topic_name, subcategory=subcategory,
+                category=category, difficulty_band=difficulty_band, importance_score=importance,
+                learning_impact=impact, frequency_score=frequency, priority_score=score
+            )
+            for rank, (score, importance, impact, question_id, topic_id, topic_name, subcategory, category,
+                       difficulty_band, frequency) in enumerate(scored)
+        ]
+        self.by_topic = {}
+        for entry in self.entries:
+            self.by_topic.setdefault(entry.topic_name, []).append(entry)
+
+    def iter_ranked(self, topic_names: Optional[Iterable[str]] = None) -> Iterator[RankedQuestion]:
+        """Questions in global priority order, optionally only for some topics (k-way heap merge of their lists)"""
+        if topic_names is None:
+            return iter(self.entries)
+        lists = [self.by_topic[name] for name in set(topic_names) if name in self.by_topic]
+        return heapq.merge(*lists, key=lambda entry: entry.rank)
+
+
+async def load_attempt_overlay(db: AsyncSession, user_id: str) -> AttemptOverlay:
+    """
+    Per-user attempt counts and last attempt time from the review schedule (one index range scan).
+    When the schedule does not cover all of the user's live attempts (history not backfilled yet, or
+    a missed update), their attempts are aggregated too and merged in per question.
+    """
+    schedule_rows = (await db.execute(
+        select(
+            ReviewSchedule.question_id,
+            ReviewSchedule.last_attempt_at,
+            ReviewSchedule.incorrect_count,
+            ReviewSchedule.total_attempts,
+            ReviewSchedule.archived_attempts
+        ).where(ReviewSchedule.user_id == user_id)
+    )).all()
+    overlay = {
+        str(question_id): (last_attempt_at, incorrect_count or 0, total_attempts or 0)
+        for question_id, last_attempt_at, incorrect_count, total_attempts, _ in schedule_rows
+    }
+    
+    scheduled_live_attempts = sum((row.total_attempts or 0) - (row.archived_attempts or 0) for row in schedule_rows)
+    live_attempts = (await db.execute(
+        select(func.count(Attempt.id)).where(Attempt.user_id == user_id)
+    )).scalar() or 0
+    if scheduled_live_attempts >= live_attempts:
+        return overlay
+    
+    attempt_rows = await db.execute(
+        select(
+            Attempt.question_id,
+            func.max(Attempt.created_at),
+            func.sum(case((Attempt.correct == False, 1), else_=0)),
+            func.count(Attempt.id)
+        )
+        .where(Attempt.user_id == user_id)
+        .group_by(Attempt.question_id)
+    )
+    for question_id, last_attempt_at, incorrect_count, total_attempts in attempt_rows:
+        question_id = str(question_id)
+        scheduled = overlay.get(question_id)
+        if scheduled:
+            overlay[question_id] = (
+                max(scheduled[0], last_attempt_at),
+                max(scheduled[1], incorrect_count or 0),
+                max(scheduled[2], total_attempts or 0)
+            )
+        else:
+            overlay[question_id] = (last_attempt_at, incorrect_count or 0, total_attempts or 0)
+    return overlay
+
+
+class UserPriorityPool:
+    """The shared ranking seen through one user's attempt overlay"""
+
+    def __init__(self, ranking: GlobalPriorityRanking, overlay: AttemptOverlay):
+        self.ranking = ranking
+        self.overlay = overlay
+        self._eligibility: Dict[str, bool] = {}
+
+    def __len__(self) -> int:
+        return self.ranking.size
+
+    def can_attempt(self, question_id: str) -> bool:
+        """Attempt spacing eligibility, evaluated lazily and only for questions actually considered"""
+        if question_id not in self._eligibility:
+            attempt = self.overlay.get(question_id)
+            self._eligibility[question_id] = attempt is None or can_attempt_question(attempt[0], attempt[1])
+        return self._eligibility[question_id]
+
+    def top(self, k: int, topic_names: Optional[Iterable[str]] = None, eligible_only: bool = True,
+            exclude: Optional[Set[str]] = None) -> List[RankedQuestion]:
+        """First k questions in priority order that pass the filters; stops as soon as k are found"""
+        if k <= 0:
+            return []
+        candidates = (
+            entry for entry in self.ranking.iter_ranked(topic_names)
+            if (not exclude or entry.id not in exclude) and (not eligible_only or self.can_attempt(entry.id))
+        )
+        return list(islice(candidates, k))
+
+    def describe(self, entry: RankedQuestion) -> Dict[str, Any]:
+        attempt = self.overlay.get(entry.id)
+        return {
+            "id": entry.id,
+            "topic_id": entry.topic_id,
+            "topic_name": entry.topic_name,
+            "subcategory": entry.subcategory,
+            "category": entry.category,
+            "difficulty_band": entry.difficulty_band,
+            "importance_score": entry.importance_score,
+            "learning_impact": entry.learning_impact,
+            "frequency_score": entry.frequency_score,
+            "priority_score": entry.priority_score,
+            "can_attempt": self.can_attempt(entry.id),
+            "last_attempt_date": attempt[0] if attempt else None,
+            "total_attempts": attempt[2] if attempt else 0
+        }
+
+
+# Shared per-process ranking
+global_priority_ranking = GlobalPriorityRanking()
@@ -0,0 +1,178 @@
+"""
+On-Demand Request Profiler for CAT Preparation Platform
+Samples a fraction of requests to selected routes with pyinstrument (optional dependency) and stores
+speedscope (flamegraph) profiles on disk; admins can force-profile one request with the
+X-Profile-Request header and list / download profiles through the admin API
+"""
+
+import os
+import json
+import asyncio
+import time
+import uuid
+import random
+import logging
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from auth_service import AuthService
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROUTES = [
+    prefix.strip() for prefix in
+    os.getenv("PROFILE_ROUTES", "/api/sessions/start,/api/dashboard").split(",")
+    if prefix.strip()
+]
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(tempfile.gettempdir()) / "cat_prep_profiles")))  # outside the source tree
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+FORCE_PROFILE_HEADER = b"x-profile-request"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+    PYINSTRUMENT_AVAILABLE = True
+except ImportError:
+    Profiler = None
+    SpeedscopeRenderer = None
+    PYINSTRUMENT_AVAILABLE = False
+
+
+def _modified_time(path: Path) -> float:
+    """mtime for sorting; profiles are saved and pruned from several threads, so a file may be gone already"""
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class ProfileStore:
+    """Profiles as <id>.speedscope.json with a <id>.meta.json sidecar, pruned to the newest max_files"""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def profile_path(self, profile_id: str) -> Optional[Path]:
+        # Profile ids are generated hex strings; anything else never maps to a file
+        if not profile_id or not all(c in "0123456789abcdef" for c in profile_id):
+            return None
+        path = self.directory / f"{profile_id}.speedscope.json"
+        return path if path.exists() else None
+
+    def save(self, profile_id: str, content: str, meta: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{profile_id}.speedscope.json").write_text(content)
+        (self.directory / f"{profile_id}.meta.json").write_text(json.dumps(meta))
+        self.prune()
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        profiles = []
+        for meta_path in sorted(self.directory.glob("*.meta.json"), key=_modified_time, reverse=True)[:limit]:
+            try:
+                profiles.append(json.loads(meta_path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def prune(self):
+        meta_paths = sorted(self.directory.glob("*.meta.json"), key=_modified_time, reverse=True)
+        for meta_path in meta_paths[self.max_files:]:
+            profile_id = meta_path.name[:-len(".meta.json")]
+            for path in (meta_path, self.directory / f"{profile_id}.speedscope.json"):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+def _is_admin_token(headers: Dict[bytes, bytes]) -> bool:
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        return bool(AuthService().verify_token(authorization[7:]).get("is_admin"))
+    except Exception:
+        return False
+
+
+class RequestProfilerMiddleware:
+    """
+    ASGI middleware: profiles a PROFILE_SAMPLE_RATE fraction of requests whose path starts with one of
+    PROFILE_ROUTES, plus any request sent by an admin with "X-Profile-Request: 1". Profiled responses
+    carry an X-Profile-Id header. A no-op when pyinstrument is not installed.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, routes: Optional[List[str]] = None,
+                 store: Optional[ProfileStore] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.routes = PROFILE_ROUTES if routes is None else routes
+        self.store = store or profile_store
+        if PROFILING_ENABLED and not PYINSTRUMENT_AVAILABLE:
+            logger.warning("pyinstrument not installed - request profiling disabled")
+
+    def _should_profile(self, scope) -> Optional[str]:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(FORCE_PROFILE_HEADER, b"").strip() in (b"1", b"true") and _is_admin_token(headers):
+            return "forced"
+        if self.sample_rate > 0 and any(scope.get("path", "").startswith(prefix) for prefix in self.routes):
+            if random.random() < self.sample_rate:
+                return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED or not PYINSTRUMENT_AVAILABLE:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._should_profile(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_holder = {"status": 500}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            # Rendering, the file writes and pruning are blocking work; keep them off the event loop
+            await asyncio.to_thread(self._save, profiler, profile_id, scope, reason, status_holder["status"], duration_ms)
+
+    def _save(self, profiler, profile_id: str, scope, reason: str, status: int, duration_ms: float):
+        try:
+            self.store.save(profile_id, profiler.output(renderer=SpeedscopeRenderer()), {
+                "id": profile_id,
+                "method": scope.get("method", ""),
+                "path": scope.get("path", ""),
+                "status": status,
+                "reason": reason,
+                "duration_ms": round(duration_ms, 1),
+                "created_at": datetime.utcnow().isoformat(),
+                "format": "speedscope"
+            })
+            logger.info(f"🔬 Profiled {scope.get('method', '')} {scope.get('path', '')} ({reason}, {duration_ms:.0f}ms): {profile_id}")
+        except Exception as e:
+            logger.error(f"Error saving request profile: {e}")
+
+
+# Shared per-process store
+profile_store = ProfileStore()
@@ -0,0 +1,143 @@
+"""
+Scheduler Leader Election for CAT Preparation Platform
+Ensures scheduled background jobs run once per cluster when several workers start the scheduler
+"""
+
+import os
+import socket
+import logging
+import zlib
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import text
+from database import engine, is_postgres
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_LOCK_NAME = os.getenv("SCHEDULER_LOCK_NAME", "cat_prep_scheduler_leader")
+SCHEDULER_LOCK_FILE = Path(os.getenv("SCHEDULER_LOCK_FILE", "/tmp/cat_prep_scheduler.lock"))
+LEADER_POLL_SECONDS = int(os.getenv("SCHEDULER_LEADER_POLL_SECONDS", "30"))
+
+
+def get_worker_id() -> str:
+    """Identifier recorded in job history: hostname:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SchedulerLeaderLock:
+    """
+    Cluster-wide leader lock for the job scheduler.
+
+    On PostgreSQL this is a session-level advisory lock held on a dedicated
+    connection; elsewhere (SQLite, single host) it is an exclusive flock on a
+    lock file. Both are released by the server/OS when the holder dies, so a
+    standby polling try_acquire() takes over without any stale-lock cleanup.
+    """
+
+    def __init__(self, lock_name: str = SCHEDULER_LOCK_NAME, lock_file: Path = SCHEDULER_LOCK_FILE):
+        self.lock_name = lock_name
+        self.lock_file = Path(lock_file)
+        # Advisory lock keys are bigint; crc32 gives a stable key for the lock name
+        self.lock_key = zlib.crc32(lock_name.encode("utf-8"))
+        self.backend = 'postgres_advisory' if is_postgres else 'lock_file'
+        self._connection = None
+        self._file_handle = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._connection is not None or self._file_handle is not None
+
+    def try_acquire(self) -> bool:
+        """Acquire the lock without blocking; returns whether this worker is (still) the leader"""
+        if self.is_leader:
+            if self._still_held():
+                return True
+            logger.warning("⚠️ Scheduler leader lock lost, stepping down")
+            self.release()
+
+        try:
+            if self.backend == 'postgres_advisory':
+                return self._acquire_advisory_lock()
+            return self._acquire_lock_file()
+        except Exception as e:
+            logger.error(f"Error acquiring scheduler leader lock: {e}")
+            self.release()
+            return False
+
+    def release(self):
+        """Release the lock if held; safe to call repeatedly"""
+        if self._connection is not None:
+            try:
+                self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            except Exception as e:
+                logger.warning(f"Error releasing advisory lock (connection close releases it): {e}")
+            finally:
+                try:
+                    self._connection.close()
+                except Exception:
+                    pass
+                self._connection = None
+
+        if self._file_handle is not None:
+            try:
+                import fcntl
+                fcntl.flock(self._file_handle.fileno(), fcntl.LOCK_UN)
+            except Exception as e:
+                logger.warning(f"Error releasing scheduler lock file: {e}")
+            finally:
+                self._file_handle.close()
+                self._file_handle = None
+
+    def _acquire_advisory_lock(self) -> bool:
+        connection = engine.connect()
+        # Autocommit so the long-lived lock connection never sits idle in a transaction
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+        ).scalar()
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        logger.info(f"👑 Acquired scheduler leader lock (advisory key {self.lock_key}) as {get_worker_id()}")
+        return True
+
+    def _acquire_lock_file(self) -> bool:
+        import fcntl
+
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.lock_file, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(get_worker_id())
+        handle.flush()
+        self._file_handle = handle
+        logger.info(f"👑 Acquired scheduler leader lock ({self.lock_file}) as {get_worker_id()}")
+        return True
+
+    def _still_held(self) -> bool:
+        """An advisory lock is lost with its connection; a held flock cannot be lost"""
+        if self._connection is None:
+            return True
+        try:
+            self._connection.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+
+def describe_lock(lock: Optional[SchedulerLeaderLock]) -> dict:
+    """Leader status for admin/status endpoints"""
+    if lock is None:
+        return {'scheduler_running': False}
+    return {
+        'scheduler_running': True,
+        'worker_id': get_worker_id(),
+        'is_leader': lock.is_leader,
+        'backend': lock.backend
+    }
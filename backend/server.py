@@ -3,12 +3,13 @@ CAT Preparation Platform Server v2.0 - Complete Rebuild
 Comprehensive production-ready server with all advanced features
 """
 
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, desc, asc, func, case, text
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta, date
@@ -20,26 +21,27 @@ import logging
 import json
 import asyncio
 import random
-import re
 import shutil
 import mimetypes
-from docx import Document
 import io
-from google_drive_utils import GoogleDriveImageFetcher
 
-from adaptive_session_logic import AdaptiveSessionLogic
-from enhanced_question_processor import EnhancedQuestionProcessor
 from database import (
     get_async_compatible_db, get_database, init_database, User, Question, Topic, Attempt, Mastery, Plan, PlanUnit, Session,
-    PYQIngestion, PYQPaper, PYQQuestion, QuestionOption, AsyncSession
+    PYQIngestion, PYQPaper, PYQQuestion, QuestionOption, AttemptDailySummary, AsyncSession, engine
 )
+from data_retention import get_archived_attempt_totals
 from auth_service import AuthService, UserCreate, UserLogin, TokenResponse, require_auth, require_admin, ADMIN_EMAIL
-from llm_enrichment import LLMEnrichmentPipeline
-from gmail_service import gmail_service
-from mcq_generator import MCQGenerator
-from study_planner import StudyPlanner
-from mastery_tracker import MasteryTracker
-from background_jobs import start_background_processing, stop_background_processing
+from query_metrics import QueryMetricsMiddleware, install_query_listeners
+from request_profiler import RequestProfilerMiddleware, profile_store, PYINSTRUMENT_AVAILABLE, PROFILE_SAMPLE_RATE, PROFILE_ROUTES
+from metrics import (
+    HTTPMetricsMiddleware, METRICS_TOKEN, track_llm_call, track_enrichment_task,
+    register_database_pool, render_metrics
+)
+from prometheus_client import CONTENT_TYPE_LATEST
+from question_payloads import FastJSONResponse, question_payload_cache, build_next_question_payload
+from http_caching import CompressionMiddleware, catalog_conditional_get, user_conditional_get
+from taxonomy_registry import taxonomy_registry
+from session_progress import create_session_questions, get_session_progress, record_session_answer
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -48,9 +50,25 @@ load_dotenv(ROOT_DIR / '.env')
 DATABASE_URL = os.getenv("DATABASE_URL")
 EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
 
-# Initialize enrichment services
-llm_pipeline = LLMEnrichmentPipeline(EMERGENT_LLM_KEY)
-auto_enrichment_service = None  # Will be initialized when needed
+# Services are constructed on first use: the LLM clients, Google API client and scheduler stack
+# are slow to import, and most workers / scripts importing this module never touch some of them
+llm_pipeline = None
+auto_enrichment_service = None
+mcq_generator = None
+enhanced_question_processor = None
+study_planner = None
+mastery_tracker = None
+spaced_repetition_engine = None
+adaptive_session_logic = None
+adaptive_engine = None
+
+def get_llm_pipeline():
+    """Get or create the LLM enrichment pipeline"""
+    global llm_pipeline
+    if llm_pipeline is None:
+        from llm_enrichment import LLMEnrichmentPipeline
+        llm_pipeline = LLMEnrichmentPipeline(EMERGENT_LLM_KEY)
+    return llm_pipeline
 
 def get_auto_enrichment_service():
     """Get or create the automatic enrichment service"""
@@ -59,16 +77,69 @@ def get_auto_enrichment_service():
         from llm_enrichment import LLMEnrichmentService
         auto_enrichment_service = LLMEnrichmentService()
     return auto_enrichment_service
-mcq_generator = MCQGenerator(EMERGENT_LLM_KEY)
-enhanced_question_processor = EnhancedQuestionProcessor(llm_pipeline)  # PHASE 1: Enhanced processing
-study_planner = StudyPlanner()
-mastery_tracker = MasteryTracker()
-adaptive_session_logic = AdaptiveSessionLogic()  # Initialize sophisticated session logic
+
+def get_mcq_generator():
+    """Get or create the MCQ option generator"""
+    global mcq_generator
+    if mcq_generator is None:
+        from mcq_generator import MCQGenerator
+        mcq_generator = MCQGenerator(EMERGENT_LLM_KEY)
+    return mcq_generator
+
+def get_enhanced_question_processor():
+    """Get or create the enhanced question processor (PHASE 1: Enhanced processing)"""
+    global enhanced_question_processor
+    if enhanced_question_processor is None:
+        from enhanced_question_processor import EnhancedQuestionProcessor
+        enhanced_question_processor = EnhancedQuestionProcessor(get_llm_pipeline())
+    return enhanced_question_processor
+
+def get_study_planner():
+    global study_planner
+    if study_planner is None:
+        from study_planner import StudyPlanner
+        study_planner = StudyPlanner()
+    return study_planner
+
+def get_mastery_tracker():
+    global mastery_tracker
+    if mastery_tracker is None:
+        from mastery_tracker import MasteryTracker
+        mastery_tracker = MasteryTracker()
+    return mastery_tracker
+
+def get_spaced_repetition_engine():
+    global spaced_repetition_engine
+    if spaced_repetition_engine is None:
+        from spaced_repetition_engine import SpacedRepetitionEngine
+        spaced_repetition_engine = SpacedRepetitionEngine()
+    return spaced_repetition_engine
+
+def get_adaptive_session_logic():
+    """Get or create the sophisticated 12-question session logic"""
+    global adaptive_session_logic
+    if adaptive_session_logic is None:
+        from adaptive_session_logic import AdaptiveSessionLogic
+        adaptive_session_logic = AdaptiveSessionLogic()
+    return adaptive_session_logic
+
+def get_adaptive_engine():
+    global adaptive_engine
+    if adaptive_engine is None:
+        from adaptive_session_engine import AdaptiveSessionEngine
+        adaptive_engine = AdaptiveSessionEngine()
+    return adaptive_engine
+
+def get_gmail_service():
+    """Gmail API service singleton (google-api-python-client is imported on first use)"""
+    from gmail_service import gmail_service
+    return gmail_service
 
 app = FastAPI(
     title="CAT Preparation Platform v2.0",
     version="2.0.0", 
-    description="Complete production-ready CAT preparation platform with advanced AI features"
+    description="Complete production-ready CAT preparation platform with advanced AI features",
+    default_response_class=FastJSONResponse
 )
 
 # Image upload configuration
@@ -145,37 +216,6 @@ class EmailVerificationResponse(BaseModel):
     message: str
     authorization_url: Optional[str] = None
 
-# Utility Functions
-
-def clean_solution_text(text: str) -> str:
-    """Clean solution text while preserving line breaks and formatting for proper display"""
-    if not text:
-        return text
-    
-    # Preserve line breaks and proper formatting - DO NOT COLLAPSE NEWLINES
-    # Only clean up excessive whitespace while preserving structure
-    
-    # Remove LaTeX dollar signs and other LaTeX artifacts
-    cleaned = text.replace('$', '')  # Remove all dollar signs
-    cleaned = cleaned.replace('\\(', '').replace('\\)', '')  # Remove LaTeX delimiters
-    cleaned = cleaned.replace('\\[', '').replace('\\]', '')  # Remove LaTeX display delimiters
-    
-    # Remove excessive spaces (but preserve single spaces and line breaks)
-    cleaned = re.sub(r'[ \t]+', ' ', cleaned)  # Only collapse horizontal whitespace
-    
-    # Preserve double line breaks for paragraph separation
-    cleaned = re.sub(r'\n\s*\n\s*\n+', '\n\n', cleaned)  # Max 2 consecutive newlines
-    
-    # Remove trailing whitespace from each line but preserve line breaks
-    lines = cleaned.split('\n')
-    cleaned_lines = [line.rstrip() for line in lines]
-    cleaned = '\n'.join(cleaned_lines)
-    
-    # Remove leading/trailing whitespace from entire text
-    cleaned = cleaned.strip()
-    
-    return cleaned
-
 # Core API Routes
 
 @api_router.get("/")
@@ -218,7 +258,7 @@ async def get_current_user_info(current_user: User = Depends(require_auth)):
 async def get_gmail_authorization_url():
     """Get Gmail OAuth2 authorization URL"""
     try:
-        auth_url = gmail_service.get_authorization_url()
+        auth_url = get_gmail_service().get_authorization_url()
         return EmailVerificationResponse(
             success=True,
             message="Gmail authorization URL generated",
@@ -231,7 +271,7 @@ async def get_gmail_authorization_url():
 async def handle_gmail_callback(auth_request: GmailAuthRequest):
     """Handle Gmail OAuth2 callback and exchange code for tokens"""
     try:
-        success = gmail_service.exchange_code_for_tokens(auth_request.authorization_code)
+        success = get_gmail_service().exchange_code_for_tokens(auth_request.authorization_code)
         if success:
             return EmailVerificationResponse(
                 success=True,
@@ -247,19 +287,19 @@ async def send_verification_code(request: EmailVerificationRequest):
     """Send verification code to email"""
     try:
         # Clean up expired codes first
-        gmail_service.cleanup_expired_codes()
+        get_gmail_service().cleanup_expired_codes()
         
         # Authenticate Gmail service if needed
-        if not gmail_service.service:
-            if not gmail_service.authenticate_service():
+        if not get_gmail_service().service:
+            if not get_gmail_service().authenticate_service():
                 raise HTTPException(
                     status_code=503, 
                     detail="Email service not configured. Please contact administrator."
                 )
         
         # Generate and send verification code
-        code = gmail_service.generate_verification_code(request.email)
-        email_sent = gmail_service.send_verification_email(request.email, code)
+        code = get_gmail_service().generate_verification_code(request.email)
+        email_sent = get_gmail_service().send_verification_email(request.email, code)
         
         if email_sent:
             return EmailVerificationResponse(
@@ -277,10 +317,10 @@ async def verify_email_code(request: VerificationCodeRequest):
     """Verify the provided email verification code"""
     try:
         # Clean up expired codes
-        gmail_service.cleanup_expired_codes()
+        get_gmail_service().cleanup_expired_codes()
         
         # Verify the code
-        is_valid = gmail_service.verify_code(request.email, request.code)
+        is_valid = get_gmail_service().verify_code(request.email, request.code)
         
         if is_valid:
             return EmailVerificationResponse(
@@ -306,7 +346,7 @@ async def signup_with_verification(
     """Complete signup after email verification"""
     try:
         # Verify the code first
-        is_code_valid = gmail_service.verify_code(request.email, request.code)
+        is_code_valid = get_gmail_service().verify_code(request.email, request.code)
         
         if not is_code_valid:
             raise HTTPException(
@@ -326,7 +366,7 @@ async def signup_with_verification(
         token_response = await auth_service.register_user_v2(user_create, db)
         
         # Clean up verification data
-        gmail_service.remove_pending_user(request.email)
+        get_gmail_service().remove_pending_user(request.email)
         
         return token_response
         
@@ -357,7 +397,7 @@ async def create_verified_account(
         token_response = await auth_service.register_user_v2(user_create, db)
         
         # Clean up verification data
-        gmail_service.remove_pending_user(request.email)
+        get_gmail_service().remove_pending_user(request.email)
         
         return token_response
         
@@ -383,19 +423,19 @@ async def request_password_reset(request: PasswordResetRequest, db: AsyncSession
             )
         
         # Clean up expired codes first
-        gmail_service.cleanup_expired_codes()
+        get_gmail_service().cleanup_expired_codes()
         
         # Authenticate Gmail service if needed
-        if not gmail_service.service:
-            if not gmail_service.authenticate_service():
+        if not get_gmail_service().service:
+            if not get_gmail_service().authenticate_service():
                 raise HTTPException(
                     status_code=503, 
                     detail="Email service not configured. Please contact administrator."
                 )
         
         # Generate and send password reset code
-        code = gmail_service.generate_verification_code(request.email)
-        email_sent = gmail_service.send_password_reset_email(request.email, code)
+        code = get_gmail_service().generate_verification_code(request.email)
+        email_sent = get_gmail_service().send_password_reset_email(request.email, code)
         
         if email_sent:
             return EmailVerificationResponse(
@@ -416,10 +456,10 @@ async def verify_password_reset(
     """Verify password reset code and update password"""
     try:
         # Clean up expired codes
-        gmail_service.cleanup_expired_codes()
+        get_gmail_service().cleanup_expired_codes()
         
         # Verify the code
-        is_valid = gmail_service.verify_code(request.email, request.code)
+        is_valid = get_gmail_service().verify_code(request.email, request.code)
         
         if not is_valid:
             raise HTTPException(
@@ -447,7 +487,7 @@ async def verify_password_reset(
         await db.commit()
         
         # Clean up verification data
-        gmail_service.remove_pending_user(request.email)
+        get_gmail_service().remove_pending_user(request.email)
         
         return EmailVerificationResponse(
             success=True,
@@ -475,12 +515,6 @@ async def store_pending_user(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store pending user: {str(e)}")
 
-# Import adaptive session engine
-from adaptive_session_engine import AdaptiveSessionEngine
-
-# Initialize adaptive engine
-adaptive_engine = AdaptiveSessionEngine()
-
 @api_router.post("/sessions/adaptive/start")
 async def start_adaptive_session(
     current_user: User = Depends(require_auth),
@@ -489,7 +523,7 @@ async def start_adaptive_session(
     """Start a new adaptive session with EWMA-based question selection"""
     try:
         # Get adaptively selected questions based on user mastery
-        adaptive_questions = await adaptive_engine.get_adaptive_session_questions(
+        adaptive_questions = await get_adaptive_engine().get_adaptive_session_questions(
             db, str(current_user.id), target_count=15
         )
         
@@ -505,6 +539,7 @@ async def start_adaptive_session(
         
         db.add(session)
         await db.flush()
+        await create_session_questions(db, session.id, [q["id"] for q in adaptive_questions])
         
         # Store session questions in a temporary way (could use Redis in production)
         session_questions = {
@@ -564,7 +599,7 @@ async def get_next_adaptive_question(
             raise HTTPException(status_code=404, detail="Session not found")
         
         # Get adaptive questions again (in production, this would be cached)
-        adaptive_questions = await adaptive_engine.get_adaptive_session_questions(
+        adaptive_questions = await get_adaptive_engine().get_adaptive_session_questions(
             db, str(current_user.id), target_count=15
         )
         
@@ -640,12 +675,14 @@ async def submit_answer(
             hint_used=attempt_data.hint_used
         )
         
+        # Reschedule the question's next spaced review in the attempt's transaction
         db.add(attempt)
+        await db.flush()
+        await get_spaced_repetition_engine().record_attempt(db, attempt)
         await db.commit()
         
-        # Update mastery tracking (both topic-level and type-level)
-        await mastery_tracker.update_mastery_after_attempt(db, attempt)
-        await mastery_tracker.update_type_mastery_after_attempt(db, attempt)  # New type-level tracking
+        # Update mastery tracking (both topic-level and type-level, one transaction)
+        await get_mastery_tracker().update_mastery_for_attempt(db, attempt, question)
         
         # Return feedback
         return {
@@ -669,7 +706,7 @@ async def get_type_mastery_breakdown(
         logger.info(f"Fetching type mastery breakdown for user {current_user.id}")
         
         # Get type-level mastery breakdown
-        type_breakdown = await mastery_tracker.get_type_mastery_breakdown(db, current_user.id)
+        type_breakdown = await get_mastery_tracker().get_type_mastery_breakdown(db, current_user.id)
         
         # Calculate summary statistics
         total_types = len(type_breakdown)
@@ -842,7 +879,7 @@ async def create_question(
         logger.error(f"Error creating question: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/questions")
+@api_router.get("/questions", dependencies=[Depends(catalog_conditional_get)])
 async def get_questions(
     category: Optional[str] = None,
     subcategory: Optional[str] = None,
@@ -909,7 +946,7 @@ async def create_study_plan(
         track = plan_request.track or "Beginner"
         
         # Create plan
-        plan = await study_planner.create_plan(
+        plan = await get_study_planner().create_plan(
             db,
             str(current_user.id),
             track,
@@ -1054,35 +1091,19 @@ async def get_current_session_status(
                 "message": "No active session found for today"
             }
         
-        # Parse question IDs from session
-        try:
-            question_ids = json.loads(session.units) if session.units else []
-        except (json.JSONDecodeError, TypeError):
-            return {
-                "active_session": False,
-                "message": "Invalid session data"
-            }
+        # Progress from session_questions (first unanswered position)
+        progress = await get_session_progress(db, session)
+        answered_count = progress["answered"]
+        total_questions = progress["total"]
         
-        if not question_ids:
+        if not total_questions:
             return {
                 "active_session": False,
                 "message": "Session has no questions"
             }
         
-        # Count how many questions have been attempted in this session
-        attempts_result = await db.execute(
-            select(func.count(Attempt.id))
-            .where(
-                Attempt.user_id == current_user.id,
-                Attempt.question_id.in_(question_ids),
-                Attempt.created_at >= session.started_at
-            )
-        )
-        answered_count = attempts_result.scalar() or 0
-        total_questions = len(question_ids)
-        
         # If session is complete, no active session
-        if answered_count >= total_questions:
+        if progress["next_position"] is None:
             return {
                 "active_session": False,
                 "message": "Today's session already completed"
@@ -1095,9 +1116,9 @@ async def get_current_session_status(
             "progress": {
                 "answered": answered_count,
                 "total": total_questions,
-                "next_question": answered_count + 1
+                "next_question": progress["next_position"]
             },
-            "message": f"Resuming session - Question {answered_count + 1} of {total_questions}"
+            "message": f"Resuming session - Question {progress['next_position']} of {total_questions}"
         }
         
     except Exception as e:
@@ -1122,7 +1143,7 @@ async def start_session(
         from database import SessionLocal
         sync_db = SessionLocal()
         try:
-            session_result = adaptive_session_logic.create_personalized_session(
+            session_result = get_adaptive_session_logic().create_personalized_session(
                 current_user.id, sync_db
             )
         finally:
@@ -1148,6 +1169,8 @@ async def start_session(
         )
         
         db.add(session)
+        await db.flush()
+        await create_session_questions(db, session.id, question_ids)
         await db.commit()
         
         # Enhanced response with session intelligence and questions for validation
@@ -1157,24 +1180,8 @@ async def start_session(
             "total_questions": question_count,
             "session_type": "intelligent_12_question_set",
             "current_question": 1,
-            "questions": [
-                {
-                    "id": str(q.id),
-                    "stem": q.stem,
-                    "answer": q.answer,
-                    "solution_approach": q.solution_approach,
-                    "detailed_solution": q.detailed_solution,
-                    "subcategory": q.subcategory,
-                    "type_of_question": q.type_of_question,
-                    "difficulty_band": q.difficulty_band,
-                    "difficulty_score": float(q.difficulty_score) if q.difficulty_score else None,
-                    "pyq_frequency_score": float(q.pyq_frequency_score) if q.pyq_frequency_score else None,
-                    "has_image": q.has_image,
-                    "image_url": q.image_url,
-                    "image_alt_text": q.image_alt_text,
-                    "created_at": q.created_at.isoformat()
-                } for q in questions
-            ],
+            # Pre-rendered per question (see question_payloads.py)
+            "questions": [question_payload_cache.session_item(q) for q in questions],
             "metadata": metadata,  # Include dual-dimension diversity metadata
             "phase_info": phase_info,  # Include three-phase adaptive information
             "personalization": {
@@ -1193,7 +1200,7 @@ async def start_session(
         }
         
         logger.info(f"Session created successfully: {session.id} - Personalized: {personalized}")
-        return response
+        return FastJSONResponse(response)
         
     except Exception as e:
         logger.error(f"Error starting sophisticated session: {e}")
@@ -1220,6 +1227,8 @@ async def start_session(
             )
             
             db.add(session)
+            await db.flush()
+            await create_session_questions(db, session.id, question_ids)
             await db.commit()
             
             return {
@@ -1259,42 +1268,26 @@ async def get_next_question(
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Parse question IDs from JSON string
-        try:
-            import json
-            question_ids = json.loads(session.units) if session.units else []
-        except (json.JSONDecodeError, TypeError):
-            raise HTTPException(status_code=500, detail="Invalid session data")
+        # Progress from session_questions: first unanswered position
+        progress = await get_session_progress(db, session)
+        total_questions = progress["total"]
+        answered_count = progress["answered"]
         
-        if not question_ids:
+        if not total_questions:
             raise HTTPException(status_code=404, detail="No questions in this session")
         
-        # Get number of attempts in this session to determine current question
-        attempts_result = await db.execute(
-            select(func.count(Attempt.id))
-            .where(
-                Attempt.user_id == current_user.id,
-                Attempt.question_id.in_(question_ids),
-                Attempt.created_at >= session.started_at
-            )
-        )
-        answered_count = attempts_result.scalar() or 0
-        
         # Check if session is complete
-        if answered_count >= len(question_ids):
+        if progress["next_position"] is None:
             return {
                 "session_complete": True,
                 "message": "All questions completed!",
                 "questions_completed": answered_count,
-                "total_questions": len(question_ids)
+                "total_questions": total_questions
             }
         
-        # Get the next unanswered question
-        current_question_id = question_ids[answered_count]
-        
-        # Get question details
+        # Get question details for the next unanswered position
         question_result = await db.execute(
-            select(Question).where(Question.id == current_question_id)
+            select(Question).where(Question.id == progress["next_question_id"])
         )
         question = question_result.scalar_one_or_none()
         
@@ -1302,22 +1295,16 @@ async def get_next_question(
             raise HTTPException(status_code=404, detail="Question not found")
         
         # Use stored MCQ options first, then generate if needed
-        options = None
-        
-        # First, try to use pre-stored MCQ options from enrichment
-        if question.mcq_options:
-            try:
-                import json
-                options = json.loads(question.mcq_options)
-                logger.info(f"Using stored MCQ options for question {question.id}")
-            except Exception as json_error:
-                logger.warning(f"Failed to parse stored MCQ options: {json_error}")
+        # With stored options from enrichment the whole question payload is pre-rendered once per question version
+        question_payload = question_payload_cache.next_question(question)
+        if question_payload is not None:
+            logger.info(f"Using stored MCQ options for question {question.id}")
         
         # If no stored options, generate new ones
-        if not options:
+        if question_payload is None:
             try:
                 logger.info(f"Generating new MCQ options for question {question.id}")
-                options = await mcq_generator.generate_options(
+                options = await get_mcq_generator().generate_options(
                     question.stem, 
                     question.subcategory, 
                     question.difficulty_band or "Medium", 
@@ -1394,28 +1381,17 @@ async def get_next_question(
                     }
                 
                 logger.info(f"Generated contextual fallback options for question type: {question.stem[:50]}...")
+            
+            # Include solutions (with cleaned formatting and fallback when enrichment is missing)
+            question_payload = build_next_question_payload(question, options, question_payload_cache.cleaned(question))
         
-        return {
-            "question": {
-                "id": str(question.id),
-                "stem": question.stem,
-                "subcategory": question.subcategory,
-                "difficulty_band": question.difficulty_band,
-                "type_of_question": question.type_of_question,
-                "has_image": question.has_image,
-                "image_url": question.image_url,
-                "image_alt_text": question.image_alt_text,
-                "options": options,
-                # Include solutions (with cleaned formatting and fallback when enrichment is missing)
-                "answer": clean_solution_text(question.answer) or options.get("A", "Answer not available"),
-                "solution_approach": clean_solution_text(question.solution_approach) or "Solution approach will be provided after enrichment",
-                "detailed_solution": clean_solution_text(question.detailed_solution) or "Detailed solution will be provided after enrichment"
-            },
+        return FastJSONResponse({
+            "question": question_payload,
             "session_progress": {
-                "current_question": answered_count + 1,
-                "total_questions": len(question_ids),
-                "questions_remaining": len(question_ids) - answered_count,
-                "progress_percentage": round((answered_count + 1) / len(question_ids) * 100, 1)
+                "current_question": progress["next_position"],
+                "total_questions": total_questions,
+                "questions_remaining": total_questions - answered_count,
+                "progress_percentage": round(progress["next_position"] / total_questions * 100, 1)
             },
             "session_intelligence": {
                 "question_selected_for": "Based on your learning profile and performance patterns",
@@ -1423,7 +1399,7 @@ async def get_next_question(
                 "category_focus": f"Focusing on {question.subcategory} to strengthen your understanding"
             },
             "session_complete": False
-        }
+        })
         
     except Exception as e:
         logger.error(f"Error getting next question: {e}")
@@ -1479,41 +1455,32 @@ async def submit_session_answer(
             hint_used=attempt_data.hint_used
         )
         
+        # Reschedule the question's next spaced review in the attempt's transaction
         db.add(attempt)
+        await db.flush()
+        await get_spaced_repetition_engine().record_attempt(db, attempt)
         await db.commit()
         
-        # Update mastery tracking
+        # Update mastery tracking (both topic-level and type-level, one transaction)
         try:
-            await mastery_tracker.update_mastery_after_attempt(db, attempt)
+            await get_mastery_tracker().update_mastery_for_attempt(db, attempt, question)
         except Exception as e:
             logger.warning(f"Mastery update failed: {e}")
         
-        # Check if session is now complete (all questions answered)
+        # Mark the question's position answered; the session is complete once no position is open.
+        # Progress is read first so a legacy session is migrated (its rows then already include this attempt)
         try:
-            question_ids = json.loads(session.units) if session.units else []
-        except (json.JSONDecodeError, TypeError):
-            question_ids = []
-        
-        if question_ids:
-            session_attempts_result = await db.execute(
-                select(func.count(Attempt.id.distinct()))
-                .where(
-                    Attempt.user_id == current_user.id,
-                    Attempt.question_id.in_(question_ids),
-                    Attempt.created_at >= session.started_at
-                )
-            )
-            answered_session_questions = session_attempts_result.scalar() or 0
-            total_session_questions = len(question_ids)
-            
-            # Mark session as complete if all questions answered
-            if answered_session_questions >= total_session_questions and not session.ended_at:
-                from datetime import datetime
+            progress = await get_session_progress(db, session, include_next_question=False)
+            answered = progress["answered"] + (1 if await record_session_answer(db, session, attempt) else 0)
+            if progress["total"] and answered >= progress["total"] and not session.ended_at:
                 session.ended_at = datetime.utcnow()
-                await db.commit()
                 logger.info(f"Session {session_id} marked as complete for user {current_user.id}")
+            await db.commit()
+        except Exception as e:
+            logger.warning(f"Session progress update failed: {e}")
         
         # Always return comprehensive feedback with solution
+        cleaned = question_payload_cache.cleaned(question)
         return {
             "correct": is_correct,
             "status": "correct" if is_correct else "incorrect",
@@ -1521,9 +1488,9 @@ async def submit_session_answer(
             "correct_answer": question.answer,
             "user_answer": attempt_data.user_answer,
             "solution_feedback": {
-                "solution_approach": clean_solution_text(question.solution_approach) or "Solution approach not available",
-                "detailed_solution": clean_solution_text(question.detailed_solution) or "Detailed solution not available",
-                "explanation": f"The correct answer is {clean_solution_text(question.answer)}. " + (clean_solution_text(question.solution_approach) or "")
+                "solution_approach": cleaned["solution_approach"] or "Solution approach not available",
+                "detailed_solution": cleaned["detailed_solution"] or "Detailed solution not available",
+                "explanation": f"The correct answer is {cleaned['answer']}. " + (cleaned["solution_approach"] or "")
             },
             "question_metadata": {
                 "subcategory": question.subcategory,
@@ -1540,7 +1507,7 @@ async def submit_session_answer(
 
 # Dashboard and Analytics Routes
 
-@api_router.get("/dashboard/mastery")
+@api_router.get("/dashboard/mastery", dependencies=[Depends(user_conditional_get)])
 async def get_mastery_dashboard(
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_async_compatible_db)
@@ -1563,34 +1530,61 @@ async def get_mastery_dashboard(
         mastery_records = result.fetchall()
         mastery_data = []
         
-        for mastery, topic_name, parent_id, is_parent_topic in mastery_records:
-            # Get subcategory data for this topic
+        # Subcategory attempt counts for every mastery topic in one grouped query
+        topic_ids = [mastery.topic_id for mastery, _, _, _ in mastery_records]
+        counts_by_topic = {}
+        if topic_ids:
             subcategory_result = await db.execute(
                 select(
+                    Question.topic_id,
                     Question.subcategory,
                     func.count(Attempt.id).label('attempts_count'),
-                    func.avg(
+                    func.sum(
                         case(
-                            (Attempt.correct == True, 100),
+                            (Attempt.correct == True, 1),
                             else_=0
                         )
-                    ).label('avg_accuracy')
+                    ).label('correct_count')
                 )
                 .join(Attempt, Question.id == Attempt.question_id)
                 .where(
-                    Question.topic_id == mastery.topic_id,
+                    Question.topic_id.in_(topic_ids),
                     Attempt.user_id == current_user.id
                 )
-                .group_by(Question.subcategory)
+                .group_by(Question.topic_id, Question.subcategory)
             )
+            for subcat_data in subcategory_result.fetchall():
+                counts_by_topic.setdefault(subcat_data.topic_id, {})[subcat_data.subcategory] = (
+                    subcat_data.attempts_count or 0, subcat_data.correct_count or 0
+                )
+        
+        # Archived attempts (attempt_daily_summaries) per topic and subcategory, added to the live counts below
+        archived_by_topic = {}
+        for row in await get_archived_attempt_totals(db, current_user.id, AttemptDailySummary.topic_id, AttemptDailySummary.subcategory):
+            archived_by_topic.setdefault(row.topic_id, {})[row.subcategory] = (row.attempts or 0, row.correct_attempts or 0)
+        
+        # Parent topics of all child topics in one query
+        parent_ids = {parent_id for _, _, parent_id, _ in mastery_records if parent_id}
+        parents = {}
+        if parent_ids:
+            parent_result = await db.execute(
+                select(Topic.id, Topic.name, Topic.category).where(Topic.id.in_(parent_ids))
+            )
+            parents = {parent.id: (parent.name, parent.category) for parent in parent_result.fetchall()}
+        
+        for mastery, topic_name, parent_id, is_parent_topic in mastery_records:
+            subcategory_counts = dict(counts_by_topic.get(mastery.topic_id, {}))
+            for subcategory, (archived_attempts, archived_correct) in archived_by_topic.get(mastery.topic_id, {}).items():
+                attempts_count, correct_count = subcategory_counts.get(subcategory, (0, 0))
+                subcategory_counts[subcategory] = (attempts_count + archived_attempts, correct_count + archived_correct)
             
             subcategories = []
-            for subcat_data in subcategory_result.fetchall():
-                if subcat_data.subcategory:  # Only include if subcategory exists
+            for subcategory, (attempts_count, correct_count) in subcategory_counts.items():
+                if subcategory:  # Only include if subcategory exists
                     subcategories.append({
-                        'name': subcat_data.subcategory,
-                        'attempts_count': subcat_data.attempts_count or 0,
-                        'mastery_percentage': float(subcat_data.avg_accuracy or 0)
+                        'name': subcategory,
+                        'attempts_count': attempts_count,
+                        'mastery_percentage': float(correct_count / attempts_count * 100) if attempts_count else 0.0
                     })
             
             # Determine category with canonical taxonomy format
@@ -1599,10 +1593,7 @@ async def get_mastery_dashboard(
             
             if parent_id:
                 # This is a child topic, get parent name and format as canonical category
-                parent_result = await db.execute(
-                    select(Topic.name, Topic.category).where(Topic.id == parent_id)
-                )
-                parent_record = parent_result.first()
+                parent_record = parents.get(parent_id)
                 if parent_record:
                     parent_name, parent_category = parent_record
                     category_name = parent_name
@@ -1676,30 +1667,6 @@ async def get_mastery_dashboard(
 async def get_detailed_progress_data(db: AsyncSession, user_id: str) -> List[Dict]:
     """Get comprehensive progress breakdown showing all canonical taxonomy categories/subcategories with question counts by difficulty"""
     try:
-        # Define canonical taxonomy structure for comprehensive coverage
-        canonical_categories = {
-            "A-Arithmetic": [
-                "Time–Speed–Distance (TSD)", "Time & Work", "Ratio–Proportion–Variation",
-                "Percentages", "Averages & Alligation", "Profit–Loss–Discount (PLD)",
-                "Simple & Compound Interest (SI–CI)", "Mixtures & Solutions"
-            ],
-            "B-Algebra": [
-                "Linear Equations", "Quadratic Equations", "Inequalities", "Progressions",
-                "Functions & Graphs", "Logarithms & Exponents", "Special Algebraic Identities"
-            ],
-            "C-Geometry & Mensuration": [
-                "Triangles", "Circles", "Polygons", "Coordinate Geometry",
-                "Mensuration (2D & 3D)", "Trigonometry in Geometry"
-            ],
-            "D-Number System": [
-                "Divisibility", "HCF–LCM", "Remainders & Modular Arithmetic",
-                "Base Systems", "Digit Properties"
-            ],
-            "E-Modern Math": [
-                "Permutation–Combination (P&C)", "Probability", "Set Theory & Venn Diagrams"
-            ]
-        }
-        
         # Simplified query using SQLAlchemy ORM instead of raw SQL to avoid AsyncSession parameter issues
         try:
             # Get all active questions with their topics and attempts for this user
@@ -1708,9 +1675,9 @@ async def get_detailed_progress_data(db: AsyncSession, user_id: str) -> List[Dic
                 Question.difficulty_band,
                 Topic.category,
                 func.count(Question.id).label('total_questions'),
-                func.count(case((Attempt.correct == True, Attempt.question_id))).label('solved_correctly'),
+                func.count(case((and_(Attempt.user_id == user_id, Attempt.correct == True), Attempt.question_id))).label('solved_correctly'),
                 func.count(case((Attempt.user_id == user_id, Attempt.question_id))).label('attempted_questions'),
-                func.coalesce(func.avg(case((Attempt.correct == True, 1.0), else_=0.0)), 0).label('accuracy_rate')
+                func.coalesce(func.avg(case((Attempt.user_id == user_id, case((Attempt.correct == True, 1.0), else_=0.0)))), 0).label('accuracy_rate')
             ).select_from(
                 Question.__table__.join(Topic.__table__, Question.topic_id == Topic.id)
                 .outerjoin(Attempt.__table__, Question.id == Attempt.question_id)
@@ -1734,10 +1701,40 @@ async def get_detailed_progress_data(db: AsyncSession, user_id: str) -> List[Dic
             # Fallback to empty results if query fails
             db_rows = []
         
+        # Archived attempts (attempt_daily_summaries) per (category code, subcategory, difficulty)
+        archived_counts = {}
+        try:
+            for row in await get_archived_attempt_totals(
+                db, user_id, Topic.category, AttemptDailySummary.subcategory, AttemptDailySummary.difficulty_band
+            ):
+                archived_counts[(row.category, row.subcategory, row.difficulty_band or "Medium")] = (
+                    row.attempts or 0, row.correct_attempts or 0
+                )
+        except Exception as archive_error:
+            logger.error(f"Error reading archived attempt summaries: {archive_error}")
+        
+        # Index rows by (subcategory, difficulty) for rows filed under the subcategory's canonical category code
+        rows_by_subcategory = {}
+        for row in db_rows:
+            difficulty = row.difficulty_band or "Medium"
+            if row.category in (None, taxonomy_registry.category_code(taxonomy_registry.category_of(row.subcategory))):
+                archived_attempts, archived_correct = archived_counts.get((row.category, row.subcategory, difficulty), (0, 0))
+                attempted = int(row.attempted_questions or 0)
+                rows_by_subcategory[(row.subcategory, difficulty)] = {
+                    "total": int(row.total_questions or 0),
+                    "solved": int(row.solved_correctly or 0) + archived_correct,
+                    "attempted": attempted + archived_attempts,
+                    "accuracy": (
+                        (float(row.accuracy_rate or 0) * attempted + archived_correct) / (attempted + archived_attempts) * 100
+                        if attempted + archived_attempts else 0.0
+                    )
+                }
+        
         # Create a comprehensive progress structure including all canonical subcategories
         comprehensive_progress = []
         
-        for category, subcategories in canonical_categories.items():
+        for category, subcategories in taxonomy_registry.subcategories_by_category.items():
+            category_label = taxonomy_registry.category_label(category)
             for subcategory in subcategories:
                 # Initialize difficulty breakdown
                 difficulty_breakdown = {
@@ -1747,16 +1744,10 @@ async def get_detailed_progress_data(db: AsyncSession, user_id: str) -> List[Dic
                 }
                 
                 # Fill with actual data from database
-                for row in db_rows:
-                    if row.category == category and row.subcategory == subcategory:
-                        difficulty = row.difficulty_band or "Medium"
-                        if difficulty in difficulty_breakdown:
-                            difficulty_breakdown[difficulty] = {
-                                "total": int(row.total_questions or 0),
-                                "solved": int(row.solved_correctly or 0),
-                                "attempted": int(row.attempted_questions or 0),
-                                "accuracy": float(row.accuracy_rate or 0) * 100  # Convert to percentage
-                            }
+                for difficulty in difficulty_breakdown:
+                    counts = rows_by_subcategory.get((subcategory, difficulty))
+                    if counts is not None:
+                        difficulty_breakdown[difficulty] = counts
                 
                 # Calculate overall stats for this subcategory
                 total_questions = sum(d["total"] for d in difficulty_breakdown.values())
@@ -1774,7 +1765,7 @@ async def get_detailed_progress_data(db: AsyncSession, user_id: str) -> List[Dic
                     mastery_level = "Needs Focus"
                 
                 comprehensive_progress.append({
-                    "category": category,
+                    "category": category_label,
                     "subcategory": subcategory,
                     "difficulty_breakdown": difficulty_breakdown,
                     "summary": {
@@ -1829,63 +1820,13 @@ async def get_progress_dashboard(
         logger.error(f"Error getting progress dashboard: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/dashboard/simple-taxonomy")
+@api_router.get("/dashboard/simple-taxonomy", dependencies=[Depends(user_conditional_get)])
 async def get_simple_taxonomy_dashboard(
     current_user: User = Depends(require_auth),
     db: AsyncSession = Depends(get_async_compatible_db)
 ):
     """Get simplified dashboard with complete canonical taxonomy and attempt counts by difficulty"""
     try:
-        # Define the complete canonical taxonomy as requested
-        canonical_taxonomy = {
-            "Arithmetic": {
-                "Time-Speed-Distance": ["Basics", "Relative Speed", "Circular Track Motion", "Boats and Streams", "Trains", "Races"],
-                "Time-Work": ["Work Time Effeciency", "Pipes and Cisterns", "Work Equivalence"],
-                "Ratios and Proportions": ["Simple Rations", "Compound Ratios", "Direct and Inverse Variation", "Partnerships"],
-                "Percentages": ["Basics", "Percentage Change", "Successive Percentage Change"],
-                "Averages and Alligation": ["Basic Averages", "Weighted Averages", "Alligations & Mixtures", "Three Mixture Alligations"],
-                "Profit-Loss-Discount": ["Basics", "Successive Profit/Loss/Discounts", "Marked Price and Cost Price Relations", "Discount Chains"],
-                "Simple and Compound Interest": ["Basics", "Difference between Simple Interest and Compound Interests", "Fractional Time Period Compound Interest"],
-                "Mixtures and Solutions": ["Replacements", "Concentration Change", "Solid-Liquid-Gas Mixtures"],
-                "Partnerships": ["Profit share"]
-            },
-            "Algebra": {
-                "Linear Equations": ["Two variable systems", "Three variable systems", "Dependent and Inconsistent Systems"],
-                "Quadratic Equations": ["Roots & Nature of Roots", "Sum and Product of Roots", "Maximum and Minimum Values"],
-                "Inequalities": ["Linear Inequalities", "Quadratic Inequalities", "Modulus and Absolute Value", "Arithmetic Mean", "Geometric Mean", "Cauchy Schwarz"],
-                "Progressions": ["Arithmetic Progression", "Geometric Progression", "Harmonic Progression", "Mixed Progressions"],
-                "Functions and Graphs": ["Linear Functions", "Quadratic Functions", "Polynomial Functions", "Modulus Functions", "Step Functions", "Transformations", "Domain Range", "Composition and Inverse Functions"],
-                "Logarithms and Exponents": ["Basics", "Change of Base Formula", "Soliving Log Equations", "Surds and Indices"],
-                "Special Algebraic Identities": ["Expansion and Factorisation", "Cubes and Squares", "Binomial Theorem"],
-                "Maxima and Minima": ["Optimsation with Algebraic Expressions"],
-                "Special Polynomials": ["Remainder Theorem", "Factor Theorem"]
-            },
-            "Geometry and Mensuration": {
-                "Triangles": ["Properties (Angles, Sides, Medians, Bisectors)", "Congruence & Similarity", "Pythagoras & Converse", "Inradius, Circumradius, Orthocentre"],
-                "Circles": ["Tangents & Chords", "Angles in a Circle", "Cyclic Quadrilaterals"],
-                "Polygons": ["Regular Polygons", "Interior / Exterior Angles"],
-                "Coordinate Geometry": ["Distance", "Section Formula", "Midpoint", "Equation of a line", "Slope & Intercepts", "Circles in Coordinate Plane", "Parabola", "Ellipse", "Hyperbola"],
-                "Mensuration 2D": ["Area Triangle", "Area Rectangle", "Area Trapezium", "Area Circle", "Sector"],
-                "Mensuration 3D": ["Volume Cubes", "Volume Cuboid", "Volume Cylinder", "Volume Cone", "Volume Sphere", "Volume Hemisphere", "Surface Areas"],
-                "Trigonometry": ["Heights and Distances", "Basic Trigonometric Ratios"]
-            },
-            "Number System": {
-                "Divisibility": ["Basic Divisibility Rules", "Factorisation of Integers"],
-                "HCF-LCM": ["Euclidean Algorithm", "Product of HCF and LCM"],
-                "Remainders": ["Basic Remainder Theorem", "Chinese Remainder Theorem", "Cyclicity of Remainders (Last Digits)", "Cyclicity of Remainders (Last Two Digits)"],
-                "Base Systems": ["Conversion between bases", "Arithmetic in different bases"],
-                "Digit Properties": ["Sum of Digits", "Last Digit Patterns", "Palindromes", "Repetitive Digits"],
-                "Number Properties": ["Perfect Squares", "Perfect Cubes"],
-                "Number Series": ["Sum of Squares", "Sum of Cubes", "Telescopic Series"],
-                "Factorials": ["Properties of Factorials"]
-            },
-            "Modern Math": {
-                "Permutation-Combination": ["Basics", "Circular Permutations", "Permutations with Repetitions", "Permutations with Restrictions", "Combinations with Repetitions", "Combinations with Restrictions"],
-                "Probability": ["Classical Probability", "Conditional Probability", "Bayes' Theorem"],
-                "Set Theory and Venn Diagram": ["Union and Intersection", "Complement and Difference of Sets", "Multi Set Problems"]
-            }
-        }
-        
         # Get user's attempt data grouped by subcategory, type, and difficulty
         attempt_query = await db.execute(
             select(
@@ -1901,6 +1842,12 @@ async def get_simple_taxonomy_dashboard(
         
         attempt_data = attempt_query.fetchall()
         
+        # Archived attempts (attempt_daily_summaries) by the same dimensions
+        archived_data = await get_archived_attempt_totals(
+            db, current_user.id,
+            AttemptDailySummary.subcategory, AttemptDailySummary.type_of_question, AttemptDailySummary.difficulty_band
+        )
+        
         # Get total completed sessions count (only sessions with ended_at)
         sessions_result = await db.execute(
             select(func.count(Session.id))
@@ -1909,36 +1856,34 @@ async def get_simple_taxonomy_dashboard(
         )
         total_sessions = sessions_result.scalar() or 0
         
-        # Build the response data
+        # Attempt counts per (subcategory, type) by difficulty
+        counts = {}
+        for subcategory, type_of_question, difficulty_band, attempt_count in (
+            [(row.subcategory, row.type_of_question, row.difficulty_band, row.attempt_count) for row in attempt_data] +
+            [(row.subcategory, row.type_of_question, row.difficulty_band, row.attempts) for row in archived_data]
+        ):
+            by_difficulty = counts.setdefault((subcategory, type_of_question), {})
+            difficulty = "Hard" if difficulty_band == "Difficult" else difficulty_band
+            by_difficulty[difficulty] = by_difficulty.get(difficulty, 0) + (attempt_count or 0)
+        
+        # Build the response data over the complete canonical taxonomy
         taxonomy_data = []
-        
-        for category, subcategories in canonical_taxonomy.items():
-            for subcategory, types in subcategories.items():
-                for type_name in types:
-                    # Find attempt counts for this specific combination
-                    easy_count = 0
-                    medium_count = 0
-                    hard_count = 0
-                    
-                    for row in attempt_data:
-                        if (row.subcategory == subcategory and 
-                            row.type_of_question == type_name):
-                            if row.difficulty_band == 'Easy':
-                                easy_count = row.attempt_count
-                            elif row.difficulty_band == 'Medium':
-                                medium_count = row.attempt_count
-                            elif row.difficulty_band == 'Hard' or row.difficulty_band == 'Difficult':
-                                hard_count = row.attempt_count
-                    
-                    taxonomy_data.append({
-                        "category": category,
-                        "subcategory": subcategory,
-                        "type": type_name,
-                        "easy_attempts": easy_count,
-                        "medium_attempts": medium_count,
-                        "hard_attempts": hard_count,
-                        "total_attempts": easy_count + medium_count + hard_count
-                    })
+        empty = {}
+        for subcategory, type_name in taxonomy_registry.types:
+            by_difficulty = counts.get((subcategory, type_name), empty)
+            easy_count = by_difficulty.get('Easy', 0)
+            medium_count = by_difficulty.get('Medium', 0)
+            hard_count = by_difficulty.get('Hard', 0)
+            
+            taxonomy_data.append({
+                "category": taxonomy_registry.category_of(subcategory),
+                "subcategory": subcategory,
+                "type": type_name,
+                "easy_attempts": easy_count,
+                "medium_attempts": medium_count,
+                "hard_attempts": hard_count,
+                "total_attempts": easy_count + medium_count + hard_count
+            })
         
         return {
             "total_sessions": total_sessions,
@@ -2334,7 +2279,7 @@ async def re_enrich_all_questions(
                 hint_category = topic.name if topic else "Arithmetic"
                 
                 # Use the global LLM pipeline with retry logic
-                enrichment_result = await llm_pipeline.complete_auto_generation(
+                enrichment_result = await get_llm_pipeline().complete_auto_generation(
                     stem=question.stem,
                     hint_category=hint_category,
                     hint_subcategory=question.subcategory
@@ -2526,7 +2471,7 @@ async def emergency_fix_solutions(
                 
                 for attempt in range(max_attempts):
                     try:
-                        enrichment_result = await llm_pipeline.complete_auto_generation(
+                        enrichment_result = await get_llm_pipeline().complete_auto_generation(
                             stem=question.stem,
                             hint_category=hint_category,
                             hint_subcategory=question.subcategory
@@ -2655,10 +2600,20 @@ async def export_pyq_csv(
 @api_router.post("/admin/upload-questions-csv")
 async def upload_questions_csv(
     file: UploadFile = File(...),
+    duplicate_action: str = "skip",
     current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_async_compatible_db)
 ):
-    """Upload questions from simplified CSV file with Google Drive image support"""
+    """
+    Upload questions from simplified CSV file with Google Drive image support.
+    Near-duplicates of existing questions (or of earlier rows) are skipped, or
+    created with a 'possible_duplicate' tag when duplicate_action=flag.
+    """
+    from near_duplicate_index import question_duplicate_index, minhash_signature, record_signatures
+    
+    if duplicate_action not in ("skip", "flag"):
+        raise HTTPException(status_code=400, detail="duplicate_action must be 'skip' or 'flag'")
+    
     try:
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="File must be a CSV")
@@ -2691,10 +2646,15 @@ async def upload_questions_csv(
         logger.info(f"Processing {len(csv_rows)} rows from simplified CSV with LLM auto-generation")
         
         # Process images from Google Drive URLs
+        from google_drive_utils import GoogleDriveImageFetcher
         processed_rows = GoogleDriveImageFetcher.process_csv_image_urls(csv_rows, UPLOAD_DIR)
         
         questions_created = 0
         images_processed = 0
+        duplicates = []
+        new_signatures = []
+        
+        await question_duplicate_index.ensure_fresh(db)
         
         for i, row in enumerate(processed_rows):
             # Extract data from simplified CSV row
@@ -2715,6 +2675,20 @@ async def upload_questions_csv(
                 logger.warning(f"Row {i+1}: Skipping - missing question stem")
                 continue  # Skip rows without stem
             
+            # Near-duplicate check against the bank and earlier rows of this upload
+            signature = minhash_signature(stem)
+            duplicate_matches = question_duplicate_index.find_duplicates(signature)
+            if duplicate_matches:
+                duplicates.append({
+                    "row": i + 1,
+                    "duplicate_of": duplicate_matches[0][0],
+                    "similarity": round(duplicate_matches[0][1], 3),
+                    "action": duplicate_action
+                })
+                if duplicate_action == "skip":
+                    logger.info(f"Row {i+1}: Skipping - near-duplicate of question {duplicate_matches[0][0]}")
+                    continue
+            
             # Find a default topic (LLM will classify properly during enrichment)
             topic_result = await db.execute(
                 select(Topic).where(Topic.name == "General")
@@ -2732,6 +2706,7 @@ async def upload_questions_csv(
             
             # Create question with minimal data - LLM will enrich everything
             question = Question(
+                id=str(uuid.uuid4()),
                 topic_id=topic.id,
                 stem=stem,
                 # LLM will generate these fields
@@ -2740,7 +2715,7 @@ async def upload_questions_csv(
                 detailed_solution="To be generated by LLM",
                 subcategory="To be classified by LLM",
                 type_of_question="To be classified by LLM",
-                tags=["csv_upload", "llm_pending"],
+                tags=["csv_upload", "llm_pending"] + (["possible_duplicate"] if duplicate_matches else []),
                 source="CSV Upload - Simplified Format",
                 # Image support fields
                 has_image=has_image,
@@ -2757,6 +2732,10 @@ async def upload_questions_csv(
             db.add(question)
             questions_created += 1
             
+            if signature is not None:
+                question_duplicate_index.add(question.id, signature)
+                new_signatures.append((question.id, signature))
+            
             if has_image and image_url:
                 images_processed += 1
                 logger.info(f"Question {questions_created}: Created with image from Google Drive")
@@ -2765,6 +2744,7 @@ async def upload_questions_csv(
             logger.info(f"Question {questions_created} queued for LLM auto-generation and classification")
             
         await db.commit()
+        await record_signatures(db, 'question', new_signatures)
         
         # Start background enrichment for all created questions
         logger.info("Starting background LLM enrichment for all uploaded questions...")
@@ -2789,11 +2769,15 @@ async def upload_questions_csv(
             "questions_created": questions_created,
             "images_processed": images_processed,
             "csv_rows_processed": len(processed_rows),
+            "duplicates_skipped": sum(1 for duplicate in duplicates if duplicate["action"] == "skip"),
+            "duplicates_flagged": sum(1 for duplicate in duplicates if duplicate["action"] == "flag"),
+            "duplicates": duplicates,
             "llm_enrichment_status": "Questions queued for automatic LLM processing (answer generation, classification, difficulty analysis)",
             "note": "Questions will be automatically enriched with answers, categories, solutions, and difficulty ratings by the LLM system"
         }
         
     except Exception as e:
+        question_duplicate_index.invalidate()
         logger.error(f"Simplified CSV upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to upload CSV: {str(e)}")
 
@@ -2883,6 +2867,7 @@ async def upload_pyq_document(
     year: int = Form(None),
     slot: Optional[str] = Form(None),
     source_url: Optional[str] = Form(None),
+    duplicate_action: str = Form("skip"),
     background_tasks: BackgroundTasks = None,
     current_user: User = Depends(require_admin),
     db: AsyncSession = Depends(get_async_compatible_db)
@@ -2891,7 +2876,9 @@ async def upload_pyq_document(
     try:
         # PRIMARY: CSV-based PYQ upload with LLM enrichment
         if file.filename.endswith('.csv'):
-            return await upload_pyq_csv(file, db, current_user)
+            if duplicate_action not in ("skip", "flag"):
+                raise HTTPException(status_code=400, detail="duplicate_action must be 'skip' or 'flag'")
+            return await upload_pyq_csv(file, db, current_user, duplicate_action)
         
         # MINIMAL LEGACY SUPPORT: Document processing (deprecated)
         # Note: This is kept for minimal backward compatibility but CSV is strongly recommended
@@ -2952,11 +2939,14 @@ async def upload_pyq_document(
         logger.error(f"PYQ upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to upload PYQ: {str(e)}")
 
-async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User):
+async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User, duplicate_action: str = "skip"):
     """
     NEW: CSV-based PYQ upload with automatic LLM enrichment
     CSV columns: stem, image_url, year
+    Near-duplicate PYQs are skipped, or tagged 'possible_duplicate' when duplicate_action=flag
     """
+    from near_duplicate_index import pyq_duplicate_index, minhash_signature, record_signatures
+    
     try:
         # Import json module at the top
         import csv
@@ -2994,6 +2984,7 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
         logger.info(f"Processing {len(csv_rows)} PYQ questions from CSV with LLM enrichment")
         
         # Process images from Google Drive URLs (same as questions)
+        from google_drive_utils import GoogleDriveImageFetcher
         processed_rows = GoogleDriveImageFetcher.process_csv_image_urls(csv_rows, UPLOAD_DIR)
         
         # Group questions by year for paper organization
@@ -3007,6 +2998,10 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
         total_questions_created = 0
         total_images_processed = 0
         papers_created = []
+        duplicates = []
+        new_signatures = []
+        
+        await pyq_duplicate_index.ensure_fresh(db)
         
         # Process each year separately
         for year, questions in questions_by_year.items():
@@ -3043,6 +3038,21 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
                     logger.warning(f"Skipping row {i+1} for year {year}: empty stem")
                     continue
                 
+                # Near-duplicate check against existing PYQs and earlier rows of this upload
+                signature = minhash_signature(stem)
+                duplicate_matches = pyq_duplicate_index.find_duplicates(signature)
+                if duplicate_matches:
+                    duplicates.append({
+                        "year": year,
+                        "row": i + 1,
+                        "duplicate_of": duplicate_matches[0][0],
+                        "similarity": round(duplicate_matches[0][1], 3),
+                        "action": duplicate_action
+                    })
+                    if duplicate_action == "skip":
+                        logger.info(f"Skipping row {i+1} for year {year}: near-duplicate of PYQ {duplicate_matches[0][0]}")
+                        continue
+                
                 # Image fields (processed by Google Drive utils)
                 has_image = row.get('has_image', False)
                 image_url = row.get('image_url', '').strip() if row.get('image_url') else None
@@ -3067,24 +3077,30 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
                 
                 # Create PYQ question with minimal data - LLM will enrich everything
                 pyq_question = PYQQuestion(
+                    id=str(uuid.uuid4()),
                     paper_id=str(paper.id),
                     topic_id=str(topic.id),
                     stem=stem,
                     answer="To be generated by LLM",
                     subcategory="To be classified by LLM",
                     type_of_question="To be classified by LLM",
-                    tags=json.dumps(["pyq_csv_upload", "llm_pending", f"year_{year}"]),
+                    tags=json.dumps(["pyq_csv_upload", "llm_pending", f"year_{year}"] + (["possible_duplicate"] if duplicate_matches else [])),
                     confirmed=False  # Will be confirmed after LLM enrichment
                 )
                 
                 db.add(pyq_question)
                 total_questions_created += 1
+                
+                if signature is not None:
+                    pyq_duplicate_index.add(pyq_question.id, signature)
+                    new_signatures.append((pyq_question.id, signature))
             
             # Mark ingestion as completed
             ingestion.parse_status = "completed"
             ingestion.completed_at = datetime.utcnow()
         
         await db.commit()
+        await record_signatures(db, 'pyq', new_signatures)
         
         # Queue background LLM enrichment for all PYQ questions
         logger.info("Starting background LLM enrichment for all uploaded PYQ questions...")
@@ -3097,8 +3113,14 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
             ).order_by(desc(PYQQuestion.created_at)).limit(total_questions_created)
         )
         
+        recent_pyq_questions = recent_pyq_questions.scalars().all()
+        
+        # Index concept terms at ingest; enrichment re-indexes after classification
+        from pyq_concept_index import index_pyq_questions
+        await index_pyq_questions(db, recent_pyq_questions)
+        
         # Queue background enrichment tasks for PYQ questions
-        for pyq_question in recent_pyq_questions.scalars():
+        for pyq_question in recent_pyq_questions:
             # Use the same enrichment pipeline but for PYQ questions
             asyncio.create_task(enrich_pyq_question_background(str(pyq_question.id)))
         
@@ -3135,15 +3157,20 @@ async def upload_pyq_csv(file: UploadFile, db: AsyncSession, current_user: User)
             "years_processed": list(questions_by_year.keys()),
             "papers_created": len(papers_created),
             "csv_rows_processed": len(processed_rows),
+            "duplicates_skipped": sum(1 for duplicate in duplicates if duplicate["action"] == "skip"),
+            "duplicates_flagged": sum(1 for duplicate in duplicates if duplicate["action"] == "flag"),
+            "duplicates": duplicates,
             "enrichment_status": "PYQ questions queued for automatic LLM processing (category classification, solution generation, type identification)",
             "note": "PYQ questions will be automatically enriched with categories, subcategories, question types, and solutions by the LLM system",
             "file_id": file_record.id
         }
         
     except Exception as e:
+        pyq_duplicate_index.invalidate()
         logger.error(f"PYQ CSV upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to upload PYQ CSV: {str(e)}")
 
+@track_enrichment_task("pyq")
 async def enrich_pyq_question_background(pyq_question_id: str):
     """
     Background task for PYQ question enrichment using LLM
@@ -3261,6 +3288,10 @@ async def enrich_pyq_question_background(pyq_question_id: str):
         # Commit changes
         db.commit()
         
+        # Re-index concept terms now that the subcategory is classified
+        from pyq_concept_index import index_pyq_questions
+        await index_pyq_questions(AsyncSession(db), [pyq_question])
+        
         logger.info(f"✅ PYQ enrichment completed for question {pyq_question_id}")
         logger.info(f"   - Subcategory: {subcategory}")
         logger.info(f"   - Question Type: {question_type}")
@@ -3327,7 +3358,8 @@ async def test_immediate_enrichment(
         ).with_model("claude", "claude-3-5-sonnet-20241022")
         
         user_message = UserMessage(text=f"Question: {test_question.stem}")
-        answer_response = await chat.send_message(user_message)
+        with track_llm_call("anthropic", "claude-3-5-sonnet-20241022", "test_immediate_enrichment"):
+            answer_response = await chat.send_message(user_message)
         answer = answer_response.strip()
         
         # Step 2: Generate solution
@@ -3338,7 +3370,8 @@ async def test_immediate_enrichment(
         ).with_model("claude", "claude-3-5-sonnet-20241022")
         
         solution_message = UserMessage(text=f"Question: {test_question.stem}\nAnswer: {answer}\nProvide a step-by-step solution.")
-        solution_response = await solution_chat.send_message(solution_message)
+        with track_llm_call("anthropic", "claude-3-5-sonnet-20241022", "test_immediate_enrichment"):
+            solution_response = await solution_chat.send_message(solution_message)
         
         # Update the question
         test_question.answer = answer[:100]  # Limit length
@@ -3382,7 +3415,7 @@ async def test_conceptual_frequency_analysis(
         from conceptual_frequency_analyzer import ConceptualFrequencyAnalyzer
         
         # Initialize analyzer
-        frequency_analyzer = ConceptualFrequencyAnalyzer(llm_pipeline)
+        frequency_analyzer = ConceptualFrequencyAnalyzer(get_llm_pipeline())
         
         # Get a sample question
         result = await db.execute(
@@ -3494,7 +3527,7 @@ async def run_enhanced_nightly_processing(
         from enhanced_nightly_engine import EnhancedNightlyEngine
         
         # Initialize enhanced nightly engine
-        enhanced_engine = EnhancedNightlyEngine(llm_pipeline)
+        enhanced_engine = EnhancedNightlyEngine(get_llm_pipeline())
         
         logger.info("🌙 Starting manual enhanced nightly processing...")
         
@@ -3511,6 +3544,143 @@ async def run_enhanced_nightly_processing(
         logger.error(f"Error in enhanced nightly processing: {e}")
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
+@api_router.get("/admin/nightly-runs")
+async def get_nightly_runs(
+    limit: int = 10,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_compatible_db)
+):
+    """Recent nightly runs with per-stage status, durations, rows processed and watermarks"""
+    try:
+        from database import NightlyRun
+        
+        runs_result = await db.execute(
+            select(NightlyRun)
+            .options(selectinload(NightlyRun.stages))
+            .order_by(desc(NightlyRun.started_at))
+            .limit(min(max(limit, 1), 100))
+        )
+        
+        runs = []
+        for run in runs_result.scalars().all():
+            runs.append({
+                "id": run.id,
+                "status": run.status,
+                "started_at": run.started_at.isoformat() if run.started_at else None,
+                "completed_at": run.completed_at.isoformat() if run.completed_at else None,
+                "data_upper_bound": run.data_upper_bound.isoformat() if run.data_upper_bound else None,
+                "resume_count": run.resume_count,
+                "error": run.error,
+                "stages": [
+                    {
+                        "stage_name": stage.stage_name,
+                        "status": stage.status,
+                        "watermark_from": stage.watermark_from.isoformat() if stage.watermark_from else None,
+                        "watermark_to": stage.watermark_to.isoformat() if stage.watermark_to else None,
+                        "rows_processed": stage.rows_processed,
+                        "chunks_committed": stage.chunks_committed,
+                        "duration_seconds": float(stage.duration_seconds) if stage.duration_seconds is not None else None,
+                        "error": stage.error
+                    }
+                    for stage in run.stages
+                ]
+            })
+        
+        return {"runs": runs, "count": len(runs)}
+        
+    except Exception as e:
+        logger.error(f"Error getting nightly runs: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get nightly runs: {str(e)}")
+
+@api_router.get("/admin/job-runs")
+async def get_job_runs(
+    job_name: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_compatible_db)
+):
+    """Scheduled job run history across workers, plus this worker's scheduler leader status"""
+    try:
+        from database import JobRun
+        from background_jobs import get_scheduler_status
+        
+        query = select(JobRun).order_by(desc(JobRun.started_at)).limit(min(max(limit, 1), 500))
+        if job_name:
+            query = query.where(JobRun.job_name == job_name)
+        runs_result = await db.execute(query)
+        
+        runs = [
+            {
+                "id": run.id,
+                "job_name": run.job_name,
+                "status": run.status,
+                "worker_id": run.worker_id,
+                "started_at": run.started_at.isoformat() if run.started_at else None,
+                "completed_at": run.completed_at.isoformat() if run.completed_at else None,
+                "duration_seconds": float(run.duration_seconds) if run.duration_seconds is not None else None,
+                "error": run.error
+            }
+            for run in runs_result.scalars().all()
+        ]
+        
+        return {"scheduler": get_scheduler_status(), "runs": runs, "count": len(runs)}
+        
+    except Exception as e:
+        logger.error(f"Error getting job runs: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get job runs: {str(e)}")
+
+@api_router.get("/admin/profiles")
+async def list_request_profiles(
+    limit: int = 50,
+    current_user: User = Depends(require_admin)
+):
+    """Stored request profiles on this worker (newest first); download one as speedscope JSON"""
+    try:
+        profiles = profile_store.list(limit=min(max(limit, 1), 500))
+        return {
+            "profiling_available": PYINSTRUMENT_AVAILABLE,
+            "sample_rate": PROFILE_SAMPLE_RATE,
+            "routes": PROFILE_ROUTES,
+            "force_header": "X-Profile-Request: 1",
+            "profiles": profiles,
+            "count": len(profiles)
+        }
+        
+    except Exception as e:
+        logger.error(f"Error listing request profiles: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to list profiles: {str(e)}")
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_request_profile(
+    profile_id: str,
+    current_user: User = Depends(require_admin)
+):
+    """Download a request profile (open in https://www.speedscope.app)"""
+    path = profile_store.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+@api_router.get("/admin/duplicates")
+async def get_duplicate_report(
+    item_type: str = "question",
+    threshold: Optional[float] = None,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_compatible_db)
+):
+    """Near-duplicate clusters across the whole question (or PYQ) bank"""
+    from near_duplicate_index import question_duplicate_index, pyq_duplicate_index, build_duplicate_report, DUPLICATE_THRESHOLD
+    
+    indexes = {"question": question_duplicate_index, "pyq": pyq_duplicate_index}
+    if item_type not in indexes:
+        raise HTTPException(status_code=400, detail="item_type must be 'question' or 'pyq'")
+    
+    try:
+        return await build_duplicate_report(db, indexes[item_type], threshold or DUPLICATE_THRESHOLD)
+    except Exception as e:
+        logger.error(f"Error building duplicate report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to build duplicate report: {str(e)}")
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(
     current_user: User = Depends(require_admin),
@@ -3559,7 +3729,7 @@ async def enhance_questions_with_pyq_frequency(
         for i in range(0, len(question_ids), batch_size):
             batch = question_ids[i:i + batch_size]
             
-            batch_result = await enhanced_question_processor.batch_process_questions(
+            batch_result = await get_enhanced_question_processor().batch_process_questions(
                 batch, db
             )
             processing_results.append(batch_result)
@@ -3596,7 +3766,7 @@ async def test_enhanced_session_logic(
         logger.info("Testing PHASE 1 enhanced session logic")
         
         # Create a test session using enhanced logic
-        session_result = await adaptive_session_logic.create_personalized_session(
+        session_result = await get_adaptive_session_logic().create_personalized_session(
             current_user.id, db
         )
         
@@ -3651,6 +3821,7 @@ async def test_enhanced_session_logic(
 
 # Background Tasks
 
+@track_enrichment_task("question")
 async def enrich_question_background(question_id: str, hint_category: str = None, hint_subcategory: str = None):
     """
     OPTION 2: Enhanced background task with comprehensive processing
@@ -3683,7 +3854,7 @@ async def enrich_question_background(question_id: str, hint_category: str = None
             try:
                 # Use the global LLM enrichment pipeline (already initialized with API key)
                 logger.info(f"Generating LLM solutions for: {question.stem[:50]}...")
-                enrichment_result = await llm_pipeline.complete_auto_generation(
+                enrichment_result = await get_llm_pipeline().complete_auto_generation(
                     stem=question.stem,
                     hint_category=hint_category,
                     hint_subcategory=hint_subcategory
@@ -3815,6 +3986,7 @@ async def process_pyq_document(ingestion_id: str, file_content: bytes):
             await db.commit()
             
             # Process Word document
+            from docx import Document
             doc = Document(io.BytesIO(file_content))
             
             # Extract text
@@ -3911,6 +4083,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# brotli / gzip for large JSON responses (ETags on cached reads get a per-coding suffix)
+app.add_middleware(CompressionMiddleware)
+
+# Sampled / admin-forced request profiling (pyinstrument, optional)
+app.add_middleware(RequestProfilerMiddleware)
+
+# Per-request query count / DB time (Server-Timing header, budget and N+1 warnings)
+install_query_listeners(engine)
+app.add_middleware(QueryMetricsMiddleware)
+
+# Prometheus metrics: per-route latency / in-flight requests, DB pool gauges (read at scrape time)
+register_database_pool(engine)
+app.add_middleware(HTTPMetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Prometheus text exposition (per worker); requires METRICS_TOKEN as a bearer token when it is set"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -3930,6 +4124,23 @@ async def startup_event():
     # Note: Topic creation can be done manually via admin interface
     logger.info("✅ Startup complete - Database ready")
     
+    # Taxonomy registry: canonical taxonomy plus subcategory aliases for non-canonical topics in the database
+    try:
+        from database import SessionLocal
+        sync_db = SessionLocal()
+        try:
+            taxonomy_registry.load_topic_aliases(sync_db)
+        finally:
+            sync_db.close()
+        logger.info(f"🗂️ Taxonomy registry v{taxonomy_registry.version} ready")
+    except Exception as e:
+        logger.error(f"Error loading taxonomy topic aliases: {e}")
+
+    # Type mastery rows keyed under a category the registry no longer resolves to (idempotent)
+    async for db in get_async_compatible_db():
+        await get_mastery_tracker().realign_type_mastery_categories(db)
+        break
+
     # Create diagnostic set if needed - DISABLED
     # async for db in get_async_compatible_db():
     #     await diagnostic_system.create_diagnostic_set(db)
@@ -3938,6 +4149,7 @@ async def startup_event():
     
     # Start background job processing
     if EMERGENT_LLM_KEY:
+        from background_jobs import start_background_processing
         start_background_processing(EMERGENT_LLM_KEY)
         logger.info("⏰ Background job processing started")
     else:
@@ -3950,9 +4162,11 @@ async def startup_event():
 async def shutdown_event():
     logger.info("🛑 CAT Preparation Platform v2.0 Shutting down...")
     
-    # Stop background job processing
-    stop_background_processing()
-    logger.info("⏰ Background job processing stopped")
+    # Stop background job processing (only started when EMERGENT_LLM_KEY is set)
+    if EMERGENT_LLM_KEY:
+        from background_jobs import stop_background_processing
+        stop_background_processing()
+        logger.info("⏰ Background job processing stopped")
     
     logger.info("✅ CAT Preparation Platform v2.0 Shutdown complete!")
 
@@ -3965,10 +4179,8 @@ async def create_initial_topics():
             if existing_topics.scalar_one_or_none():
                 break  # Topics already created
             
-            from llm_enrichment import CANONICAL_TAXONOMY
-            
             # Create main categories and subcategories
-            for category, subcategories in CANONICAL_TAXONOMY.items():
+            for category, subcategories in taxonomy_registry.taxonomy.items():
                 # Create main category
                 main_topic = Topic(
                     name=category,
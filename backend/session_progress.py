@@ -0,0 +1,207 @@
+"""
+Session Progress for CAT Preparation Platform
+Ordered session questions in the session_questions table: progress is an indexed lookup of the
+first unanswered position and answering marks a single row. Sessions created before the table
+existed (question ids only in the Session.units JSON) are migrated by the backfill, or lazily on
+first access.
+"""
+
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import select, insert, update, func, case, exists
+from sqlalchemy.exc import IntegrityError
+from database import Attempt, Session, SessionQuestion, SessionLocal, AsyncSession
+
+logger = logging.getLogger(__name__)
+
+
+def _unit_question_ids(session: Session) -> List[str]:
+    """Question ids from the legacy Session.units JSON"""
+    try:
+        units = json.loads(session.units) if isinstance(session.units, str) else (session.units or [])
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [str(question_id) for question_id in units if question_id]
+
+
+async def create_session_questions(db: AsyncSession, session_id: str, question_ids: List[str]):
+    """Insert the session's questions in order (caller commits)"""
+    if question_ids:
+        await db.execute(insert(SessionQuestion), [
+            {"session_id": session_id, "position": position, "question_id": str(question_id)}
+            for position, question_id in enumerate(question_ids, start=1)
+        ])
+
+
+async def get_session_progress(db: AsyncSession, session: Session, include_next_question: bool = True) -> Dict[str, Any]:
+    """
+    {"total", "answered", "next_position", "next_question_id"} for a session; next_* are None
+    once every question is answered (next_question_id is not looked up without include_next_question)
+    """
+    total, answered, next_position = (await db.execute(
+        select(
+            func.count(SessionQuestion.position),
+            func.count(SessionQuestion.answered_at),
+            func.min(case((SessionQuestion.answered_at.is_(None), SessionQuestion.position)))
+        )
+        .where(SessionQuestion.session_id == session.id)
+    )).one()
+
+    if not total and await _migrate_session(db, session):
+        return await get_session_progress(db, session, include_next_question)
+
+    next_question_id = None
+    if include_next_question and next_position is not None:
+        next_question_id = (await db.execute(
+            select(SessionQuestion.question_id)
+            .where(SessionQuestion.session_id == session.id, SessionQuestion.position == next_position)
+        )).scalar()
+
+    return {
+        "total": total or 0,
+        "answered": answered or 0,
+        "next_position": next_position,
+        "next_question_id": next_question_id
+    }
+
+
+async def record_session_answer(db: AsyncSession, session: Session, attempt: Attempt) -> bool:
+    """Mark the first unanswered position holding the attempt's question (caller commits); False if none"""
+    first_open = (
+        select(func.min(SessionQuestion.position))
+        .where(
+            SessionQuestion.session_id == session.id,
+            SessionQuestion.question_id == attempt.question_id,
+            SessionQuestion.answered_at.is_(None)
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(SessionQuestion)
+        .where(SessionQuestion.session_id == session.id, SessionQuestion.position == first_open)
+        .values(answered_at=attempt.created_at or datetime.utcnow(), attempt_id=attempt.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def _session_question_rows(session: Session, attempts: List[Attempt]) -> List[Dict[str, Any]]:
+    """
+    Rows for a legacy session: positions from Session.units, each answered by the earliest unused
+    attempt at that question within the session window (attempts ordered by created_at)
+    """
+    attempts_by_question: Dict[str, List[Attempt]] = {}
+    for attempt in attempts:
+        if attempt.created_at < session.started_at or (session.ended_at and attempt.created_at > session.ended_at):
+            continue
+        attempts_by_question.setdefault(str(attempt.question_id), []).append(attempt)
+
+    rows = []
+    for position, question_id in enumerate(_unit_question_ids(session), start=1):
+        queue = attempts_by_question.get(question_id)
+        attempt = queue.pop(0) if queue else None
+        rows.append({
+            "session_id": session.id,
+            "position": position,
+            "question_id": question_id,
+            "answered_at": attempt.created_at if attempt else None,
+            "attempt_id": attempt.id if attempt else None
+        })
+    return rows
+
+
+async def _migrate_session(db: AsyncSession, session: Session) -> bool:
+    """Create session_questions rows for one legacy session; False if it has no questions in units"""
+    question_ids = _unit_question_ids(session)
+    if not question_ids:
+        return False
+    attempts = (await db.execute(
+        select(Attempt)
+        .where(
+            Attempt.user_id == session.user_id,
+            Attempt.question_id.in_(question_ids),
+            Attempt.created_at >= session.started_at
+        )
+        .order_by(Attempt.created_at)
+    )).scalars().all()
+    try:
+        await db.execute(insert(SessionQuestion), _session_question_rows(session, attempts))
+        await db.commit()
+    except IntegrityError:
+        # Migrated concurrently by another request
+        await db.rollback()
+        return True
+    logger.info(f"Migrated session {session.id} to session_questions ({len(question_ids)} questions)")
+    return True
+
+
+async def backfill_session_questions(db: AsyncSession, batch_size: int = 500) -> Dict[str, Any]:
+    """
+    Create session_questions rows for every session that has question ids in Session.units but no rows yet,
+    a batch of sessions per transaction (attempts for the batch loaded in one query)
+    """
+    started = time.perf_counter()
+    sessions_migrated = 0
+    rows_written = 0
+    last_session_id = None
+
+    while True:
+        query = (
+            select(Session)
+            .where(
+                Session.units.is_not(None),
+                ~exists().where(SessionQuestion.session_id == Session.id)
+            )
+            .order_by(Session.id)
+            .limit(batch_size)
+        )
+        if last_session_id is not None:
+            query = query.where(Session.id > last_session_id)
+        sessions = (await db.execute(query)).scalars().all()
+        if not sessions:
+            break
+
+        user_ids = {session.user_id for session in sessions}
+        question_ids = {question_id for session in sessions for question_id in _unit_question_ids(session)}
+        attempts_by_user: Dict[str, List[Attempt]] = {}
+        if question_ids:
+            attempts = (await db.execute(
+                select(Attempt)
+                .where(
+                    Attempt.user_id.in_(user_ids),
+                    Attempt.question_id.in_(question_ids),
+                    Attempt.created_at >= min(session.started_at for session in sessions)
+                )
+                .order_by(Attempt.created_at)
+            )).scalars().all()
+            for attempt in attempts:
+                attempts_by_user.setdefault(attempt.user_id, []).append(attempt)
+
+        rows = []
+        for session in sessions:
+            session_rows = _session_question_rows(session, attempts_by_user.get(session.user_id, []))
+            rows.extend(session_rows)
+            sessions_migrated += 1 if session_rows else 0
+        if rows:
+            await db.execute(insert(SessionQuestion), rows)
+        await db.commit()
+
+        rows_written += len(rows)
+        last_session_id = sessions[-1].id
+
+    duration = round(time.perf_counter() - started, 3)
+    logger.info(f"Backfilled session_questions: {rows_written} rows for {sessions_migrated} sessions in {duration}s")
+    return {'sessions_migrated': sessions_migrated, 'rows_written': rows_written, 'duration_seconds': duration}
+
+
+def run_session_questions_backfill() -> Dict[str, Any]:
+    """Synchronous entry point for scripts/ and one-off maintenance"""
+    session = SessionLocal()
+    try:
+        return asyncio.run(backfill_session_questions(AsyncSession(session)))
+    finally:
+        session.close()
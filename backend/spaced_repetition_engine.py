@@ -5,11 +5,12 @@ Implements proper spaced review and mastery-based retry logic
 """
 
 import uuid
-from typing import Dict, List, Optional, Tuple
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
-from database import get_database, Question, Topic, Mastery, Attempt
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc, func, text
+from database import get_database, Question, Topic, Mastery, Attempt, ReviewSchedule, SessionLocal, AsyncSession, dialect_insert
+from sqlalchemy import select, and_, or_, desc, func, text, case
 import logging
 from formulas import (
     get_mastery_category,
@@ -44,112 +45,50 @@ class SpacedRepetitionEngine:
             "mastered": 0.85                  # >85% mastery - minimal review
         }
     
-    async def get_due_questions_for_review(self, db: AsyncSession, user_id: str) -> List[Dict]:
+    async def get_due_questions_for_review(self, db: AsyncSession, user_id: str, limit: int = 50) -> List[Dict]:
         """
         Get questions that are due for spaced repetition review
+        (range scan of the user's review schedule, most urgent first)
         """
         try:
-            # Get questions with attempt history for spaced review scheduling
-            due_questions_query = text("""
-                SELECT DISTINCT
-                    q.id,
-                    q.topic_id,
-                    q.stem,
-                    q.subcategory,
-                    q.difficulty_band,
-                    t.name as topic_name,
-                    t.category,
-                    m.mastery_pct,
-                    last_attempts.last_attempt_date,
-                    last_attempts.correct as last_correct,
-                    attempt_stats.total_attempts,
-                    attempt_stats.correct_attempts,
-                    attempt_stats.incorrect_count,
-                    attempt_stats.avg_accuracy
-                FROM questions q
-                JOIN topics t ON q.topic_id = t.id
-                LEFT JOIN mastery m ON t.id = m.topic_id AND m.user_id = :user_id
-                LEFT JOIN (
-                    SELECT 
-                        question_id,
-                        MAX(created_at) as last_attempt_date,
-                        BOOL_AND(correct) as correct
-                    FROM attempts 
-                    WHERE user_id = :user_id
-                    GROUP BY question_id
-                ) last_attempts ON q.id = last_attempts.question_id
-                LEFT JOIN (
-                    SELECT 
-                        question_id,
-                        COUNT(*) as total_attempts,
-                        SUM(CASE WHEN correct = true THEN 1 ELSE 0 END) as correct_attempts,
-                        SUM(CASE WHEN correct = false THEN 1 ELSE 0 END) as incorrect_count,
-                        AVG(CASE WHEN correct = true THEN 1.0 ELSE 0.0 END) as avg_accuracy
-                    FROM attempts 
-                    WHERE user_id = :user_id
-                    GROUP BY question_id
-                ) attempt_stats ON q.id = attempt_stats.question_id
-                WHERE q.is_active = true
-                AND last_attempts.last_attempt_date IS NOT NULL
-                ORDER BY last_attempts.last_attempt_date ASC
-            """)
-            
-            result = await db.execute(due_questions_query, {"user_id": user_id})
-            question_records = result.fetchall()
-            
-            due_questions = []
             now = datetime.utcnow()
-            
-            for record in question_records:
-                mastery_score = float(record.mastery_pct or 0)
-                last_attempt_date = datetime.fromisoformat(str(record.last_attempt_date))
-                total_attempts = record.total_attempts or 0
-                correct_attempts = record.correct_attempts or 0
-                incorrect_count = record.incorrect_count or 0
-                
-                # Determine review urgency based on mastery and performance
-                review_urgency = self.calculate_review_urgency(
-                    mastery_score, total_attempts, correct_attempts, record.last_correct
-                )
-                
-                # Calculate next review time based on spaced repetition
-                next_review_time = self.calculate_next_review_time(
-                    last_attempt_date, total_attempts, mastery_score, record.last_correct
+            result = await db.execute(
+                select(ReviewSchedule, Question, Topic.name.label('topic_name'), Topic.category.label('category'))
+                .join(Question, ReviewSchedule.question_id == Question.id)
+                .join(Topic, Question.topic_id == Topic.id)
+                .where(
+                    and_(
+                        ReviewSchedule.user_id == user_id,
+                        ReviewSchedule.next_review_at <= now,
+                        Question.is_active == True
+                    )
                 )
-                
-                # Check if question is due for review
-                is_due = now >= next_review_time
-                
-                # Special cases for immediate retry
-                if mastery_score < self.mastery_thresholds["needs_immediate_retry"]:
-                    is_due = True  # Always due if very low mastery
-                
-                if incorrect_count >= 2:
-                    is_due = True  # Always due if failed twice
-                
-                if is_due:
-                    due_questions.append({
-                        "id": str(record.id),
-                        "topic_id": str(record.topic_id),
-                        "topic_name": record.topic_name,
-                        "category": record.category,
-                        "subcategory": record.subcategory,
-                        "difficulty_band": record.difficulty_band,
-                        "mastery_score": mastery_score,
-                        "mastery_category": get_mastery_category(mastery_score),
-                        "review_urgency": review_urgency,
-                        "total_attempts": total_attempts,
-                        "correct_attempts": correct_attempts,
-                        "incorrect_count": incorrect_count,
-                        "last_attempt_date": last_attempt_date,
-                        "next_review_time": next_review_time,
-                        "last_correct": record.last_correct,
-                        "days_since_last_attempt": (now - last_attempt_date).days,
-                        "review_reason": self.get_review_reason(mastery_score, incorrect_count, total_attempts)
-                    })
+                .order_by(desc(ReviewSchedule.urgency), ReviewSchedule.next_review_at)
+                .limit(limit)
+            )
             
-            # Sort by review urgency (highest first)
-            due_questions.sort(key=lambda x: x["review_urgency"], reverse=True)
+            due_questions = []
+            for schedule, question, topic_name, category in result.all():
+                mastery_score = float(schedule.mastery_pct or 0)
+                due_questions.append({
+                    "id": str(question.id),
+                    "topic_id": str(question.topic_id),
+                    "topic_name": topic_name,
+                    "category": category,
+                    "subcategory": question.subcategory,
+                    "difficulty_band": question.difficulty_band,
+                    "mastery_score": mastery_score,
+                    "mastery_category": get_mastery_category(mastery_score),
+                    "review_urgency": float(schedule.urgency or 0),
+                    "total_attempts": schedule.total_attempts,
+                    "correct_attempts": schedule.correct_attempts,
+                    "incorrect_count": schedule.incorrect_count,
+                    "last_attempt_date": schedule.last_attempt_at,
+                    "next_review_time": schedule.next_review_at,
+                    "last_correct": schedule.last_correct,
+                    "days_since_last_attempt": (now - schedule.last_attempt_at).days,
+                    "review_reason": self.get_review_reason(mastery_score, schedule.incorrect_count, schedule.total_attempts)
+                })
             
             logger.info(f"Found {len(due_questions)} questions due for spaced review")
             return due_questions
@@ -158,6 +97,239 @@ class SpacedRepetitionEngine:
             logger.error(f"Error getting due questions for review: {e}")
             return []
     
+    def schedule_review(self, last_attempt_at: datetime, total_attempts: int, correct_attempts: int,
+                        incorrect_count: int, mastery_score: float, last_correct: bool) -> Tuple[datetime, float]:
+        """
+        Next review time and urgency for one user × question
+        """
+        urgency = self.calculate_review_urgency(mastery_score, total_attempts, correct_attempts, last_correct)
+        next_review_at = self.calculate_next_review_time(last_attempt_at, total_attempts, mastery_score, last_correct)
+        
+        # Always due if very low mastery or failed twice
+        if mastery_score < self.mastery_thresholds["needs_immediate_retry"] or incorrect_count >= 2:
+            next_review_at = last_attempt_at
+        
+        return next_review_at, urgency
+    
+    async def record_attempt(self, db: AsyncSession, attempt: Attempt) -> ReviewSchedule:
+        """
+        Update the review schedule row for the attempt's user × question (caller commits, in the
+        attempt's own transaction, so a committed attempt is never missing from the schedule)
+        """
+        topic_mastery = await db.execute(
+            select(Question.topic_id, Mastery.mastery_pct)
+            .outerjoin(Mastery, and_(Mastery.topic_id == Question.topic_id, Mastery.user_id == attempt.user_id))
+            .where(Question.id == attempt.question_id)
+        )
+        topic_row = topic_mastery.first()
+        topic_id = topic_row.topic_id if topic_row else None
+        mastery_score = float(topic_row.mastery_pct or 0) if topic_row else 0.0
+        
+        schedule_result = await db.execute(
+            select(ReviewSchedule).where(
+                and_(ReviewSchedule.user_id == attempt.user_id, ReviewSchedule.question_id == attempt.question_id)
+            )
+        )
+        schedule = schedule_result.scalar_one_or_none()
+        if not schedule:
+            schedule = ReviewSchedule(
+                user_id=attempt.user_id,
+                question_id=attempt.question_id,
+                total_attempts=0,
+                correct_attempts=0,
+                incorrect_count=0,
+                archived_attempts=0,
+                archived_correct_attempts=0
+            )
+            db.add(schedule)
+        
+        attempted_at = attempt.created_at or datetime.utcnow()
+        schedule.topic_id = topic_id
+        schedule.total_attempts = (schedule.total_attempts or 0) + 1
+        schedule.correct_attempts = (schedule.correct_attempts or 0) + (1 if attempt.correct else 0)
+        schedule.incorrect_count = (schedule.incorrect_count or 0) + (0 if attempt.correct else 1)
+        schedule.last_correct = bool(attempt.correct)
+        schedule.last_attempt_at = attempted_at
+        schedule.mastery_pct = mastery_score
+        schedule.next_review_at, urgency = self.schedule_review(
+            attempted_at, schedule.total_attempts, schedule.correct_attempts,
+            schedule.incorrect_count, mastery_score, schedule.last_correct
+        )
+        schedule.urgency = round(urgency, 3)
+        schedule.updated_at = datetime.utcnow()
+        return schedule
+    
+    async def backfill_review_schedule(self, db: AsyncSession, user_ids: Optional[List[str]] = None,
+                                       user_batch_size: int = 200) -> Dict[str, Any]:
+        """
+        Bring review schedule rows that are behind attempt history up to date, a batch of users per
+        transaction (all users with attempts, or just user_ids). Each row is upserted from the user's
+        live attempts plus its archived totals; rows already at or ahead of that are left alone, so
+        totals of archived attempts are kept and a concurrent record_attempt is never overwritten.
+        """
+        started = time.perf_counter()
+        users_processed = 0
+        rows_written = 0
+        last_user_id = None
+        pending_user_ids = sorted(user_ids) if user_ids is not None else None
+        
+        while True:
+            if pending_user_ids is not None:
+                batch_user_ids, pending_user_ids = pending_user_ids[:user_batch_size], pending_user_ids[user_batch_size:]
+            else:
+                users_query = select(Attempt.user_id).distinct().order_by(Attempt.user_id).limit(user_batch_size)
+                if last_user_id is not None:
+                    users_query = users_query.where(Attempt.user_id > last_user_id)
+                batch_user_ids = (await db.execute(users_query)).scalars().all()
+            if not batch_user_ids:
+                break
+            
+            rows = await self._schedule_rows_for_users(db, batch_user_ids)
+            if rows:
+                await db.execute(self._build_schedule_upsert(db), rows)
+            await db.commit()
+            
+            users_processed += len(batch_user_ids)
+            rows_written += len(rows)
+            last_user_id = batch_user_ids[-1]
+        
+        duration = round(time.perf_counter() - started, 3)
+        logger.info(f"Backfilled review schedule: {rows_written} rows for {users_processed} users in {duration}s")
+        return {'users_processed': users_processed, 'rows_written': rows_written, 'duration_seconds': duration}
+    
+    async def users_missing_review_history(self, db: AsyncSession) -> List[str]:
+        """
+        Users with a question whose live attempts are not all counted in its schedule row (no row, or
+        total_attempts below live attempts plus archived_attempts), e.g. from before the schedule existed
+        """
+        live = (
+            select(Attempt.user_id, Attempt.question_id, func.count(Attempt.id).label('attempts'))
+            .group_by(Attempt.user_id, Attempt.question_id)
+            .subquery('live_attempts')
+        )
+        result = await db.execute(
+            select(live.c.user_id)
+            .outerjoin(ReviewSchedule, and_(
+                ReviewSchedule.user_id == live.c.user_id,
+                ReviewSchedule.question_id == live.c.question_id
+            ))
+            .where(
+                live.c.attempts + func.coalesce(ReviewSchedule.archived_attempts, 0)
+                > func.coalesce(ReviewSchedule.total_attempts, 0)
+            )
+            .distinct()
+            .order_by(live.c.user_id)
+        )
+        return list(result.scalars().all())
+    
+    def _build_schedule_upsert(self, db: AsyncSession):
+        """
+        Executemany upsert of _schedule_rows_for_users rows: existing rows add their archived totals
+        and are only updated when that puts them ahead of their current total_attempts
+        """
+        upsert = dialect_insert(db, ReviewSchedule)
+        excluded = upsert.excluded
+        archived_attempts = func.coalesce(ReviewSchedule.archived_attempts, 0)
+        archived_correct = func.coalesce(ReviewSchedule.archived_correct_attempts, 0)
+        total_attempts = excluded.total_attempts + archived_attempts
+        correct_attempts = excluded.correct_attempts + archived_correct
+        return upsert.on_conflict_do_update(
+            index_elements=['user_id', 'question_id'],
+            set_={
+                'topic_id': excluded.topic_id,
+                'total_attempts': total_attempts,
+                'correct_attempts': correct_attempts,
+                'incorrect_count': total_attempts - correct_attempts,
+                'last_correct': excluded.last_correct,
+                'last_attempt_at': excluded.last_attempt_at,
+                'mastery_pct': excluded.mastery_pct,
+                'urgency': excluded.urgency,
+                'next_review_at': excluded.next_review_at,
+                'updated_at': excluded.updated_at
+            },
+            where=total_attempts > func.coalesce(ReviewSchedule.total_attempts, 0)
+        )
+    
+    async def _schedule_rows_for_users(self, db: AsyncSession, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """One grouped attempts query (plus the latest attempt's outcome) for a batch of users"""
+        in_batch = Attempt.user_id.in_(user_ids)
+        
+        totals = (
+            select(
+                Attempt.user_id,
+                Attempt.question_id,
+                func.count(Attempt.id).label('total_attempts'),
+                func.sum(case((Attempt.correct == True, 1), else_=0)).label('correct_attempts'),
+                func.max(Attempt.created_at).label('last_attempt_at')
+            )
+            .where(in_batch)
+            .group_by(Attempt.user_id, Attempt.question_id)
+            .subquery('attempt_totals')
+        )
+        
+        # Outcome of the latest attempt (ties on created_at count as correct if any was)
+        last_outcome = (
+            select(
+                Attempt.user_id,
+                Attempt.question_id,
+                func.max(case((Attempt.correct == True, 1), else_=0)).label('last_correct')
+            )
+            .join(totals, and_(
+                Attempt.user_id == totals.c.user_id,
+                Attempt.question_id == totals.c.question_id,
+                Attempt.created_at == totals.c.last_attempt_at
+            ))
+            .where(in_batch)
+            .group_by(Attempt.user_id, Attempt.question_id)
+            .subquery('last_outcome')
+        )
+        
+        result = await db.execute(
+            select(
+                totals.c.user_id,
+                totals.c.question_id,
+                totals.c.total_attempts,
+                totals.c.correct_attempts,
+                totals.c.last_attempt_at,
+                last_outcome.c.last_correct,
+                Question.topic_id,
+                Mastery.mastery_pct
+            )
+            .join(last_outcome, and_(
+                last_outcome.c.user_id == totals.c.user_id,
+                last_outcome.c.question_id == totals.c.question_id
+            ))
+            .join(Question, Question.id == totals.c.question_id)
+            .outerjoin(Mastery, and_(Mastery.user_id == totals.c.user_id, Mastery.topic_id == Question.topic_id))
+        )
+        
+        now = datetime.utcnow()
+        rows = []
+        for row in result:
+            total_attempts = int(row.total_attempts)
+            correct_attempts = int(row.correct_attempts or 0)
+            incorrect_count = total_attempts - correct_attempts
+            mastery_score = float(row.mastery_pct or 0)
+            last_correct = bool(row.last_correct)
+            next_review_at, urgency = self.schedule_review(
+                row.last_attempt_at, total_attempts, correct_attempts, incorrect_count, mastery_score, last_correct
+            )
+            rows.append({
+                'user_id': row.user_id,
+                'question_id': row.question_id,
+                'topic_id': row.topic_id,
+                'total_attempts': total_attempts,
+                'correct_attempts': correct_attempts,
+                'incorrect_count': incorrect_count,
+                'last_correct': last_correct,
+                'last_attempt_at': row.last_attempt_at,
+                'mastery_pct': mastery_score,
+                'urgency': round(urgency, 3),
+                'next_review_at': next_review_at,
+                'updated_at': now
+            })
+        return rows
+    
     def calculate_review_urgency(self, mastery_score: float, total_attempts: int, 
                                correct_attempts: int, last_correct: bool) -> float:
         """
@@ -384,4 +556,13 @@ class SpacedRepetitionEngine:
             
         except Exception as e:
             logger.error(f"Error getting mastery focused questions: {e}")
-            return []
\ No newline at end of file
+            return []
+
+
+def run_review_schedule_backfill() -> Dict[str, Any]:
+    """Synchronous entry point for scripts/ and one-off maintenance"""
+    session = SessionLocal()
+    try:
+        return asyncio.run(SpacedRepetitionEngine().backfill_review_schedule(AsyncSession(session)))
+    finally:
+        session.close()
@@ -11,6 +11,7 @@ import asyncio
 from typing import Tuple, Dict, Any, Optional, List
 from dotenv import load_dotenv
 from enrichment_schema_manager import enrichment_schema, quality_controller
+from metrics import track_llm_call
 
 logger = logging.getLogger(__name__)
 
@@ -173,7 +174,8 @@ CRITICAL REQUIREMENTS:
 - Use collaborative teaching tone throughout"""
             
             user_message = UserMessage(text=user_prompt)
-            response = await chat.send_message(user_message)
+            with track_llm_call("gemini", "gemini-2.0-flash", "generate_solution"):
+                response = await chat.send_message(user_message)
             
             # Validate response against schema
             validation = enrichment_schema.validate_enrichment_output(response)
@@ -297,7 +299,8 @@ EXPLANATION:
 Validate this solution against CAT preparation quality standards."""
                 
                 user_message = UserMessage(text=validation_request)
-                response = await chat.send_message(user_message)
+                with track_llm_call("anthropic", "claude-3-haiku-20240307", "validate_solution"):
+                    response = await chat.send_message(user_message)
                 
                 # Parse Anthropic assessment
                 assessment = self._parse_anthropic_validation(response)
@@ -320,10 +323,11 @@ Validate this solution against CAT preparation quality standards."""
                 
                 client = openai.OpenAI(api_key=self.openai_api_key)
                 
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": """You are an expert quality control specialist for CAT preparation content.
+                with track_llm_call("openai", "gpt-4o", "validate_solution") as llm_call:
+                    response = client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=[
+                            {"role": "system", "content": """You are an expert quality control specialist for CAT preparation content.
 
 📘 VALIDATION CRITERIA:
 
@@ -362,7 +366,7 @@ OVERALL_SCORE: [1-10]
 RECOMMENDATION: [Accept/Improve/Rewrite]
 SPECIFIC_FEEDBACK: [detailed suggestions or "None needed"]
 SCHEMA_COMPLIANCE: [Perfect/Good/Fair/Poor]"""},
-                        {"role": "user", "content": f"""Question: {question_stem}
+                            {"role": "user", "content": f"""Question: {question_stem}
 Answer: {answer}
 
 APPROACH:
@@ -375,9 +379,10 @@ EXPLANATION:
 {explanation}
 
 Validate this solution against CAT preparation quality standards."""}
-                    ],
-                    max_tokens=500
-                )
+                        ],
+                        max_tokens=500
+                    )
+                    llm_call.record_usage(response)
                 
                 response_text = response.choices[0].message.content
                 assessment = self._parse_anthropic_validation(response_text)
@@ -457,7 +462,8 @@ CRITICAL: Make APPROACH and EXPLANATION serve different purposes:
 Focus on the specific areas mentioned in the feedback."""
             
             user_message = UserMessage(text=user_prompt)
-            response = await chat.send_message(user_message)
+            with track_llm_call("gemini", "gemini-2.0-flash", "improve_solution"):
+                response = await chat.send_message(user_message)
             
             # Validate improved response
             validation = enrichment_schema.validate_enrichment_output(response)
@@ -573,7 +579,8 @@ Create a complete solution following the EXACT three-section schema:
 CRITICAL: Follow the schema EXACTLY. All three sections are mandatory."""
         
         user_message = UserMessage(text=user_prompt)
-        response = await chat.send_message(user_message)
+        with track_llm_call("gemini", "gemini-2.0-flash", "enrich_solution"):
+            response = await chat.send_message(user_message)
         
         # Validate response against schema
         validation = enrichment_schema.validate_enrichment_output(response)
@@ -638,14 +645,16 @@ Create a complete solution following the EXACT three-section schema:
 
 CRITICAL: Follow the schema EXACTLY. All three sections are mandatory."""
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=1500
-        )
+        with track_llm_call("openai", "gpt-4o", "enrich_solution") as llm_call:
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=1500
+            )
+            llm_call.record_usage(response)
         
         response_text = response.choices[0].message.content.strip()
         
@@ -774,7 +783,8 @@ Subcategory: {subcategory}
 
 Generate 3 plausible wrong answers. Return ONLY the JSON object.""")
                 
-                response = await chat.send_message(user_message)
+                with track_llm_call("gemini", "gemini-2.0-flash", "generate_options"):
+                    response = await chat.send_message(user_message)
                 
                 # Extract and validate JSON
                 start_idx = response.find('{')
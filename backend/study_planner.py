@@ -5,11 +5,11 @@ Implements 90-day planning with serving algorithms as per specification
 
 import json
 import uuid
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, date, timedelta
-from database import Plan, PlanUnit, User, Question, Topic, Mastery
+from database import Plan, PlanUnit, User, Question, Topic, Mastery, Attempt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc
+from sqlalchemy import select, and_, or_, desc, insert
 import logging
 
 logger = logging.getLogger(__name__)
@@ -73,190 +73,216 @@ class StudyPlanner:
             raise
     
     async def generate_plan_units(self, db: AsyncSession, plan: Plan, days_ahead: int):
-        """Generate plan units for the next N days"""
+        """Generate plan units for the next N days (questions for all days selected in one batch)"""
         try:
             config = self.track_configs[plan.track]
+            plan_dates = [plan.start_date + timedelta(days=day_offset) for day_offset in range(days_ahead)]
             
-            for day_offset in range(days_ahead):
-                plan_date = plan.start_date + timedelta(days=day_offset)
-                
-                # Skip if units already exist for this date
-                existing_result = await db.execute(
-                    select(PlanUnit).where(
-                        PlanUnit.plan_id == plan.id,
-                        PlanUnit.planned_for == plan_date
-                    )
+            # Skip dates that already have units
+            existing_result = await db.execute(
+                select(PlanUnit.planned_for).where(
+                    PlanUnit.plan_id == plan.id,
+                    PlanUnit.planned_for.in_(plan_dates)
                 )
-                if existing_result.scalar_one_or_none():
-                    continue
-                
-                # Determine daily time budget
-                is_weekend = plan_date.weekday() >= 5
-                daily_minutes = plan.daily_minutes_weekend if is_weekend else plan.daily_minutes_weekday
-                
-                # Generate units for this day
-                await self.generate_daily_units(db, plan, plan_date, daily_minutes, config)
+            )
+            existing_dates = set(existing_result.scalars().all())
+            plan_dates = [plan_date for plan_date in plan_dates if plan_date not in existing_dates]
+            if not plan_dates:
+                return
             
-        except Exception as e:
-            logger.error(f"Error generating plan units: {e}")
-            raise
-    
-    async def generate_daily_units(self, db: AsyncSession, plan: Plan, plan_date: date, 
-                                 daily_minutes: int, config: Dict[str, Any]):
-        """Generate plan units for a specific day"""
-        try:
             # Get topics that need coverage
             topics_result = await db.execute(select(Topic).where(Topic.parent_id.isnot(None)))
             topics = topics_result.scalars().all()
+            if not topics:
+                logger.warning(f"No subtopics available, skipping plan units for plan {plan.id}")
+                return
             
-            # Simple algorithm: rotate through topics with different unit kinds
-            day_number = (plan_date - plan.start_date).days
-            topic_index = day_number % len(topics)
-            selected_topic = topics[topic_index]
-            
-            # Determine unit kind based on day pattern
-            unit_kinds = ["practice", "examples", "practice", "review", "practice"]
-            unit_kind = unit_kinds[day_number % len(unit_kinds)]
-            
-            # Calculate target count based on time budget
-            avg_time_per_question = 3  # minutes
-            target_count = max(1, daily_minutes // avg_time_per_question)
-            
-            # Get questions for payload
-            questions_payload = await self.select_questions_for_unit(
-                db, plan.user_id, selected_topic.id, unit_kind, target_count, config
-            )
-            
-            # Create plan unit
-            plan_unit = PlanUnit(
-                plan_id=plan.id,
-                planned_for=plan_date,
-                topic_id=selected_topic.id,
-                unit_kind=unit_kind,
-                target_count=target_count,
-                generated_payload={"question_ids": questions_payload},
-                status="pending"
-            )
-            
-            db.add(plan_unit)
+            units = []
+            for plan_date in plan_dates:
+                # Determine daily time budget
+                is_weekend = plan_date.weekday() >= 5
+                daily_minutes = plan.daily_minutes_weekend if is_weekend else plan.daily_minutes_weekday
+                units.append(self.build_daily_unit(plan, plan_date, daily_minutes, topics))
+            
+            selections = await self.select_questions_for_units(db, plan.user_id, units, config)
+            
+            now = datetime.utcnow()
+            await db.execute(insert(PlanUnit), [
+                {
+                    'id': str(uuid.uuid4()),
+                    'plan_id': plan.id,
+                    'planned_for': unit['planned_for'],
+                    'topic_id': unit['topic_id'],
+                    'unit_kind': unit['unit_kind'],
+                    'target_count': unit['target_count'],
+                    'generated_payload': {"question_ids": question_ids},
+                    'status': "pending",
+                    'actual_stats': {},
+                    'created_at': now
+                }
+                for unit, question_ids in zip(units, selections)
+            ])
             
         except Exception as e:
-            logger.error(f"Error generating daily units: {e}")
+            logger.error(f"Error generating plan units: {e}")
             raise
     
+    def build_daily_unit(self, plan: Plan, plan_date: date, daily_minutes: int, topics: List[Topic]) -> Dict[str, Any]:
+        """Topic, unit kind and target count for one day"""
+        # Simple algorithm: rotate through topics with different unit kinds
+        day_number = (plan_date - plan.start_date).days
+        selected_topic = topics[day_number % len(topics)]
+        
+        # Determine unit kind based on day pattern
+        unit_kinds = ["practice", "examples", "practice", "review", "practice"]
+        unit_kind = unit_kinds[day_number % len(unit_kinds)]
+        
+        # Calculate target count based on time budget
+        avg_time_per_question = 3  # minutes
+        target_count = max(1, daily_minutes // avg_time_per_question)
+        
+        return {
+            'planned_for': plan_date,
+            'topic_id': selected_topic.id,
+            'unit_kind': unit_kind,
+            'target_count': target_count
+        }
+    
     async def select_questions_for_unit(self, db: AsyncSession, user_id: str, topic_id: str,
                                       unit_kind: str, target_count: int, config: Dict[str, Any]) -> List[str]:
         """
         Select questions for a plan unit using serving algorithm
         Balances: Importance + Fit + Coverage + Retries
         """
+        unit = {'topic_id': topic_id, 'unit_kind': unit_kind, 'target_count': target_count}
+        selections = await self.select_questions_for_units(db, user_id, [unit], config)
+        return selections[0]
+    
+    async def select_questions_for_units(self, db: AsyncSession, user_id: str,
+                                       units: List[Dict[str, Any]], config: Dict[str, Any]) -> List[List[str]]:
+        """
+        Select questions for many plan units at once: one mastery query, one candidate
+        query for all their topics and one attempt-history query, then the serving
+        algorithm runs in memory per unit. Returns question ids per unit, in unit order.
+        """
         try:
-            # Get user's mastery for this topic
+            topic_ids = sorted({unit['topic_id'] for unit in units})
+            if not topic_ids:
+                return [[] for _ in units]
+            
+            # Get user's mastery for these topics
             mastery_result = await db.execute(
-                select(Mastery).where(
+                select(Mastery.topic_id, Mastery.mastery_pct).where(
                     Mastery.user_id == user_id,
-                    Mastery.topic_id == topic_id
+                    Mastery.topic_id.in_(topic_ids)
                 )
             )
-            mastery = mastery_result.scalar_one_or_none()
-            
-            # Determine difficulty distribution based on mastery and track
-            difficulty_dist = config["difficulty_distribution"]
-            
-            if mastery:
-                # Adjust distribution based on mastery level
-                if mastery.mastery_pct < 0.3:  # Low mastery - more easy questions
-                    difficulty_dist = {"Easy": 0.6, "Medium": 0.3, "Difficult": 0.1}
-                elif mastery.mastery_pct > 0.7:  # High mastery - more difficult questions
-                    difficulty_dist = {"Easy": 0.2, "Medium": 0.3, "Difficult": 0.5}
-            
-            # Select questions by difficulty
-            selected_questions = []
-            
-            for difficulty, ratio in difficulty_dist.items():
-                needed_count = int(target_count * ratio)
-                if needed_count == 0:
-                    continue
+            mastery_by_topic = {topic_id: mastery_pct for topic_id, mastery_pct in mastery_result.all()}
+            
+            # Active candidates for all topics, best importance first (excluding broken images)
+            candidates_result = await db.execute(
+                select(Question.id, Question.topic_id, Question.difficulty_band).where(
+                    Question.topic_id.in_(topic_ids),
+                    Question.is_active == True,
+                    ~Question.tags.contains("broken_image")
+                ).order_by(desc(Question.importance_index))
+            )
+            by_topic: Dict[str, List[str]] = {}
+            by_topic_band: Dict[Tuple[str, str], List[str]] = {}
+            for question_id, topic_id, difficulty_band in candidates_result.all():
+                by_topic.setdefault(topic_id, []).append(str(question_id))
+                by_topic_band.setdefault((topic_id, difficulty_band), []).append(str(question_id))
+            
+            attempt_history = await self.load_attempt_history(db, user_id, topic_ids)
+            now = datetime.utcnow()
+            
+            selections = []
+            for unit in units:
+                topic_id = unit['topic_id']
+                target_count = unit['target_count']
+                difficulty_dist = self.get_difficulty_distribution(config, mastery_by_topic.get(topic_id))
                 
-                # Get questions of this difficulty for the topic (excluding broken images)
-                questions_result = await db.execute(
-                    select(Question).where(
-                        Question.topic_id == topic_id,
-                        Question.difficulty_band == difficulty,
-                        Question.is_active == True,
-                        # Exclude questions with broken images
-                        ~Question.tags.any("broken_image")
-                    ).order_by(desc(Question.importance_index)).limit(needed_count * 2)  # Get extras for filtering
-                )
-                questions = questions_result.scalars().all()
+                # Select questions by difficulty
+                selected_questions = []
+                for difficulty, ratio in difficulty_dist.items():
+                    needed_count = int(target_count * ratio)
+                    if needed_count == 0:
+                        continue
+                    
+                    # Top candidates of this difficulty (extras for filtering), minus those still in retry cooldown
+                    candidates = by_topic_band.get((topic_id, difficulty), [])[:needed_count * 2]
+                    available = [
+                        question_id for question_id in candidates
+                        if self.is_available_for_retry(attempt_history.get(question_id), now)
+                    ]
+                    selected_questions.extend(available[:needed_count])
                 
-                # Filter based on retry intervals and select best
-                filtered_questions = await self.filter_questions_by_attempts(
-                    db, user_id, questions, needed_count
-                )
+                # Fill remaining slots with any available questions by importance
+                if len(selected_questions) < target_count:
+                    already_selected = set(selected_questions)
+                    for question_id in by_topic.get(topic_id, []):
+                        if len(selected_questions) >= target_count:
+                            break
+                        if question_id not in already_selected:
+                            selected_questions.append(question_id)
+                            already_selected.add(question_id)
                 
-                selected_questions.extend([str(q.id) for q in filtered_questions[:needed_count]])
-            
-            # Fill remaining slots if needed
-            while len(selected_questions) < target_count:
-                # Get any available questions (excluding broken images)
-                remaining_result = await db.execute(
-                    select(Question).where(
-                        Question.topic_id == topic_id,
-                        Question.is_active == True,
-                        # Exclude questions with broken images
-                        ~Question.tags.any("broken_image"),
-                        ~Question.id.in_([uuid.UUID(qid) for qid in selected_questions])
-                    ).order_by(desc(Question.importance_index)).limit(1)
-                )
-                remaining_q = remaining_result.scalar_one_or_none()
-                if remaining_q:
-                    selected_questions.append(str(remaining_q.id))
-                else:
-                    break
+                selections.append(selected_questions[:target_count])
             
-            return selected_questions[:target_count]
+            return selections
             
         except Exception as e:
             logger.error(f"Error selecting questions: {e}")
-            return []
+            return [[] for _ in units]
+    
+    def get_difficulty_distribution(self, config: Dict[str, Any], mastery_pct: Optional[float]) -> Dict[str, float]:
+        """Track distribution, adjusted for the user's mastery of the topic"""
+        if mastery_pct is not None:
+            if mastery_pct < 0.3:  # Low mastery - more easy questions
+                return {"Easy": 0.6, "Medium": 0.3, "Difficult": 0.1}
+            elif mastery_pct > 0.7:  # High mastery - more difficult questions
+                return {"Easy": 0.2, "Medium": 0.3, "Difficult": 0.5}
+        return config["difficulty_distribution"]
+    
+    async def load_attempt_history(self, db: AsyncSession, user_id: str,
+                                   topic_ids: Optional[List[str]] = None) -> Dict[str, Tuple[int, bool, datetime]]:
+        """Latest (attempt_no, correct, created_at) per attempted question, optionally limited to topics"""
+        query = (
+            select(Attempt.question_id, Attempt.attempt_no, Attempt.correct, Attempt.created_at)
+            .where(Attempt.user_id == user_id)
+            .order_by(Attempt.created_at)
+        )
+        if topic_ids is not None:
+            query = query.join(Question, Attempt.question_id == Question.id).where(Question.topic_id.in_(topic_ids))
+        
+        result = await db.execute(query)
+        # Ordered by time, so the last row per question wins
+        return {
+            str(question_id): (attempt_no, correct, created_at)
+            for question_id, attempt_no, correct, created_at in result.all()
+        }
+    
+    def is_available_for_retry(self, last_attempt: Optional[Tuple[int, bool, datetime]], now: datetime) -> bool:
+        """Never attempted, or enough time has passed since the last attempt"""
+        if last_attempt is None:
+            return True
+        attempt_no, correct, created_at = last_attempt
+        days_since_attempt = (now - created_at).days
+        return days_since_attempt >= self.get_retry_interval(attempt_no, correct)
     
     async def filter_questions_by_attempts(self, db: AsyncSession, user_id: str, 
                                          questions: List[Question], needed_count: int) -> List[Question]:
         """Filter questions based on attempt history and retry intervals"""
         try:
-            from database import Attempt
-            
-            available_questions = []
-            
-            for question in questions:
-                # Check user's attempt history for this question
-                attempts_result = await db.execute(
-                    select(Attempt).where(
-                        Attempt.user_id == user_id,
-                        Attempt.question_id == question.id
-                    ).order_by(desc(Attempt.created_at))
-                )
-                attempts = attempts_result.scalars().all()
-                
-                if not attempts:
-                    # Never attempted - always available
-                    available_questions.append(question)
-                    continue
-                
-                last_attempt = attempts[0]
-                days_since_attempt = (datetime.utcnow() - last_attempt.created_at).days
-                
-                # Check if enough time has passed for retry
-                retry_interval = self.get_retry_interval(last_attempt.attempt_no, last_attempt.correct)
-                
-                if days_since_attempt >= retry_interval:
-                    available_questions.append(question)
-                
-                if len(available_questions) >= needed_count * 2:  # Have enough options
-                    break
-            
-            return available_questions
+            topic_ids = list({question.topic_id for question in questions})
+            attempt_history = await self.load_attempt_history(db, user_id, topic_ids)
+            now = datetime.utcnow()
+            
+            available_questions = [
+                question for question in questions
+                if self.is_available_for_retry(attempt_history.get(str(question.id)), now)
+            ]
+            return available_questions[:needed_count * 2]  # Have enough options
             
         except Exception as e:
             logger.error(f"Error filtering questions by attempts: {e}")
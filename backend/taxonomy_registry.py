@@ -0,0 +1,240 @@
+"""
+Canonical Taxonomy Registry for CAT Preparation Platform
+Single source of the Category → Subcategory → Type taxonomy, compiled once into interned names,
+dict lookups (category by subcategory, type validation) and ordinal ids usable as array indexes,
+with a version number that caches can key on
+"""
+
+import sys
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Updated Canonical Taxonomy Structure (from CSV document)
+CANONICAL_TAXONOMY = {
+    "Arithmetic": {
+        "Time-Speed-Distance": ["Basics", "Relative Speed", "Circular Track Motion", "Boats and Streams", "Trains", "Races"],
+        "Time-Work": ["Work Time Effeciency", "Pipes and Cisterns", "Work Equivalence"],
+        "Ratios and Proportions": ["Simple Rations", "Compound Ratios", "Direct and Inverse Variation", "Partnerships"],
+        "Percentages": ["Basics", "Percentage Change", "Successive Percentage Change"],
+        "Averages and Alligation": ["Basic Averages", "Weighted Averages", "Alligations & Mixtures", "Three Mixture Alligations"],
+        "Profit-Loss-Discount": ["Basics", "Successive Profit/Loss/Discounts", "Marked Price and Cost Price Relations", "Discount Chains"],
+        "Simple and Compound Interest": ["Basics", "Difference between Simple Interest and Compound Interests", "Fractional Time Period Compound Interest"],
+        "Mixtures and Solutions": ["Replacements", "Concentration Change", "Solid-Liquid-Gas Mixtures"],
+        "Partnerships": ["Profit share"]
+    },
+    "Algebra": {
+        "Linear Equations": ["Two variable systems", "Three variable systems", "Dependent and Inconsistent Systems"],
+        "Quadratic Equations": ["Roots & Nature of Roots", "Sum and Product of Roots", "Maximum and Minimum Values"],
+        "Inequalities": ["Linear Inequalities", "Quadratic Inequalities", "Modulus and Absolute Value", "Arithmetic Mean", "Geometric Mean", "Cauchy Schwarz"],
+        "Progressions": ["Arithmetic Progression", "Geometric Progression", "Harmonic Progression", "Mixed Progressions"],
+        "Functions and Graphs": ["Linear Functions", "Quadratic Functions", "Polynomial Functions", "Modulus Functions", "Step Functions", "Transformations", "Domain Range", "Composition and Inverse Functions"],
+        "Logarithms and Exponents": ["Basics", "Change of Base Formula", "Soliving Log Equations", "Surds and Indices"],
+        "Special Algebraic Identities": ["Expansion and Factorisation", "Cubes and Squares", "Binomial Theorem"],
+        "Maxima and Minima": ["Optimsation with Algebraic Expressions"],
+        "Special Polynomials": ["Remainder Theorem", "Factor Theorem"]
+    },
+    "Geometry and Mensuration": {
+        "Triangles": ["Properties (Angles, Sides, Medians, Bisectors)", "Congruence & Similarity", "Pythagoras & Converse", "Inradius, Circumradius, Orthocentre"],
+        "Circles": ["Tangents & Chords", "Angles in a Circle", "Cyclic Quadrilaterals"],
+        "Polygons": ["Regular Polygons", "Interior / Exterior Angles"],
+        "Coordinate Geometry": ["Distance", "Section Formula", "Midpoint", "Equation of a line", "Slope & Intercepts", "Circles in Coordinate Plane", "Parabola", "Ellipse", "Hyperbola"],
+        "Mensuration 2D": ["Area Triangle", "Area Rectangle", "Area Trapezium", "Area Circle", "Sector"],
+        "Mensuration 3D": ["Volume Cubes", "Volume Cuboid", "Volume Cylinder", "Volume Cone", "Volume Sphere", "Volume Hemisphere", "Surface Areas"],
+        "Trigonometry": ["Heights and Distances", "Basic Trigonometric Ratios"]
+    },
+    "Number System": {
+        "Divisibility": ["Basic Divisibility Rules", "Factorisation of Integers"],
+        "HCF-LCM": ["Euclidean Algorithm", "Product of HCF and LCM"],
+        "Remainders": ["Basic Remainder Theorem", "Chinese Remainder Theorem", "Cyclicity of Remainders (Last Digits)", "Cyclicity of Remainders (Last Two Digits)"],
+        "Base Systems": ["Conversion between bases", "Arithmetic in different bases"],
+        "Digit Properties": ["Sum of Digits", "Last Digit Patterns", "Palindromes", "Repetitive Digits"],
+        "Number Properties": ["Perfect Squares", "Perfect Cubes"],
+        "Number Series": ["Sum of Squares", "Sum of Cubes", "Telescopic Series"],
+        "Factorials": ["Properties of Factorials"]
+    },
+    "Modern Math": {
+        "Permutation-Combination": ["Basics", "Circular Permutations", "Permutations with Repetitions", "Permutations with Restrictions", "Combinations with Repetitions", "Combinations with Restrictions"],
+        "Probability": ["Classical Probability", "Conditional Probability", "Bayes' Theorem"],
+        "Set Theory and Venn Diagram": ["Union and Intersection", "Complement and Difference of Sets", "Multi Set Problems"]
+    }
+}
+
+# Topic.category letter codes
+CATEGORY_CODES = {
+    "Arithmetic": "A",
+    "Algebra": "B",
+    "Geometry and Mensuration": "C",
+    "Number System": "D",
+    "Modern Math": "E"
+}
+
+# Legacy compatibility mapping for old subcategory names
+LEGACY_SUBCATEGORY_CATEGORIES = {
+    "Time–Speed–Distance (TSD)": "Arithmetic",
+    "Time & Work": "Arithmetic",
+    "Speed-Time-Distance": "Arithmetic",
+    "Basic Arithmetic": "Arithmetic",
+    "Powers and Roots": "Algebra",
+    "Lines and Angles": "Geometry and Mensuration",
+    "Perimeter and Area": "Geometry and Mensuration",
+    "Basic Operations": "Number System",
+    "HCF–LCM": "Number System",
+    "Remainders & Modular Arithmetic": "Number System",
+    "Permutation–Combination (P&C)": "Modern Math",
+    "Set Theory & Venn Diagrams": "Modern Math"
+}
+
+DEFAULT_CATEGORY = "Arithmetic"
+
+
+class TaxonomyRegistry:
+    """
+    Compiled taxonomy. Names are interned; categories, subcategories and (subcategory, type) pairs
+    get dense ordinal ids in canonical order, so per-user stats can live in plain lists indexed by id.
+    `version` increases whenever the compiled content changes (e.g. new topic aliases from the database).
+    """
+
+    def __init__(self, taxonomy: Dict[str, Dict[str, List[str]]], aliases: Optional[Dict[str, str]] = None):
+        self.version = 0
+        self._lock = threading.Lock()
+        self._compile(taxonomy, aliases or {})
+
+    def _compile(self, taxonomy: Dict[str, Dict[str, List[str]]], aliases: Dict[str, str]):
+        intern = sys.intern
+        categories, subcategories, types = [], [], []
+        subcategory_category_ids, type_subcategory_ids = [], []
+        category_of, types_of, subcategories_of = {}, {}, {}
+
+        for category, category_subcategories in taxonomy.items():
+            category = intern(category)
+            category_id = len(categories)
+            categories.append(category)
+            names = []
+            for subcategory, subcategory_types in category_subcategories.items():
+                subcategory = intern(subcategory)
+                subcategory_id = len(subcategories)
+                subcategories.append(subcategory)
+                subcategory_category_ids.append(category_id)
+                category_of[subcategory] = category
+                names.append(subcategory)
+                type_names = []
+                for type_name in subcategory_types:
+                    type_name = intern(type_name)
+                    types.append((subcategory, type_name))
+                    type_subcategory_ids.append(subcategory_id)
+                    type_names.append(type_name)
+                types_of[subcategory] = tuple(type_names)
+            subcategories_of[category] = tuple(names)
+
+        resolved = dict(category_of)
+        for alias, category in aliases.items():
+            if category in subcategories_of:
+                resolved.setdefault(intern(alias), category)
+
+        fingerprint = hashlib.sha256(repr((taxonomy, sorted(resolved.items()))).encode("utf-8")).hexdigest()[:16]
+
+        with self._lock:
+            self.taxonomy = taxonomy
+            self.aliases = dict(aliases)
+            self.categories: Tuple[str, ...] = tuple(categories)
+            self.subcategories: Tuple[str, ...] = tuple(subcategories)
+            self.types: Tuple[Tuple[str, str], ...] = tuple(types)
+            self.subcategory_category_ids: Tuple[int, ...] = tuple(subcategory_category_ids)
+            self.type_subcategory_ids: Tuple[int, ...] = tuple(type_subcategory_ids)
+            self.category_ids = {name: index for index, name in enumerate(categories)}
+            self.subcategory_ids = {name: index for index, name in enumerate(subcategories)}
+            self.type_ids = {pair: index for index, pair in enumerate(types)}
+            self.subcategories_by_category: Dict[str, Tuple[str, ...]] = subcategories_of
+            self.types_by_subcategory: Dict[str, Tuple[str, ...]] = types_of
+            self._category_of = category_of
+            self._resolved_category_of = resolved
+            self._type_sets = {subcategory: frozenset(names) for subcategory, names in types_of.items()}
+            self._interned = {name: name for name in (*categories, *subcategories, *(t for _, t in types), *resolved)}
+            if fingerprint != getattr(self, "fingerprint", None):
+                self.fingerprint = fingerprint
+                self.version += 1
+
+    # Lookups
+
+    def intern(self, name: Optional[str]) -> Optional[str]:
+        """The registry's interned instance of a known name (identity comparisons and shared dict keys)"""
+        if name is None:
+            return None
+        return self._interned.get(name, name)
+
+    def category_of(self, subcategory: Optional[str]) -> Optional[str]:
+        """Canonical category of a canonical subcategory; None otherwise"""
+        return self._category_of.get(subcategory)
+
+    def resolve_category(self, subcategory: Optional[str], default: str = DEFAULT_CATEGORY) -> str:
+        """Category for any subcategory name: canonical, then legacy / database aliases, then default"""
+        if not subcategory:
+            return default
+        return self._resolved_category_of.get(subcategory, default)
+
+    def is_valid_type(self, subcategory: Optional[str], type_of_question: Optional[str]) -> bool:
+        type_names = self._type_sets.get(subcategory)
+        return type_names is not None and type_of_question in type_names
+
+    def is_valid(self, category: Optional[str], subcategory: Optional[str], type_of_question: Optional[str]) -> bool:
+        """True for a canonical (category, subcategory, type) triple"""
+        return self._category_of.get(subcategory) == category and self.is_valid_type(subcategory, type_of_question)
+
+    def category_id(self, category: Optional[str]) -> Optional[int]:
+        return self.category_ids.get(category)
+
+    def subcategory_id(self, subcategory: Optional[str]) -> Optional[int]:
+        return self.subcategory_ids.get(subcategory)
+
+    def type_id(self, subcategory: Optional[str], type_of_question: Optional[str]) -> Optional[int]:
+        return self.type_ids.get((subcategory, type_of_question))
+
+    def category_code(self, category: Optional[str]) -> Optional[str]:
+        """Topic.category letter (A-E) for a canonical category"""
+        return CATEGORY_CODES.get(category)
+
+    def category_label(self, category: str) -> str:
+        """Display label in the "A-Arithmetic" format"""
+        code = CATEGORY_CODES.get(category)
+        return f"{code}-{category}" if code else category
+
+    # Database topics
+
+    def load_topic_aliases(self, db) -> int:
+        """
+        Add subcategory → category aliases for non-canonical topics in the topics table (child topics
+        of a canonical category, or topics carrying a category letter). Returns the aliases added.
+        """
+        from sqlalchemy import select
+        from sqlalchemy.orm import aliased
+        from database import Topic
+
+        parent = aliased(Topic)
+        rows = db.execute(
+            select(Topic.name, Topic.category, parent.name)
+            .outerjoin(parent, Topic.parent_id == parent.id)
+        ).all()
+
+        category_by_code = {code: category for category, code in CATEGORY_CODES.items()}
+        aliases = dict(self.aliases)
+        added = 0
+        for name, code, parent_name in rows:
+            if not name or name in self._resolved_category_of or name in self.subcategories_by_category:
+                continue
+            category = parent_name if parent_name in self.subcategories_by_category else category_by_code.get(code)
+            if category and name not in aliases:
+                aliases[name] = category
+                added += 1
+
+        if added:
+            self._compile(self.taxonomy, aliases)
+            logger.info(f"🗂️ Taxonomy registry v{self.version}: {added} topic aliases loaded from the database")
+        return added
+
+
+# Shared registry, compiled once at import
+taxonomy_registry = TaxonomyRegistry(CANONICAL_TAXONOMY, LEGACY_SUBCATEGORY_CATEGORIES)
@@ -5,13 +5,23 @@ Handles 20 years of PYQ data with emphasis on the last 10 years
 
 import logging
 import math
-from typing import Dict, List, Optional, Any, NamedTuple
+from typing import Dict, List, Optional, Any, NamedTuple, Sequence, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+RECENCY_DECAY_RATE = 0.15  # Steeper decay for recency
+
+TREND_ADJUSTMENTS = {
+    "increasing": 1.2,    # Boost increasing trends
+    "emerging": 1.3,      # Boost new/emerging topics
+    "stable": 1.0,        # No adjustment
+    "decreasing": 0.9,    # Slight penalty for decreasing
+    "declining": 0.8      # Penalty for declining topics
+}
+
 @dataclass
 class TemporalFrequencyConfig:
     """Configuration for time-weighted frequency analysis"""
@@ -66,6 +76,7 @@ class TimeWeightedFrequencyAnalyzer:
     def __init__(self, config: TemporalFrequencyConfig = CAT_ANALYSIS_CONFIG):
         self.config = config
         self.current_year = datetime.now().year
+        self._decay_weight_cache: Dict[Tuple[int, ...], Tuple[np.ndarray, np.ndarray]] = {}
         
     def calculate_time_weighted_frequency(
         self, 
@@ -222,7 +233,7 @@ class TimeWeightedFrequencyAnalyzer:
                     continue
                     
                 years_ago = self.current_year - year
-                recency_weight = math.exp(-0.15 * years_ago)  # Steeper decay for recency
+                recency_weight = math.exp(-RECENCY_DECAY_RATE * years_ago)
                 weighted_recency_sum += count * recency_weight
             
             # Normalize by total occurrences
@@ -239,15 +250,164 @@ class TimeWeightedFrequencyAnalyzer:
         """
         Get multiplier based on trend direction
         """
-        adjustments = {
-            "increasing": 1.2,    # Boost increasing trends
-            "emerging": 1.3,      # Boost new/emerging topics
-            "stable": 1.0,        # No adjustment
-            "decreasing": 0.9,    # Slight penalty for decreasing
-            "declining": 0.8      # Penalty for declining topics
+        return TREND_ADJUSTMENTS.get(trend_direction, 1.0)
+    
+    def build_occurrence_matrix(
+        self,
+        yearly_occurrences_by_key: Dict[str, Dict[int, int]]
+    ) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Stack {key: {year: count}} dicts into (keys, years, keys × years count matrix)
+        """
+        keys = list(yearly_occurrences_by_key.keys())
+        years = np.array(sorted({year for yearly in yearly_occurrences_by_key.values() for year in yearly}), dtype=np.int64)
+        year_index = {int(year): column for column, year in enumerate(years)}
+        
+        occurrences = np.zeros((len(keys), len(years)), dtype=np.float64)
+        for row, key in enumerate(keys):
+            for year, count in yearly_occurrences_by_key[key].items():
+                occurrences[row, year_index[year]] = count
+        
+        return keys, years, occurrences
+    
+    def _decay_weights(self, years: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Frequency and recency decay weights per year column, computed once per year set"""
+        cache_key = tuple(int(year) for year in years)
+        weights = self._decay_weight_cache.get(cache_key)
+        if weights is None:
+            years_ago = (self.current_year - years).astype(np.float64)
+            weights = (np.exp(-self.config.decay_rate * years_ago), np.exp(-RECENCY_DECAY_RATE * years_ago))
+            self._decay_weight_cache[cache_key] = weights
+        return weights
+    
+    def calculate_time_weighted_frequency_batch(
+        self,
+        occurrences: np.ndarray,
+        years: Sequence[int],
+        total_pyq_per_year: Dict[int, int]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Vectorized calculate_time_weighted_frequency for every row of a (rows × years)
+        occurrence matrix, e.g. subcategories × exam years.
+        
+        A zero cell is treated as a year absent from that row's {year: count} dict,
+        which is how the dicts are built from grouped PYQ counts. Returns one array per
+        key of the scalar result (trend_direction as an object array of strings).
+        """
+        occurrences = np.asarray(occurrences, dtype=np.float64)
+        years = np.asarray(years, dtype=np.int64)
+        present = occurrences != 0
+        past = years <= self.current_year
+        
+        decay_weights, recency_weights = self._decay_weights(years)
+        relevance_cutoff_year = self.current_year - self.config.relevance_window_years
+        in_relevance_window = years >= relevance_cutoff_year
+        
+        # Normalize by total questions that year (default 100, zero totals give 0)
+        totals = np.array([total_pyq_per_year.get(int(year), 100) for year in years], dtype=np.float64)
+        normalized = np.divide(occurrences, totals, out=np.zeros_like(occurrences), where=totals > 0)
+        
+        weights = np.where(present & past, decay_weights, 0.0)
+        weighted = normalized * weights
+        weight_sum = weights.sum(axis=1)
+        weighted_sum = weighted.sum(axis=1)
+        relevance_weight = weights[:, in_relevance_window].sum(axis=1)
+        relevance_sum = weighted[:, in_relevance_window].sum(axis=1)
+        
+        overall_weighted_frequency = np.divide(weighted_sum, weight_sum, out=np.zeros_like(weight_sum), where=weight_sum > 0)
+        relevance_weighted_frequency = np.divide(relevance_sum, relevance_weight, out=np.zeros_like(relevance_weight), where=relevance_weight > 0)
+        
+        direction, strength = self.detect_trend_pattern_batch(occurrences, years)
+        
+        total_occurrences = occurrences.sum(axis=1)
+        recency_sum = (occurrences * np.where(past, recency_weights, 0.0)).sum(axis=1)
+        recency_score = np.minimum(1.0, np.divide(recency_sum, total_occurrences, out=np.zeros_like(recency_sum), where=total_occurrences != 0))
+        
+        adjustment = np.array([TREND_ADJUSTMENTS.get(trend, 1.0) for trend in direction], dtype=np.float64)
+        
+        return {
+            'overall_weighted_frequency': overall_weighted_frequency,
+            'relevance_weighted_frequency': relevance_weighted_frequency,
+            'final_frequency_score': relevance_weighted_frequency * adjustment,
+            'trend_direction': direction,
+            'trend_strength': strength,
+            'recency_score': recency_score,
+            'total_occurrences': total_occurrences,
+            'relevance_window_occurrences': occurrences[:, in_relevance_window].sum(axis=1)
         }
+    
+    def detect_trend_pattern_batch(self, occurrences: np.ndarray, years: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized detect_trend_pattern: least-squares slope and correlation over each
+        row's present years in the trend window
+        """
+        occurrences = np.asarray(occurrences, dtype=np.float64)
+        years = np.asarray(years, dtype=np.int64)
+        rows = occurrences.shape[0]
+        
+        mask = (occurrences != 0) & (years >= self.current_year - self.config.trend_analysis_years)
+        n = mask.sum(axis=1)
+        enough = n >= 3
+        safe_n = np.maximum(n, 1)
+        
+        x = np.broadcast_to(years.astype(np.float64), occurrences.shape)
+        mean_x = np.where(mask, x, 0.0).sum(axis=1) / safe_n
+        mean_y = np.where(mask, occurrences, 0.0).sum(axis=1) / safe_n
+        dx = np.where(mask, x - mean_x[:, None], 0.0)
+        dy = np.where(mask, occurrences - mean_y[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(sxx > 0, sxy / sxx, 0.0)
+            # Constant counts give NaN like np.corrcoef; NaN fails every comparison below
+            correlation = np.where(syy > 0, sxy / np.sqrt(sxx * syy), np.nan)
+        
+        year_columns = {int(year): column for column, year in enumerate(years)}
+        
+        def zero_in(year_range) -> np.ndarray:
+            columns = [year_columns[year] for year in year_range if year in year_columns]
+            if len(columns) < len(year_range):
+                return np.ones(rows, dtype=bool)  # A year with no column has no occurrences
+            return (occurrences[:, columns] == 0).any(axis=1)
+        
+        gap_in_earlier_years = zero_in(range(self.current_year - 10, self.current_year - 5))
+        absent_last_year = zero_in(range(self.current_year - 1, self.current_year))
+        
+        direction = np.select(
+            [
+                ~enough,
+                np.abs(slope) < 0.1,
+                (slope > 0.5) & (correlation > 0.6),
+                (slope < -0.5) & (correlation < -0.6),
+                (slope > 0) & gap_in_earlier_years,
+                (slope < 0) & absent_last_year
+            ],
+            ['stable', 'stable', 'increasing', 'decreasing', 'emerging', 'declining'],
+            default='stable'
+        ).astype(object)
+        
+        # min(1.0, abs(nan)) is 1.0 in the scalar path
+        strength = np.where(np.isnan(correlation), 1.0, np.minimum(1.0, np.abs(correlation)))
+        strength = np.where(enough, strength, 0.0)
+        
+        # Integer counts often put the slope exactly on a threshold, where np.polyfit's
+        # rounding decides the branch; re-run the scalar rule for those rows
+        near_threshold = enough & (
+            (np.abs(np.abs(slope) - 0.1) < 1e-9) | (np.abs(np.abs(slope) - 0.5) < 1e-9)
+            | (np.abs(np.abs(correlation) - 0.6) < 1e-9)
+        )
+        for row in np.flatnonzero(near_threshold):
+            yearly_occurrences = {
+                int(year): occurrences[row, column]
+                for column, year in enumerate(years) if occurrences[row, column] != 0
+            }
+            trend = self.detect_trend_pattern(yearly_occurrences)
+            direction[row] = trend['direction']
+            strength[row] = trend['strength']
         
-        return adjustments.get(trend_direction, 1.0)
+        return direction, strength
     
     def create_temporal_pattern(
         self, 
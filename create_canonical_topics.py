@@ -29,7 +29,7 @@ async def create_canonical_topics():
     try:
         # Get database session using the correct async pattern
         db_generator = get_async_compatible_db()
-        db = next(db_generator)  # Get the database session
+        db = await db_generator.__anext__()  # Get the database session
         
         try:
             # Get existing topics
@@ -140,7 +140,7 @@ async def create_canonical_topics():
             return True
             
         finally:
-            await db.close()
+            await db_generator.aclose()  # Closes the session
             
     except Exception as e:
         print(f"❌ Error creating canonical topics: {e}")
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Backfill Review Schedule
+Builds the review_schedule table (one row per user × question) from existing attempt history.
+Safe to re-run: only rows behind the user's attempts (plus archived totals) are updated.
+"""
+
+import sys
+import json
+import logging
+sys.path.append('/app/backend')
+
+from spaced_repetition_engine import run_review_schedule_backfill
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    summary = run_review_schedule_backfill()
+    logger.info(f"📅 Review schedule backfill summary:\n{json.dumps(summary, indent=2)}")
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Backfill Session Questions
+Builds the session_questions table (one row per session × position) for sessions created before it
+existed, from the question ids in Session.units and the attempts made during each session.
+Safe to re-run: sessions that already have rows are skipped.
+"""
+
+import sys
+import json
+import logging
+sys.path.append('/app/backend')
+
+from session_progress import run_session_questions_backfill
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    summary = run_session_questions_backfill()
+    logger.info(f"🗂️ Session questions backfill summary:\n{json.dumps(summary, indent=2)}")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PYQ concept index vs per-question PYQ scan
+Compares the previous matcher (score every PYQ by substring scans, then score the
+matches again for the conceptual score) with postings-intersection scoring.
+Runs on synthetic data, no database needed.
+
+Usage: python scripts/benchmark_pyq_concept_index.py [--pyqs 5000] [--questions 200]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from pyq_concept_index import PYQConceptIndex, pyq_terms, keyword_similarity
+
+SUBCATEGORIES = [
+    "Percentages", "Time–Speed–Distance (TSD)", "Profit–Loss–Discount (PLD)", "Triangles",
+    "Ratio–Proportion–Variation", "Time & Work", "Simple & Compound Interest (SI–CI)",
+    "Averages & Alligation", "Linear Equations", "Quadratic Equations"
+]
+VOCABULARY = [
+    "speed", "distance", "train", "percent", "profit", "loss", "cost", "selling", "interest",
+    "principal", "rate", "compound", "ratio", "proportion", "triangle", "circle", "area",
+    "average", "mixture", "equation", "roots", "work", "days", "together", "probability",
+    "number", "sum", "difference", "integer", "value", "find", "what", "total", "price"
+]
+
+
+# Long tail of other words so postings lists have realistic selectivity
+FILLER_WORDS = [f"w{i}" for i in range(3000)]
+
+
+def build_stem(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(3, 8))]
+    words += rng.choices(FILLER_WORDS, weights=[1 / (rank + 1) for rank in range(len(FILLER_WORDS))], k=rng.randint(15, 40))
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def build_pyqs(count: int, rng: random.Random):
+    return [
+        {
+            'id': f"pyq-{i}",
+            'year': rng.randint(2010, 2025),
+            'subcategory': rng.choice(SUBCATEGORIES),
+            'stem': build_stem(rng)
+        }
+        for i in range(count)
+    ]
+
+
+def build_patterns(count: int, rng: random.Random):
+    return [
+        {
+            'keywords': rng.sample(VOCABULARY, rng.randint(2, 5)),
+            'solution_approach': rng.choice(SUBCATEGORIES)
+        }
+        for _ in range(count)
+    ]
+
+
+def legacy_match(pattern, pyqs, min_year):
+    """Previous behaviour: score all PYQs in the window, then re-score the matches"""
+    def similarity(pyq):
+        score = 0.0
+        if pattern['solution_approach'].lower() == pyq['subcategory'].lower():
+            score += 0.4
+        keywords = set(pattern['keywords'])
+        text = pyq['stem'].lower()
+        score += 0.4 * (sum(1 for keyword in keywords if keyword.lower() in text) / len(keywords))
+        return min(1.0, score)
+
+    matches = [pyq for pyq in pyqs if pyq['year'] >= min_year and similarity(pyq) > 0.3]
+    total_similarity = sum(similarity(pyq) for pyq in matches)
+    return {pyq['id'] for pyq in matches}, total_similarity
+
+
+def indexed_match(pattern, index, min_year):
+    similarities = index.score(pattern, min_year=min_year)
+    matched = {pyq_id for pyq_id, score in similarities.items() if score > 0.3}
+    return matched, sum(similarities[pyq_id] for pyq_id in matched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--pyqs", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--years-window", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pyqs = build_pyqs(args.pyqs, rng)
+    patterns = build_patterns(args.questions, rng)
+    min_year = 2025 - args.years_window
+
+    started = time.perf_counter()
+    index = PYQConceptIndex()
+    for pyq in pyqs:
+        index.add(pyq['id'], pyq['year'], pyq_terms(pyq['stem'], pyq['subcategory']))
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    legacy_results = [legacy_match(pattern, pyqs, min_year) for pattern in patterns]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed_results = [indexed_match(pattern, index, min_year) for pattern in patterns]
+    indexed_seconds = time.perf_counter() - started
+
+    # Whole-word keyword matches are a subset of substring matches; count how often they agree
+    same_matches = sum(1 for legacy, indexed in zip(legacy_results, indexed_results) if legacy[0] == indexed[0])
+
+    # The index must agree exactly with the per-PYQ reference similarity it replaces
+    by_id = {pyq['id']: pyq for pyq in pyqs}
+    for pattern, (matched, _) in zip(patterns[:20], indexed_results[:20]):
+        expected = {
+            pyq['id'] for pyq in pyqs
+            if pyq['year'] >= min_year and keyword_similarity(pattern, pyq['stem'], pyq['subcategory']) > 0.3
+        }
+        assert matched == expected, "index disagrees with keyword_similarity"
+        similarities = index.score(pattern, min_year=min_year)
+        for pyq_id in matched:
+            reference = keyword_similarity(pattern, by_id[pyq_id]['stem'], by_id[pyq_id]['subcategory'])
+            assert abs(similarities[pyq_id] - reference) < 1e-9
+
+    print(f"PYQs: {args.pyqs}, questions: {args.questions}, terms: {len(index.postings)}")
+    print(f"Index build:        {build_seconds * 1000:8.1f} ms")
+    print(f"Legacy scan:        {legacy_seconds * 1000:8.1f} ms ({legacy_seconds / args.questions * 1000:.2f} ms/question)")
+    print(f"Postings scoring:   {indexed_seconds * 1000:8.1f} ms ({indexed_seconds / args.questions * 1000:.2f} ms/question)")
+    print(f"Speedup:            {legacy_seconds / indexed_seconds:8.1f}x")
+    print(f"Identical match sets vs substring matching: {same_matches}/{args.questions}")
+
+
+if __name__ == "__main__":
+    main()
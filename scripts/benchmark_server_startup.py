@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark: server import and startup time
+Imports backend/server.py in fresh interpreters under `python -X importtime`, reports the slowest
+top-level imports, times app startup (lifespan events) and checks both against budgets. Also fails if
+any module that server.py is supposed to load lazily (LLM clients, Google API, docx, scheduler) is
+imported eagerly.
+
+Uses a scratch SQLite database unless DATABASE_URL is set; background jobs are not started
+(EMERGENT_LLM_KEY is cleared for the startup measurement).
+
+Usage: python scripts/benchmark_server_startup.py [--repeat 3] [--top 15] [--import-budget-ms 2000] [--startup-budget-ms 3000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+IMPORT_BUDGET_MS = 2000.0
+STARTUP_BUDGET_MS = 3000.0
+
+# Loaded on first use by server.py; importing any of them at module import is a regression
+LAZY_MODULES = [
+    "docx", "googleapiclient", "google_auth_oauthlib", "emergentintegrations", "openai", "anthropic",
+    "apscheduler", "gmail_service", "google_drive_utils", "llm_enrichment", "mcq_generator",
+    "enhanced_question_processor", "background_jobs", "adaptive_session_engine"
+]
+
+_STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(server.app):
+    ready = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "eager": [name for name in %r if name in sys.modules]
+}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement (best is kept)")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--startup-budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    return parser.parse_args()
+
+
+def probe_environment() -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/startup_benchmark.db")
+    env["EMERGENT_LLM_KEY"] = ""
+    return env
+
+
+def parse_importtime(stderr: str):
+    """(cumulative_us, module) for the modules imported directly by server.py, slowest first"""
+    children, server_children = [], []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        # importtime prints children before their parent: collect depth-1 entries until their depth-0 parent
+        if depth == 1:
+            children.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == "server":
+                server_children = children
+            children = []
+    return sorted(server_children, reverse=True)
+
+
+def measure_imports(env: dict, repeat: int):
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                                   cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise SystemExit(f"import server failed:\n{completed.stderr[-3000:]}")
+        imports = parse_importtime(completed.stderr)
+        total = next((int(line.split("|")[1]) for line in completed.stderr.splitlines()
+                      if line.rstrip().endswith("| server")), sum(cumulative for cumulative, _ in imports))
+        if best is None or total < best[0]:
+            best = (total, imports)
+    return best
+
+
+def measure_startup(env: dict, repeat: int) -> dict:
+    best = None
+    probe = _STARTUP_PROBE % (LAZY_MODULES,)
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND_DIR, env=env,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise SystemExit(f"startup probe failed:\n{completed.stderr[-3000:]}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        if best is None or result["import_ms"] + result["startup_ms"] < best["import_ms"] + best["startup_ms"]:
+            best = result
+    return best
+
+
+def main():
+    args = parse_args()
+    env = probe_environment()
+
+    total_us, imports = measure_imports(env, args.repeat)
+    startup = measure_startup(env, args.repeat)
+
+    print(f"import server (-X importtime, cumulative): {total_us / 1000:8.1f} ms")
+    print(f"import server (wall clock):                {startup['import_ms']:8.1f} ms")
+    print(f"app startup (lifespan):                    {startup['startup_ms']:8.1f} ms")
+    print("\nSlowest imports made by server.py:")
+    for cumulative, name in imports[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if startup["import_ms"] > args.import_budget_ms:
+        failures.append(f"import took {startup['import_ms']:.0f} ms (budget {args.import_budget_ms:.0f} ms)")
+    if startup["startup_ms"] > args.startup_budget_ms:
+        failures.append(f"startup took {startup['startup_ms']:.0f} ms (budget {args.startup_budget_ms:.0f} ms)")
+    if startup["eager"]:
+        failures.append(f"imported eagerly (should load on first use): {', '.join(startup['eager'])}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "importtime_ms": round(total_us / 1000, 1),
+            "import_ms": round(startup["import_ms"], 1),
+            "startup_ms": round(startup["startup_ms"], 1),
+            "eager_modules": startup["eager"],
+            "top_imports": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+                            for cumulative, name in imports[:args.top]]
+        }, indent=2))
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Within import / startup budgets, no eager heavy imports")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Benchmark: AdaptiveSessionLogic session selection
+Runs each phase builder (coverage / strengthen / adaptive), the learning profile analysis and the selection
+helpers (enforce_dual_dimension_diversity, fill_difficulty_quota, perform_backfill) against in-memory
+SQLite question banks of several sizes, for a light and a heavy user history.
+
+Records median wall time, peak traced allocations (tracemalloc, separate pass) and SQL statements per call,
+and flags silent fallbacks to the simple session. With --baseline, exits 1 when a case regresses by more than
+--threshold (time or memory) or runs more queries than the baseline.
+
+Usage:
+    python scripts/benchmark_session_selection.py [--sizes 1000,10000,100000] [--repeat 3]
+        [--output results.json] [--baseline previous.json] [--threshold 0.25]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# In-memory engines are created per bank size; the module engine from database.py is never used
+os.environ["DATABASE_URL"] = "sqlite://"
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base, Topic, Question, User, Attempt, Session as SessionModel
+from adaptive_session_logic import AdaptiveSessionLogic
+from query_metrics import install_query_listeners, capture_queries
+
+# (completed sessions, days of history) per user profile
+USER_PROFILES = {
+    "light": (3, 10),
+    "heavy": (80, 90),
+}
+PHASES = {
+    "coverage": ("phase_a", "create_coverage_phase_session"),
+    "strengthen": ("phase_b", "create_strengthen_phase_session"),
+    "adaptive": ("phase_c", "create_adaptive_phase_session"),
+}
+DIFFICULTY_BANDS = (("Easy", 0.25), ("Medium", 0.55), ("Hard", 0.20))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated question bank sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown / memory growth")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore time regressions smaller than this")
+    return parser.parse_args()
+
+
+def build_bank(logic: AdaptiveSessionLogic, size: int, rng: random.Random):
+    """In-memory database with `size` questions spread over the canonical subcategory × type grid, plus users"""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    install_query_listeners(engine)
+    factory = sessionmaker(bind=engine)
+
+    session = factory()
+    combinations = []
+    for subcategory, types in logic.question_types_mapping.items():
+        topic_id = str(uuid.uuid4())
+        session.execute(insert(Topic), [{"id": topic_id, "name": subcategory, "slug": f"bench-{topic_id}",
+                                         "category": logic.get_category_from_subcategory(subcategory)}])
+        combinations.extend((topic_id, subcategory, type_of_question) for type_of_question in types)
+
+    question_ids = []
+    rows = []
+    bands = [band for band, _ in DIFFICULTY_BANDS]
+    weights = [weight for _, weight in DIFFICULTY_BANDS]
+    for index in range(size):
+        topic_id, subcategory, type_of_question = combinations[index % len(combinations)]
+        question_id = str(uuid.uuid4())
+        question_ids.append(question_id)
+        rows.append({
+            "id": question_id, "topic_id": topic_id, "subcategory": subcategory,
+            "type_of_question": type_of_question, "stem": f"Benchmark question {index}", "answer": "1",
+            "difficulty_band": rng.choices(bands, weights)[0], "difficulty_score": round(rng.random(), 2),
+            "pyq_frequency_score": round(rng.random(), 4), "is_active": True
+        })
+        if len(rows) == 5000:
+            session.execute(insert(Question), rows)
+            rows = []
+    if rows:
+        session.execute(insert(Question), rows)
+
+    users = {}
+    now = datetime.utcnow()
+    for profile, (completed_sessions, history_days) in USER_PROFILES.items():
+        user_id = str(uuid.uuid4())
+        users[profile] = (user_id, completed_sessions)
+        session.execute(insert(User), [{"id": user_id, "email": f"{profile}-{user_id}@example.com",
+                                        "full_name": profile, "password_hash": "-"}])
+        session_rows, attempt_rows = [], []
+        for number in range(completed_sessions):
+            started_at = now - timedelta(days=history_days * (completed_sessions - number) / completed_sessions)
+            picked = rng.sample(question_ids, 12)
+            session_rows.append({"id": str(uuid.uuid4()), "user_id": user_id, "started_at": started_at,
+                                 "ended_at": started_at + timedelta(minutes=30), "units": json.dumps(picked)})
+            attempt_rows.extend({
+                "id": str(uuid.uuid4()), "user_id": user_id, "question_id": question_id, "attempt_no": 1,
+                "context": "daily", "user_answer": "1", "correct": rng.random() < 0.6,
+                "time_sec": rng.randint(30, 240), "created_at": started_at + timedelta(minutes=2 * position)
+            } for position, question_id in enumerate(picked))
+        session.execute(insert(SessionModel), session_rows)
+        session.execute(insert(Attempt), attempt_rows)
+    session.commit()
+    session.close()
+    return factory, users
+
+
+def phase_info_for(logic: AdaptiveSessionLogic, phase: str, session_count: int) -> dict:
+    return {
+        "phase": phase,
+        "phase_name": phase,
+        "phase_description": "benchmark",
+        "session_range": "-",
+        "session_count": session_count,
+        "current_session": session_count + 1,
+        "difficulty_distribution": logic.phase_difficulty_distributions[phase],
+        "is_coverage_phase": phase == "phase_a",
+        "is_strengthen_phase": phase == "phase_b",
+        "is_adaptive_phase": phase == "phase_c"
+    }
+
+
+def measure(run, repeat: int, seed: int) -> dict:
+    """Time run() `repeat` times (queries counted per call), then run it once more under tracemalloc"""
+    timings, query_counts, result = [], [], None
+    for iteration in range(repeat):
+        random.seed(seed + iteration)
+        with capture_queries() as stats:
+            started = time.perf_counter()
+            result = run()
+            timings.append((time.perf_counter() - started) * 1000)
+        query_counts.append(stats.count)
+
+    random.seed(seed)
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "queries": max(query_counts),
+        "peak_kb": round(peak / 1024, 1),
+        "fallback": isinstance(result, dict) and "questions" in result and result.get("enhancement_level") != "three_phase_adaptive"
+    }
+
+
+def benchmark_size(logic: AdaptiveSessionLogic, size: int, args) -> dict:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    factory, users = build_bank(logic, size, rng)
+    print(f"\nBank {size:,} questions (built in {time.perf_counter() - started:.1f}s)")
+    results = {}
+
+    def with_session(call):
+        def run():
+            session = factory()
+            try:
+                return call(session)
+            finally:
+                session.close()
+        return run
+
+    for profile, (user_id, session_count) in users.items():
+        profile_session = factory()
+        user_profile = logic.analyze_user_learning_profile(user_id, profile_session)
+        profile_session.close()
+
+        results[f"{size}/{profile}/analyze_user_learning_profile"] = measure(
+            with_session(lambda db: logic.analyze_user_learning_profile(user_id, db)), args.repeat, args.seed
+        )
+        for name, (phase, builder) in PHASES.items():
+            phase_info = phase_info_for(logic, phase, session_count)
+            build = getattr(logic, builder)
+            results[f"{size}/{profile}/{name}"] = measure(
+                with_session(lambda db: build(user_id, user_profile, phase_info, db)), args.repeat, args.seed
+            )
+
+        # Helpers on the pools the builders would hand them (loaded once, outside the timed region)
+        pool_session = factory()
+        coverage_pool = logic.get_coverage_weighted_question_pool(user_id, user_profile, {}, pool_session)
+        adaptive_pool = logic.get_pyq_weighted_question_pool(user_id, user_profile, pool_session)
+        by_band = {"Easy": [], "Medium": [], "Hard": []}
+        for question in coverage_pool:
+            by_band[logic.determine_question_difficulty(question)].append(question)
+        distribution = {category: 3 for category in logic.base_category_distribution}
+        targets = {"Easy": 3, "Medium": 6, "Hard": 3}
+
+        results[f"{size}/{profile}/enforce_dual_dimension_diversity"] = measure(
+            lambda: logic.enforce_dual_dimension_diversity(list(adaptive_pool)), args.repeat, args.seed
+        )
+        results[f"{size}/{profile}/fill_difficulty_quota"] = measure(
+            lambda: logic.fill_difficulty_quota(by_band["Medium"], 9, "Medium", set(), distribution, []),
+            args.repeat, args.seed
+        )
+        results[f"{size}/{profile}/perform_backfill"] = measure(
+            lambda: logic.perform_backfill(by_band["Medium"][:4], by_band["Hard"], by_band["Easy"], by_band["Medium"],
+                                           targets, set(), []),
+            args.repeat, args.seed
+        )
+        pool_session.close()
+
+    for key, result in results.items():
+        if key.startswith(f"{size}/"):
+            flag = "  FALLBACK" if result["fallback"] else ""
+            print(f"  {key:62} {result['median_ms']:10.2f} ms {result['queries']:6d} queries "
+                  f"{result['peak_kb']:10.1f} KB peak{flag}")
+    return results
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float, min_delta_ms: float):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        slower = current["median_ms"] - previous["median_ms"]
+        if current["median_ms"] > previous["median_ms"] * (1 + threshold) and slower > min_delta_ms:
+            regressions.append(f"{key}: {previous['median_ms']:.2f} → {current['median_ms']:.2f} ms")
+        if current["queries"] > previous["queries"]:
+            regressions.append(f"{key}: {previous['queries']} → {current['queries']} queries")
+        if current["peak_kb"] > previous["peak_kb"] * (1 + threshold) and current["peak_kb"] - previous["peak_kb"] > 64:
+            regressions.append(f"{key}: {previous['peak_kb']:.0f} → {current['peak_kb']:.0f} KB peak")
+        if current["fallback"] and not previous["fallback"]:
+            regressions.append(f"{key}: now falls back to the simple session")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    # The selection code logs every step (and pool shortfalls as warnings); keep output to the results table
+    logging.basicConfig(level=logging.ERROR)
+    logic = AdaptiveSessionLogic()
+
+    results = {}
+    for size in (int(value) for value in args.sizes.split(",") if value.strip()):
+        results.update(benchmark_size(logic, size, args))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"repeat": args.repeat, "seed": args.seed, "results": results}, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text()).get("results", {})
+        regressions = find_regressions(results, baseline, args.threshold, args.min_delta_ms)
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%}): {len(regressions)} regressions")
+        for regression in regressions:
+            print(f"  ❌ {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch vs per-row time-weighted frequency
+Checks that calculate_time_weighted_frequency_batch matches the scalar
+calculate_time_weighted_frequency on random (subcategory × year) data, then times both.
+No database needed.
+
+Usage: python scripts/benchmark_time_weighted_frequency.py [--rows 500] [--repeat 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+
+# Add backend to path
+sys.path.append(str(Path(__file__).parent.parent / "backend"))
+
+from time_weighted_frequency_analyzer import TimeWeightedFrequencyAnalyzer, CAT_ANALYSIS_CONFIG
+
+NUMERIC_KEYS = [
+    'overall_weighted_frequency', 'relevance_weighted_frequency', 'final_frequency_score',
+    'trend_strength', 'recency_score', 'total_occurrences', 'relevance_window_occurrences'
+]
+
+
+def build_data(rows: int, current_year: int, rng: random.Random):
+    years = list(range(current_year - 20, current_year + 1))
+    yearly_by_subcategory = {}
+    for row in range(rows):
+        density = rng.random()
+        yearly_by_subcategory[f"subcategory-{row}"] = {
+            year: rng.randint(1, 12) for year in years if rng.random() < density
+        }
+    total_pyq_per_year = {year: rng.randint(60, 120) for year in years if rng.random() < 0.9}
+    return yearly_by_subcategory, total_pyq_per_year
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    analyzer = TimeWeightedFrequencyAnalyzer(CAT_ANALYSIS_CONFIG)
+    yearly_by_subcategory, total_pyq_per_year = build_data(args.rows, analyzer.current_year, random.Random(args.seed))
+
+    # np.corrcoef warns on constant counts; the scalar path relies on the resulting NaN
+    warnings.simplefilter("ignore", RuntimeWarning)
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        scalar_results = {
+            subcategory: analyzer.calculate_time_weighted_frequency(yearly, total_pyq_per_year)
+            for subcategory, yearly in yearly_by_subcategory.items()
+        }
+    scalar_seconds = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        keys, years, occurrences = analyzer.build_occurrence_matrix(yearly_by_subcategory)
+        batch_results = analyzer.calculate_time_weighted_frequency_batch(occurrences, years, total_pyq_per_year)
+    batch_seconds = (time.perf_counter() - started) / args.repeat
+
+    mismatches = 0
+    for row, subcategory in enumerate(keys):
+        scalar = scalar_results[subcategory]
+        if scalar['trend_direction'] != batch_results['trend_direction'][row]:
+            mismatches += 1
+            print(f"{subcategory}: trend {scalar['trend_direction']} != {batch_results['trend_direction'][row]}")
+            continue
+        for key in NUMERIC_KEYS:
+            if abs(float(scalar[key]) - float(batch_results[key][row])) > 1e-9:
+                mismatches += 1
+                print(f"{subcategory}: {key} {scalar[key]} != {batch_results[key][row]}")
+                break
+
+    print(f"Rows: {args.rows}, years: {len(years)}")
+    print(f"Scalar loop:  {scalar_seconds * 1000:8.2f} ms")
+    print(f"Batch:        {batch_seconds * 1000:8.2f} ms (including matrix build)")
+    print(f"Speedup:      {scalar_seconds / batch_seconds:8.1f}x")
+    print(f"Mismatches:   {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Load test: end-to-end student flow
+Seeds synthetic data (see seed_load_test_data.py), then runs concurrent virtual students through
+login → /sessions/start → 12 × (next-question, submit-answer) → dashboards against the real FastAPI app,
+and reports per-step latency percentiles and SQL query counts (from the Server-Timing header) as JSON.
+
+By default the app runs in-process over ASGI. Blocking database calls then serialise on one event loop,
+so --concurrency mostly measures queueing. Use --base-url against a uvicorn/gunicorn deployment that
+shares the seeded database to measure real parallel throughput.
+
+Usage:
+    python scripts/load_test_student_flow.py [--users 50] [--concurrency 10] [--sessions-per-user 1]
+        [--base-url http://localhost:8001] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from seed_load_test_data import add_seed_arguments, configure_database, load_test_email, seed, LOAD_TEST_PASSWORD
+
+STEPS = [
+    "POST /auth/login",
+    "POST /sessions/start",
+    "GET /sessions/{id}/next-question",
+    "POST /sessions/{id}/submit-answer",
+    "GET /dashboard/mastery",
+    "GET /dashboard/progress",
+]
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_seed_arguments(parser)
+    parser.add_argument("--skip-seed", action="store_true", help="reuse previously seeded users and questions")
+    parser.add_argument("--base-url", default=None, help="drive a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual students running at once")
+    parser.add_argument("--sessions-per-user", type=int, default=1)
+    parser.add_argument("--accuracy", type=float, default=0.6, help="probability a virtual student answers correctly")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help="write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", default=None, help="previous JSON report to print p95 / query deltas against")
+    return parser.parse_args()
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered), math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+class StepRecorder:
+    """Latency, status and Server-Timing query counts per flow step"""
+
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.error_examples = {}
+
+    async def request(self, client, step: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            self._error(step, f"{type(e).__name__}: {e}")
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        queries, db_ms = None, None
+        timing = _SERVER_TIMING_DB.search(response.headers.get("server-timing", ""))
+        if timing:
+            db_ms, queries = float(timing.group(1)), int(timing.group(2))
+        self.samples[step].append((elapsed_ms, queries, db_ms))
+
+        if response.status_code >= 400:
+            self._error(step, f"HTTP {response.status_code}: {response.text[:200]}")
+            return None
+        return response.json()
+
+    def _error(self, step: str, message: str):
+        self.errors[step] += 1
+        self.error_examples.setdefault(step, message)
+
+    def report(self) -> dict:
+        endpoints = {}
+        for step in STEPS:
+            samples = self.samples[step]
+            if not samples and not self.errors[step]:
+                continue
+            latencies = [sample[0] for sample in samples]
+            queries = [sample[1] for sample in samples if sample[1] is not None]
+            db_ms = [sample[2] for sample in samples if sample[2] is not None]
+            endpoints[step] = {
+                "count": len(samples),
+                "errors": self.errors[step],
+                "latency_ms": {
+                    "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                    **{f"p{pct}": round(percentile(latencies, pct), 2) for pct in (50, 90, 95, 99)},
+                    "max": round(max(latencies), 2) if latencies else None
+                },
+                "queries": {
+                    "mean": round(sum(queries) / len(queries), 2) if queries else None,
+                    "p95": percentile(queries, 95) if queries else None,
+                    "max": max(queries) if queries else None
+                },
+                "db_ms": {
+                    "mean": round(sum(db_ms) / len(db_ms), 2) if db_ms else None,
+                    "p95": round(percentile(db_ms, 95), 2) if db_ms else None
+                }
+            }
+            if step in self.error_examples:
+                endpoints[step]["first_error"] = self.error_examples[step]
+        return endpoints
+
+
+async def run_student(client, recorder: StepRecorder, index: int, sessions: int, accuracy: float, rng: random.Random):
+    login = await recorder.request(client, "POST /auth/login", "POST", "/api/auth/login",
+                                   json={"email": load_test_email(index), "password": LOAD_TEST_PASSWORD})
+    if not login:
+        return False
+    headers = {"Authorization": f"Bearer {login['access_token']}"}
+
+    for _ in range(sessions):
+        started = await recorder.request(client, "POST /sessions/start", "POST", "/api/sessions/start",
+                                         json={}, headers=headers)
+        if not started:
+            return False
+        session_id = started["session_id"]
+
+        for _ in range(started.get("total_questions") or 12):
+            payload = await recorder.request(client, "GET /sessions/{id}/next-question", "GET",
+                                             f"/api/sessions/{session_id}/next-question", headers=headers)
+            if not payload or payload.get("session_complete"):
+                break
+            question = payload["question"]
+            options = question.get("options") or {}
+            choices = [value for key, value in options.items() if key in ("A", "B", "C", "D")]
+            correct_value = options.get(options.get("correct", ""), question.get("answer"))
+            if rng.random() < accuracy or not choices:
+                answer = correct_value
+            else:
+                answer = rng.choice([choice for choice in choices if choice != correct_value] or choices)
+            await recorder.request(client, "POST /sessions/{id}/submit-answer", "POST",
+                                   f"/api/sessions/{session_id}/submit-answer", headers=headers,
+                                   json={"question_id": question["id"], "user_answer": str(answer),
+                                         "context": "daily", "time_sec": rng.randint(30, 240)})
+
+    await recorder.request(client, "GET /dashboard/mastery", "GET", "/api/dashboard/mastery", headers=headers)
+    await recorder.request(client, "GET /dashboard/progress", "GET", "/api/dashboard/progress", headers=headers)
+    return True
+
+
+def build_client(args):
+    import httpx
+
+    if args.base_url:
+        return httpx.AsyncClient(base_url=args.base_url.rstrip("/"), timeout=args.timeout)
+    from server import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=args.timeout)
+
+
+async def run_load(args) -> dict:
+    recorder = StepRecorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    async with build_client(args) as client:
+        async def guarded(index: int):
+            async with semaphore:
+                return await run_student(client, recorder, index, args.sessions_per_user, args.accuracy,
+                                         random.Random(rng.random()))
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(guarded(index) for index in range(args.users)))
+        wall_seconds = time.perf_counter() - started
+
+    endpoints = recorder.report()
+    total_requests = sum(endpoint["count"] for endpoint in endpoints.values())
+    return {
+        "summary": {
+            "virtual_users": args.users,
+            "completed_flows": sum(1 for ok in outcomes if ok),
+            "failed_flows": sum(1 for ok in outcomes if not ok),
+            "requests": total_requests,
+            "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+            "wall_seconds": round(wall_seconds, 2),
+            "requests_per_second": round(total_requests / wall_seconds, 2) if wall_seconds else None,
+            "flows_per_second": round(sum(1 for ok in outcomes if ok) / wall_seconds, 3) if wall_seconds else None
+        },
+        "endpoints": endpoints
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def print_comparison(report: dict, baseline_path: str):
+    baseline = json.loads(Path(baseline_path).read_text())
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('meta', {}).get('commit')}):", file=sys.stderr)
+    print(f"{'step':38} {'p95 ms':>10} {'Δ p95':>9} {'queries':>8} {'Δ queries':>10}", file=sys.stderr)
+    for step, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(step)
+        p95 = current["latency_ms"]["p95"]
+        mean_queries = current["queries"]["mean"]
+        if previous:
+            delta_p95 = f"{(p95 / previous['latency_ms']['p95'] - 1) * 100:+.0f}%" if previous["latency_ms"]["p95"] else "-"
+            previous_queries = previous["queries"]["mean"]
+            delta_queries = f"{mean_queries - previous_queries:+.1f}" if mean_queries is not None and previous_queries is not None else "-"
+        else:
+            delta_p95 = delta_queries = "new"
+        print(f"{step:38} {p95:>10.1f} {delta_p95:>9} {mean_queries if mean_queries is not None else '-':>8} {delta_queries:>10}",
+              file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    configure_database(args.database_url)
+    seeded = None if args.skip_seed else seed(args)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "target": args.base_url or "in-process ASGI",
+            "config": {
+                "users": args.users,
+                "concurrency": args.concurrency,
+                "sessions_per_user": args.sessions_per_user,
+                "questions_per_type": args.questions_per_type,
+                "history_sessions": args.history_sessions,
+                "seed": args.seed
+            },
+            "seed": seeded
+        },
+        **asyncio.run(run_load(args))
+    }
+
+    rendered = json.dumps(report, indent=2)
+    print(rendered)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(rendered)
+    if args.compare:
+        print_comparison(report, args.compare)
+    sys.exit(1 if report["summary"]["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Recompute Importance Indices
+Runs the server-side importance_index / importance_band recompute for all active questions.
+Use --dry-run to report band distribution changes without writing.
+"""
+
+import sys
+import json
+import argparse
+import logging
+sys.path.append('/app/backend')
+
+from importance_recompute import run_importance_recompute
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute importance indices for all active questions")
+    parser.add_argument("--dry-run", action="store_true", help="Report distribution changes without updating")
+    args = parser.parse_args()
+
+    summary = run_importance_recompute(dry_run=args.dry_run)
+    logger.info(f"📊 Importance recompute summary:\n{json.dumps(summary, indent=2)}")
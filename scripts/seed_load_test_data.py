@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for load tests
+Seeds the canonical taxonomy as topics, N questions per (subcategory × type) with stored MCQ options
+(so next-question never calls an LLM), student users with a shared password, and a history of completed
+12-question sessions with attempts; then rebuilds the review schedule from that history.
+
+Deterministic for a given --seed. Users are loadtest-<i>@example.com; re-running skips users and
+questions that already exist.
+
+Usage: python scripts/seed_load_test_data.py [--users 50] [--questions-per-type 4] [--history-sessions 5] [--database-url URL]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+LOAD_TEST_PASSWORD = "loadtest-password"
+SESSION_SIZE = 12
+DIFFICULTY_WEIGHTS = {"Easy": 0.3, "Medium": 0.5, "Difficult": 0.2}
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--database-url", default=None, help="defaults to DATABASE_URL, else a scratch SQLite file")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--questions-per-type", type=int, default=4, help="questions per (subcategory × type)")
+    parser.add_argument("--history-sessions", type=int, default=5, help="completed past sessions per user")
+    parser.add_argument("--history-accuracy", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def configure_database(database_url=None) -> str:
+    """Point DATABASE_URL at the target database; must run before anything imports backend/database.py"""
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    elif not os.environ.get("DATABASE_URL"):
+        scratch = Path(__file__).parent.parent / "load_test_results" / "load_test.db"
+        scratch.parent.mkdir(exist_ok=True)
+        os.environ["DATABASE_URL"] = f"sqlite:///{scratch}"
+    # Add backend to path (after DATABASE_URL is set: database.py reads it at import)
+    backend = str(Path(__file__).parent.parent / "backend")
+    if backend not in sys.path:
+        sys.path.append(backend)
+    return os.environ["DATABASE_URL"]
+
+
+def load_test_email(index: int) -> str:
+    return f"loadtest-{index}@example.com"
+
+
+def build_mcq_options(answer: str, rng: random.Random) -> dict:
+    value = int(answer)
+    distractors = rng.sample([value + delta for delta in (-12, -6, -3, 3, 6, 12, 24) if value + delta > 0], 3)
+    choices = [answer] + [str(d) for d in distractors]
+    rng.shuffle(choices)
+    options = dict(zip("ABCD", choices))
+    options["correct"] = "ABCD"[choices.index(answer)]
+    return options
+
+
+def seed_taxonomy(session, questions_per_type: int, rng: random.Random):
+    """Topics for every category / subcategory and questions_per_type questions per type; returns question rows"""
+    from sqlalchemy import select, insert, func
+    from database import Topic, Question
+    from taxonomy_registry import taxonomy_registry
+
+    topics_by_slug = {topic.slug: topic for topic in session.execute(select(Topic)).scalars()}
+    existing_counts = dict(
+        ((subcategory, type_of_question), count)
+        for subcategory, type_of_question, count in session.execute(
+            select(Question.subcategory, Question.type_of_question, func.count(Question.id))
+            .where(Question.source == "LoadTest")
+            .group_by(Question.subcategory, Question.type_of_question)
+        ).all()
+    )
+
+    question_rows = []
+    for category, subcategories in taxonomy_registry.taxonomy.items():
+        category_slug = f"loadtest-{category.lower().replace(' ', '-')}"
+        parent = topics_by_slug.get(category_slug)
+        if parent is None:
+            parent = Topic(id=str(uuid.uuid4()), name=category, slug=category_slug,
+                           category=taxonomy_registry.category_code(category), centrality=0.8)
+            session.add(parent)
+            topics_by_slug[category_slug] = parent
+
+        for subcategory, types in subcategories.items():
+            subcategory_slug = f"{category_slug}-{subcategory.lower().replace(' ', '-')}"
+            topic = topics_by_slug.get(subcategory_slug)
+            if topic is None:
+                topic = Topic(id=str(uuid.uuid4()), name=subcategory, slug=subcategory_slug, parent_id=parent.id,
+                              category=taxonomy_registry.category_code(category), centrality=round(rng.uniform(0.4, 0.9), 2))
+                session.add(topic)
+                topics_by_slug[subcategory_slug] = topic
+
+            for type_of_question in types:
+                for _ in range(questions_per_type - existing_counts.get((subcategory, type_of_question), 0)):
+                    answer = str(rng.randint(10, 500))
+                    difficulty = rng.choices(list(DIFFICULTY_WEIGHTS), weights=list(DIFFICULTY_WEIGHTS.values()))[0]
+                    question_rows.append({
+                        "id": str(uuid.uuid4()),
+                        "topic_id": topic.id,
+                        "subcategory": subcategory,
+                        "type_of_question": type_of_question,
+                        "stem": f"[Load test] {subcategory} / {type_of_question}: find the value ({uuid.uuid4().hex[:8]}).",
+                        "answer": answer,
+                        "solution_approach": "Synthetic load test question",
+                        "detailed_solution": f"The answer is {answer}.",
+                        "difficulty_band": difficulty,
+                        "difficulty_score": {"Easy": 1.5, "Medium": 3.0, "Difficult": 4.5}[difficulty],
+                        "learning_impact": round(rng.uniform(20, 90), 2),
+                        "importance_index": round(rng.uniform(20, 90), 2),
+                        "frequency_score": round(rng.uniform(0, 1), 4),
+                        "pyq_frequency_score": round(rng.uniform(0.4, 1.0), 4),
+                        "mcq_options": json.dumps(build_mcq_options(answer, rng)),
+                        "source": "LoadTest",
+                        "is_active": True
+                    })
+
+    session.flush()
+    if question_rows:
+        session.execute(insert(Question), question_rows)
+    session.commit()
+
+    return session.execute(
+        select(Question.id, Question.answer).where(Question.source == "LoadTest", Question.is_active == True)
+    ).all()
+
+
+def seed_users(session, user_count: int, history_sessions: int, accuracy: float, questions, rng: random.Random):
+    """Student users plus completed past sessions with one attempt per question; returns (users, sessions, attempts) created"""
+    from sqlalchemy import select, insert
+    from database import User, Session as SessionModel, SessionQuestion, Attempt
+    from auth_service import AuthService
+
+    emails = [load_test_email(i) for i in range(user_count)]
+    existing = set(session.execute(select(User.email).where(User.email.in_(emails))).scalars())
+    # One bcrypt hash shared by every load test user (hashing per user would dominate seeding time)
+    password_hash = AuthService().hash_password(LOAD_TEST_PASSWORD)
+
+    user_rows, session_rows, session_question_rows, attempt_rows = [], [], [], []
+    now = datetime.utcnow()
+    for index, email in enumerate(emails):
+        if email in existing:
+            continue
+        user_id = str(uuid.uuid4())
+        user_rows.append({"id": user_id, "email": email, "full_name": f"Load Test {index}",
+                          "password_hash": password_hash, "is_admin": False,
+                          "created_at": now - timedelta(days=history_sessions + 30)})
+
+        for day in range(history_sessions, 0, -1):
+            started_at = now - timedelta(days=day, minutes=rng.randint(0, 600))
+            picked = rng.sample(questions, min(SESSION_SIZE, len(questions)))
+            session_id = str(uuid.uuid4())
+            session_rows.append({"id": session_id, "user_id": user_id, "started_at": started_at,
+                                 "ended_at": started_at + timedelta(minutes=30), "duration_sec": 1800,
+                                 "units": json.dumps([str(q.id) for q in picked]), "notes": "Load test history"})
+            for position, question in enumerate(picked):
+                correct = rng.random() < accuracy
+                attempt_id = str(uuid.uuid4())
+                answered_at = started_at + timedelta(minutes=2 * position)
+                attempt_rows.append({
+                    "id": attempt_id, "user_id": user_id, "question_id": question.id,
+                    "attempt_no": 1, "context": "daily", "options": {},
+                    "user_answer": question.answer if correct else "0", "correct": correct,
+                    "time_sec": rng.randint(30, 240), "hint_used": False,
+                    "created_at": answered_at
+                })
+                session_question_rows.append({"session_id": session_id, "position": position + 1,
+                                              "question_id": str(question.id), "answered_at": answered_at,
+                                              "attempt_id": attempt_id})
+
+    for model, rows in ((User, user_rows), (SessionModel, session_rows),
+                        (SessionQuestion, session_question_rows), (Attempt, attempt_rows)):
+        for start in range(0, len(rows), 1000):
+            session.execute(insert(model), rows[start:start + 1000])
+    session.commit()
+    return len(user_rows), len(session_rows), len(attempt_rows)
+
+
+def seed(args) -> dict:
+    configure_database(args.database_url)
+    from database import SessionLocal, init_database
+    from spaced_repetition_engine import run_review_schedule_backfill
+
+    started = time.perf_counter()
+    rng = random.Random(args.seed)
+    init_database()
+    session = SessionLocal()
+    try:
+        questions = seed_taxonomy(session, args.questions_per_type, rng)
+        users, sessions, attempts = seed_users(
+            session, args.users, args.history_sessions, args.history_accuracy, questions, rng
+        )
+    finally:
+        session.close()
+    backfill = run_review_schedule_backfill() if attempts else {}
+
+    return {
+        "database_url": os.environ["DATABASE_URL"].split("@")[-1],
+        "questions": len(questions),
+        "users_created": users,
+        "history_sessions_created": sessions,
+        "history_attempts_created": attempts,
+        "review_schedule_rows": backfill.get("rows_written"),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(seed(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -78,7 +78,7 @@ class CanonicalTaxonomyUpdater:
                 await db_session.commit()
                 
             finally:
-                await db_session.close()
+                await db_gen.aclose()  # Closes the session
                 
             # Print final statistics
             print("\n" + "=" * 60)
@@ -0,0 +1,53 @@
+"""
+Shared pytest setup: backend modules importable, and a scratch SQLite database
+(database.py reads DATABASE_URL at import, so it is set before any backend module is imported)
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+SCRIPTS_DIR = ROOT_DIR / "scripts"
+
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/tests.db")
+os.environ["EMERGENT_LLM_KEY"] = ""  # no background jobs or LLM clients in tests
+
+for path in (str(BACKEND_DIR), str(SCRIPTS_DIR)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def seeded_database():
+    """Taxonomy, questions with stored MCQ options and load test users with history (scripts/seed_load_test_data.py)"""
+    from seed_load_test_data import seed
+
+    return seed(argparse.Namespace(
+        database_url=None, users=2, questions_per_type=2, history_sessions=2, history_accuracy=0.6, seed=7
+    ))
+
+
+@pytest.fixture(scope="session")
+def client(seeded_database):
+    """TestClient for the FastAPI app (startup events run once per test session)"""
+    from fastapi.testclient import TestClient
+    import server
+
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Bearer token for the first load test user"""
+    from seed_load_test_data import LOAD_TEST_PASSWORD, load_test_email
+
+    response = client.post("/api/auth/login", json={"email": load_test_email(0), "password": LOAD_TEST_PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
@@ -0,0 +1,24 @@
+"""
+Conditional GETs: strong ETags are per representation, so a tag for one content coding only
+validates requests that negotiate the same coding.
+"""
+
+DASHBOARD = "/api/dashboard/mastery"
+
+
+def test_etag_matches_only_the_negotiated_coding(client, auth_headers):
+    response = client.get(DASHBOARD, headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    gzip_tag = response.headers["etag"]
+    assert gzip_tag.endswith('-gzip"')
+    bare_tag = gzip_tag[:-len('-gzip"')] + '"'
+
+    def conditional(accept_encoding: str, tag: str) -> int:
+        headers = {**auth_headers, "Accept-Encoding": accept_encoding, "If-None-Match": tag}
+        return client.get(DASHBOARD, headers=headers).status_code
+
+    assert conditional("gzip", gzip_tag) == 304
+    assert conditional("identity", gzip_tag) == 200
+    assert conditional("identity", bare_tag) == 304
+    assert conditional("gzip", bare_tag) == 304
@@ -0,0 +1,106 @@
+"""
+Concurrency test: mastery upserts do not lose updates.
+Many concurrent MasteryTracker.update_mastery_for_attempt calls for one user × topic (separate
+sessions, one per thread) must count every attempt exactly once in mastery.exposure_score and
+type_mastery.total_attempts / correct_attempts.
+"""
+
+import asyncio
+import random
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import delete
+
+from database import SessionLocal, AsyncSession, init_database, User, Topic, Question, Attempt, Mastery, TypeMastery
+from mastery_tracker import MasteryTracker
+
+WORKERS = 8
+ATTEMPTS_PER_WORKER = 25
+
+
+@pytest.fixture
+def mastery_fixture():
+    """A user, topic and (inactive) question of their own; removed with their mastery rows afterwards"""
+    init_database()
+    run_id = uuid.uuid4().hex[:8]
+    session = SessionLocal()
+    try:
+        user = User(id=str(uuid.uuid4()), email=f"concurrency-{run_id}@example.com",
+                    full_name="Concurrency Check", password_hash="-")
+        topic = Topic(id=str(uuid.uuid4()), name=f"Concurrency {run_id}", slug=f"concurrency-{run_id}", category="A")
+        question = Question(id=str(uuid.uuid4()), topic_id=topic.id, subcategory="Percentages",
+                            type_of_question="Concurrency Check", difficulty_band="Medium",
+                            stem="-", answer="-", is_active=False)
+        session.add_all([user, topic])
+        session.flush()
+        session.add(question)
+        session.commit()
+        ids = (user.id, topic.id, question.id)
+    finally:
+        session.close()
+
+    yield ids
+
+    user_id, topic_id, question_id = ids
+    session = SessionLocal()
+    try:
+        session.execute(delete(TypeMastery).where(TypeMastery.user_id == user_id))
+        session.execute(delete(Mastery).where(Mastery.user_id == user_id))
+        session.execute(delete(Question).where(Question.id == question_id))
+        session.execute(delete(Topic).where(Topic.id == topic_id))
+        session.execute(delete(User).where(User.id == user_id))
+        session.commit()
+    finally:
+        session.close()
+
+
+def run_worker(tracker: MasteryTracker, user_id: str, question_id: str, outcomes, barrier: threading.Barrier, failures):
+    session = SessionLocal()
+    db = AsyncSession(session)
+    try:
+        question = session.get(Question, question_id)
+        barrier.wait()
+        for correct in outcomes:
+            # Attempts are not persisted: only the mastery rows are under test
+            attempt = Attempt(id=str(uuid.uuid4()), user_id=user_id, question_id=question_id,
+                              correct=correct, time_sec=random.randint(30, 240))
+            if not asyncio.run(tracker.update_mastery_for_attempt(db, attempt, question)):
+                failures.append(attempt.id)
+    finally:
+        session.close()
+
+
+def test_concurrent_mastery_updates_are_not_lost(mastery_fixture):
+    user_id, topic_id, question_id = mastery_fixture
+    tracker = MasteryTracker()
+
+    rng = random.Random(user_id)
+    outcomes = [[rng.random() < 0.6 for _ in range(ATTEMPTS_PER_WORKER)] for _ in range(WORKERS)]
+
+    failures = []
+    barrier = threading.Barrier(WORKERS)
+    threads = [
+        threading.Thread(target=run_worker, args=(tracker, user_id, question_id, outcomes[i], barrier, failures))
+        for i in range(WORKERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    session = SessionLocal()
+    try:
+        mastery = session.get(Mastery, (user_id, topic_id))
+        type_mastery = session.query(TypeMastery).filter(TypeMastery.user_id == user_id).one()
+        exposure = int(mastery.exposure_score)
+        total, correct = type_mastery.total_attempts, type_mastery.correct_attempts
+    finally:
+        session.close()
+
+    assert failures == []
+    expected_total = WORKERS * ATTEMPTS_PER_WORKER
+    assert exposure == expected_total
+    assert total == expected_total
+    assert correct == sum(sum(worker_outcomes) for worker_outcomes in outcomes)
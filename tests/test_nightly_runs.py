@@ -0,0 +1,49 @@
+"""
+Nightly run ledger: a failed run is resumed with its original window until it has been resumed
+NIGHTLY_MAX_RESUMES times; it is then abandoned and a new run bounded at the current time opens.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from database import SessionLocal, AsyncSession, init_database, NightlyRun
+from enhanced_nightly_engine import EnhancedNightlyEngine, NIGHTLY_MAX_RESUMES
+
+
+@pytest.fixture
+def db():
+    init_database()
+    session = SessionLocal()
+    # Runs left unfinished by other tests would be picked up first
+    session.execute(update(NightlyRun).where(NightlyRun.status.in_(['running', 'failed'])).values(status='abandoned'))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_failing_run_is_abandoned_after_max_resumes(db):
+    upper_bound = datetime.utcnow() - timedelta(days=3)
+    stuck = NightlyRun(status='failed', started_at=upper_bound, data_upper_bound=upper_bound,
+                       resume_count=0, error="mastery: boom")
+    db.add(stuck)
+    db.commit()
+
+    engine = EnhancedNightlyEngine()
+    for resumes in range(1, NIGHTLY_MAX_RESUMES + 1):
+        run = asyncio.run(engine.get_or_create_run(AsyncSession(db)))
+        assert run.id == stuck.id and run.resume_count == resumes
+        assert run.data_upper_bound == upper_bound
+        run.status = 'failed'
+        db.commit()
+
+    run = asyncio.run(engine.get_or_create_run(AsyncSession(db)))
+    assert run.id != stuck.id
+    assert run.data_upper_bound > upper_bound
+    db.refresh(stuck)
+    assert stuck.status == 'abandoned'
+    assert stuck.completed_at is not None
@@ -0,0 +1,51 @@
+"""
+Query budgets for the student flow endpoints (query_metrics.assert_query_budget).
+A failure means an endpoint now issues more SQL statements than when its budget was pinned,
+usually a new per-row query in a loop; raise a budget only for a deliberate change.
+"""
+
+from query_metrics import assert_query_budget
+
+QUERY_BUDGETS = {
+    "POST /sessions/start": 10,
+    "GET /sessions/{id}/next-question": 5,
+    "POST /sessions/{id}/submit-answer": 21,
+    "GET /dashboard/mastery": 9,
+    "GET /dashboard/progress": 3,
+    "GET /dashboard/simple-taxonomy": 6
+}
+
+
+def test_session_flow_query_budgets(client, auth_headers):
+    """A complete 12-question session: every step within its budget"""
+    with assert_query_budget(QUERY_BUDGETS["POST /sessions/start"]):
+        response = client.post("/api/sessions/start", json={}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    session_id = response.json()["session_id"]
+    total_questions = response.json()["total_questions"]
+
+    for _ in range(total_questions):
+        with assert_query_budget(QUERY_BUDGETS["GET /sessions/{id}/next-question"]):
+            response = client.get(f"/api/sessions/{session_id}/next-question", headers=auth_headers)
+        assert response.status_code == 200, response.text
+        question = response.json()["question"]
+        options = question["options"]
+
+        with assert_query_budget(QUERY_BUDGETS["POST /sessions/{id}/submit-answer"]):
+            response = client.post(
+                f"/api/sessions/{session_id}/submit-answer", headers=auth_headers,
+                json={"question_id": question["id"], "user_answer": options[options["correct"]],
+                      "context": "daily", "time_sec": 60}
+            )
+        assert response.status_code == 200, response.text
+
+    response = client.get(f"/api/sessions/{session_id}/next-question", headers=auth_headers)
+    assert response.json()["session_complete"] is True
+
+
+def test_dashboard_query_budgets(client, auth_headers):
+    """Dashboards for a user with history and mastery rows: query counts do not grow with topics attempted"""
+    for route in ("/dashboard/mastery", "/dashboard/progress", "/dashboard/simple-taxonomy"):
+        with assert_query_budget(QUERY_BUDGETS[f"GET {route}"]):
+            response = client.get(f"/api{route}", headers=auth_headers)
+        assert response.status_code == 200, response.text
@@ -0,0 +1,124 @@
+"""
+Review schedule backfill: a user whose schedule row misses a committed attempt is found on their own,
+and the row is brought up to date from their live attempts plus the totals of archived ones. Until
+then, the plan engine's attempt overlay merges in the attempts the schedule does not cover.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from database import (
+    SessionLocal, AsyncSession, init_database, User, Topic, Question, Attempt, AttemptArchive,
+    AttemptDailySummary, ReviewSchedule
+)
+from data_retention import DataRetentionManager
+from question_priority_ranking import load_attempt_overlay
+from spaced_repetition_engine import SpacedRepetitionEngine
+
+
+@pytest.fixture
+def schedule_fixture():
+    """A user, topic and (inactive) question of their own; removed with their attempts and schedule afterwards"""
+    init_database()
+    run_id = uuid.uuid4().hex[:8]
+    session = SessionLocal()
+    try:
+        user = User(id=str(uuid.uuid4()), email=f"review-{run_id}@example.com",
+                    full_name="Review Schedule Check", password_hash="-")
+        topic = Topic(id=str(uuid.uuid4()), name=f"Review {run_id}", slug=f"review-{run_id}", category="A")
+        question = Question(id=str(uuid.uuid4()), topic_id=topic.id, subcategory="Percentages",
+                            type_of_question="Review Schedule Check", difficulty_band="Medium",
+                            stem="-", answer="-", is_active=False)
+        session.add_all([user, topic])
+        session.flush()
+        session.add(question)
+        session.commit()
+        ids = (user.id, topic.id, question.id)
+    finally:
+        session.close()
+
+    yield ids
+
+    user_id, topic_id, question_id = ids
+    session = SessionLocal()
+    try:
+        session.execute(delete(ReviewSchedule).where(ReviewSchedule.user_id == user_id))
+        session.execute(delete(Attempt).where(Attempt.user_id == user_id))
+        session.execute(delete(AttemptArchive).where(AttemptArchive.user_id == user_id))
+        session.execute(delete(AttemptDailySummary).where(AttemptDailySummary.user_id == user_id))
+        session.execute(delete(Question).where(Question.id == question_id))
+        session.execute(delete(Topic).where(Topic.id == topic_id))
+        session.execute(delete(User).where(User.id == user_id))
+        session.commit()
+    finally:
+        session.close()
+
+
+def submit(session, user_id: str, question_id: str, correct: bool, created_at: datetime, record: bool = True):
+    """An attempt committed with (record=True) or without its review schedule update"""
+    attempt = Attempt(user_id=user_id, question_id=question_id, attempt_no=1, context="daily", user_answer="-",
+                      correct=correct, time_sec=60, created_at=created_at)
+    session.add(attempt)
+    session.flush()
+    if record:
+        asyncio.run(SpacedRepetitionEngine().record_attempt(AsyncSession(session), attempt))
+    session.commit()
+
+
+def test_backfill_restores_lost_update_and_keeps_archived_totals(schedule_fixture):
+    user_id, _, question_id = schedule_fixture
+    engine = SpacedRepetitionEngine()
+    now = datetime.utcnow()
+
+    session = SessionLocal()
+    db = AsyncSession(session)
+    try:
+        submit(session, user_id, question_id, True, now - timedelta(days=400))
+        submit(session, user_id, question_id, False, now - timedelta(days=399))
+        asyncio.run(DataRetentionManager(attempt_retention_days=365, archive_format='table').archive_old_attempts(db))
+
+        schedule = session.get(ReviewSchedule, (user_id, question_id))
+        assert (schedule.total_attempts, schedule.archived_attempts, schedule.archived_correct_attempts) == (2, 2, 1)
+        assert user_id not in asyncio.run(engine.users_missing_review_history(db))
+
+        # One live attempt recorded, one whose schedule update was lost
+        submit(session, user_id, question_id, True, now - timedelta(hours=2))
+        submit(session, user_id, question_id, True, now - timedelta(hours=1), record=False)
+        assert user_id in asyncio.run(engine.users_missing_review_history(db))
+
+        asyncio.run(engine.backfill_review_schedule(db, [user_id]))
+        session.expire_all()
+        schedule = session.get(ReviewSchedule, (user_id, question_id))
+        assert (schedule.total_attempts, schedule.correct_attempts, schedule.incorrect_count) == (4, 3, 1)
+        assert schedule.archived_attempts == 2
+        assert schedule.last_correct is True
+        assert user_id not in asyncio.run(engine.users_missing_review_history(db))
+
+        # Re-running changes nothing once the row is up to date
+        updated_at = schedule.updated_at
+        asyncio.run(engine.backfill_review_schedule(db, [user_id]))
+        session.expire_all()
+        assert session.get(ReviewSchedule, (user_id, question_id)).updated_at == updated_at
+    finally:
+        session.close()
+
+
+def test_attempt_overlay_merges_attempts_missing_from_schedule(schedule_fixture):
+    user_id, _, question_id = schedule_fixture
+    now = datetime.utcnow()
+
+    session = SessionLocal()
+    db = AsyncSession(session)
+    try:
+        submit(session, user_id, question_id, False, now - timedelta(days=3))
+        assert asyncio.run(load_attempt_overlay(db, user_id))[question_id][1:] == (1, 1)
+
+        last_attempt_at = now - timedelta(hours=1)
+        submit(session, user_id, question_id, False, last_attempt_at, record=False)
+        assert asyncio.run(load_attempt_overlay(db, user_id))[question_id] == (last_attempt_at, 2, 2)
+    finally:
+        session.close()
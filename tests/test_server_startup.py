@@ -0,0 +1,26 @@
+"""
+Server import / startup budget (scripts/benchmark_server_startup.py probe, in fresh interpreters):
+modules server.py loads on first use must not be imported eagerly, and import plus app startup
+must stay within the benchmark's budgets.
+"""
+
+import pytest
+
+from benchmark_server_startup import IMPORT_BUDGET_MS, STARTUP_BUDGET_MS, measure_startup, probe_environment
+
+
+@pytest.fixture(scope="module")
+def startup():
+    return measure_startup(probe_environment(), repeat=2)
+
+
+def test_no_eager_heavy_imports(startup):
+    assert startup["eager"] == [], f"imported eagerly (should load on first use): {', '.join(startup['eager'])}"
+
+
+def test_import_within_budget(startup):
+    assert startup["import_ms"] <= IMPORT_BUDGET_MS, f"import server took {startup['import_ms']:.0f} ms"
+
+
+def test_startup_within_budget(startup):
+    assert startup["startup_ms"] <= STARTUP_BUDGET_MS, f"app startup took {startup['startup_ms']:.0f} ms"
@@ -0,0 +1,49 @@
+"""
+Session progress through session_questions, including sessions created before the table existed
+(question ids only in Session.units), which are migrated on first access.
+"""
+
+from sqlalchemy import delete
+
+from database import SessionLocal, Session, SessionQuestion
+
+
+def answer(client, auth_headers, session_id: str, question: dict):
+    options = question["options"]
+    response = client.post(
+        f"/api/sessions/{session_id}/submit-answer", headers=auth_headers,
+        json={"question_id": question["id"], "user_answer": options[options["correct"]], "context": "daily", "time_sec": 60}
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_final_answer_completes_legacy_session(client, auth_headers):
+    response = client.post("/api/sessions/start", json={}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    session_id = response.json()["session_id"]
+
+    questions = []
+    for _ in range(response.json()["total_questions"]):
+        question = client.get(f"/api/sessions/{session_id}/next-question", headers=auth_headers).json()["question"]
+        questions.append(question)
+        if len(questions) < response.json()["total_questions"]:
+            answer(client, auth_headers, session_id, question)
+
+    # Drop the rows: the session now looks like one created before session_questions existed
+    db = SessionLocal()
+    try:
+        db.execute(delete(SessionQuestion).where(SessionQuestion.session_id == session_id))
+        db.commit()
+    finally:
+        db.close()
+
+    answer(client, auth_headers, session_id, questions[-1])
+
+    db = SessionLocal()
+    try:
+        assert db.get(Session, session_id).ended_at is not None
+        assert db.query(SessionQuestion).filter(
+            SessionQuestion.session_id == session_id, SessionQuestion.answered_at.is_(None)
+        ).count() == 0
+    finally:
+        db.close()